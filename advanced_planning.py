@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 import os
 import json
-import requests
+import service_client
 from typing import List, Dict, Any
 from langchain.agents import AgentType, initialize_agent, Tool
 from langchain.llms import OpenAI
@@ -14,10 +14,6 @@ from langchain.chains import LLMChain
 
 advanced_planning_bp = Blueprint('advanced_planning', __name__)
 
-# Configuration
-TOOLS_MANAGER_URL = "http://localhost:5002"
-MEMORY_SERVICE_URL = "http://localhost:5003"
-
 class PlanningCallbackHandler(BaseCallbackHandler):
     """Callback handler pour capturer les étapes de planification"""
     
@@ -48,7 +44,7 @@ def create_tools():
     def web_search(query: str) -> str:
         """Rechercher des informations sur le web"""
         try:
-            response = requests.post(f"{TOOLS_MANAGER_URL}/api/search", 
+            response = service_client.post('tools-manager', '/api/search', 
                                    json={'query': query}, timeout=30)
             if response.status_code == 200:
                 result = response.json()
@@ -61,7 +57,7 @@ def create_tools():
     def execute_code(code: str) -> str:
         """Exécuter du code Python"""
         try:
-            response = requests.post(f"{TOOLS_MANAGER_URL}/api/execute", 
+            response = service_client.post('tools-manager', '/api/execute', 
                                    json={'code': code, 'language': 'python'}, timeout=60)
             if response.status_code == 200:
                 result = response.json()
@@ -77,7 +73,7 @@ def create_tools():
     def generate_text(prompt: str) -> str:
         """Générer du texte avec Hugging Face"""
         try:
-            response = requests.post(f"{TOOLS_MANAGER_URL}/api/generate/text", 
+            response = service_client.post('tools-manager', '/api/generate/text', 
                                    json={'prompt': prompt}, timeout=60)
             if response.status_code == 200:
                 result = response.json()
@@ -90,8 +86,9 @@ def create_tools():
     def retrieve_memory(query: str) -> str:
         """Récupérer des informations de la mémoire à long terme"""
         try:
-            response = requests.post(f"{MEMORY_SERVICE_URL}/api/retrieve/experiences", 
-                                   json={'query': query, 'limit': 3}, timeout=30)
+            response = service_client.post('memory-service', '/api/retrieve/experiences', 
+                                   json={'query': query, 'limit': 3, 'mode': 'semantic',
+                                         'fields': ['objective', 'results', 'success']}, timeout=30)
             if response.status_code == 200:
                 result = response.json()
                 experiences = result.get('experiences', [])
@@ -138,24 +135,23 @@ def health_check():
     return jsonify({'status': 'healthy', 'service': 'advanced-planning'})
 
 @advanced_planning_bp.route('/autonomous_plan', methods=['POST'])
-    def create_autonomous_plan():
-        """Créer un plan autonome avec LangChain"""
-        try:
-            data = request.get_json()
-            objective = data.get("objective", "")
-            context = data.get("context", "")
-            
-            if not objective:
-                return jsonify({"error": "Objective is required"}), 400
-            
-            # Initialiser le LLM
-            llm = ChatOpenAI(
-                model="gpt-4.1-mini",
-                temperature=0.7,
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                openai_api_base=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-            )
-            
+def create_autonomous_plan():
+    """Créer un plan autonome avec LangChain"""
+    try:
+        data = request.get_json()
+        objective = data.get("objective", "")
+        context = data.get("context", "")
+        
+        if not objective:
+            return jsonify({"error": "Objective is required"}), 400
+        
+        # Initialiser le LLM
+        llm = ChatOpenAI(
+            model="gpt-4.1-mini",
+            temperature=0.7,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_api_base=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+        )
         
         # Créer les outils
         tools = create_tools()
@@ -213,9 +209,10 @@ def health_check():
                 'objective': objective,
                 'plan': json.dumps(callback_handler.steps),
                 'results': result,
-                'success': True
+                'success': True,
+                'source': 'advanced-planning'
             }
-            requests.post(f"{MEMORY_SERVICE_URL}/api/store/experience", 
+            service_client.post('memory-service', '/api/store/experience', 
                          json=memory_data, timeout=30)
         except Exception as memory_error:
             print(f"Erreur lors du stockage en mémoire: {memory_error}")
@@ -229,9 +226,10 @@ def health_check():
                 'objective': objective,
                 'plan': '',
                 'results': f'Erreur: {str(e)}',
-                'success': False
+                'success': False,
+                'source': 'advanced-planning'
             }
-            requests.post(f"{MEMORY_SERVICE_URL}/api/store/experience", 
+            service_client.post('memory-service', '/api/store/experience', 
                          json=memory_data, timeout=30)
         except:
             pass
@@ -239,46 +237,45 @@ def health_check():
         return jsonify({'error': f'Planning failed: {str(e)}'}), 500
 
 @advanced_planning_bp.route('/chain_of_thought', methods=['POST'])
-    def chain_of_thought_planning():
-        """Planification avec Chain-of-Thought reasoning"""
-        try:
-            data = request.get_json()
-            objective = data.get("objective", "")
-            
-            if not objective:
-                return jsonify({"error": "Objective is required"}), 400
-            
-            # Template pour Chain-of-Thought
-            cot_template = """
-            Tu es un expert en planification stratégique. Utilise la méthode Chain-of-Thought pour décomposer cet objectif.
-            
-            Objectif: {objective}
-            
-            Procède étape par étape:
-            
-            1. ANALYSE: Que demande exactement cet objectif? Quels sont les éléments clés?
-            
-            2. DÉCOMPOSITION: Quelles sont les étapes principales nécessaires?
-            
-            3. DÉPENDANCES: Quelles étapes dépendent d'autres étapes?
-            
-            4. OUTILS REQUIS: Quels outils ou ressources sont nécessaires pour chaque étape?
-            
-            5. PLAN D'ACTION: Séquence détaillée d'actions avec justifications
-            
-            6. CRITÈRES DE SUCCÈS: Comment savoir si chaque étape est réussie?
-            
-            Réponds en format JSON structuré avec ces sections.
-            """
-            
-            # Initialiser le LLM
-            llm = ChatOpenAI(
-                model="gpt-4.1-mini",
-                temperature=0.3,
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                openai_api_base=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-            )
-            
+def chain_of_thought_planning():
+    """Planification avec Chain-of-Thought reasoning"""
+    try:
+        data = request.get_json()
+        objective = data.get("objective", "")
+        
+        if not objective:
+            return jsonify({"error": "Objective is required"}), 400
+        
+        # Template pour Chain-of-Thought
+        cot_template = """
+        Tu es un expert en planification stratégique. Utilise la méthode Chain-of-Thought pour décomposer cet objectif.
+        
+        Objectif: {objective}
+        
+        Procède étape par étape:
+        
+        1. ANALYSE: Que demande exactement cet objectif? Quels sont les éléments clés?
+        
+        2. DÉCOMPOSITION: Quelles sont les étapes principales nécessaires?
+        
+        3. DÉPENDANCES: Quelles étapes dépendent d'autres étapes?
+        
+        4. OUTILS REQUIS: Quels outils ou ressources sont nécessaires pour chaque étape?
+        
+        5. PLAN D'ACTION: Séquence détaillée d'actions avec justifications
+        
+        6. CRITÈRES DE SUCCÈS: Comment savoir si chaque étape est réussie?
+        
+        Réponds en format JSON structuré avec ces sections.
+        """
+        
+        # Initialiser le LLM
+        llm = ChatOpenAI(
+            model="gpt-4.1-mini",
+            temperature=0.3,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_api_base=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+        )
         
         # Créer la chaîne
         prompt = PromptTemplate(template=cot_template, input_variables=["objective"])
@@ -324,13 +321,13 @@ def multi_step_execution():
                 params = step.get('parameters', {})
                 
                 if tool_name == 'web_search':
-                    response = requests.post(f"{TOOLS_MANAGER_URL}/api/search", 
+                    response = service_client.post('tools-manager', '/api/search', 
                                            json={'query': params.get('query', '')}, timeout=30)
                 elif tool_name == 'code_execution':
-                    response = requests.post(f"{TOOLS_MANAGER_URL}/api/execute", 
+                    response = service_client.post('tools-manager', '/api/execute', 
                                            json={'code': params.get('code', ''), 'language': 'python'}, timeout=60)
                 elif tool_name == 'text_generation':
-                    response = requests.post(f"{TOOLS_MANAGER_URL}/api/generate/text", 
+                    response = service_client.post('tools-manager', '/api/generate/text', 
                                            json={'prompt': params.get('prompt', '')}, timeout=60)
                 else:
                     step_result['status'] = 'error'
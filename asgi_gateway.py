@@ -0,0 +1,454 @@
+import os
+import json
+import time
+import asyncio
+import contextlib
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from gateway_proxy import (GATEWAY_POOL_SIZE, GATEWAY_POOL_IDLE_TIMEOUT, GATEWAY_UPSTREAM_TIMEOUT,
+                           DECODED_RESPONSE_EXCLUDED_HEADERS, RESPONSE_EXCLUDED_HEADERS,
+                           UPSTREAM_FAILURE_STATUSES, filter_request_headers)
+from gateway_batch import BatchError, parse_batch, decode_body, batch_result
+from health_prober import HealthProber
+from load_balancer import MICROSERVICES, ReplicaSet
+from response_cache import ResponseCache, cache_key, etag_matches
+from singleflight import AsyncSingleFlight, coalescing_key, coalescing_requested
+from static_assets import StaticAssetIndex, FRONTEND_BUILD_DIR
+
+# Async gateway configuration: upstream concurrency is bounded separately from the
+# keep-alive pool so thousands of long-poll requests can wait on an upstream at once
+GATEWAY_ASYNC_MAX_CONNECTIONS = int(os.getenv('GATEWAY_ASYNC_MAX_CONNECTIONS', '2000'))
+GATEWAY_PORT = int(os.getenv('GATEWAY_PORT', '5000'))
+
+
+class AsyncUpstreamPool:
+    """Keep-alive httpx client of one replica, with the counters gateway_proxy.UpstreamPool keeps"""
+
+    def __init__(self, base_url, limits, timeout):
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout)
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+
+    async def trace(self, event_name, info):
+        """httpcore trace extension: counts the connections the client opens"""
+        if event_name == 'connection.connect_tcp.complete':
+            self.connections_opened += 1
+
+    def begin(self):
+        self.in_flight += 1
+        self.requests += 1
+        self.last_used = time.monotonic()
+
+    def end(self, failed=False):
+        self.in_flight -= 1
+        if failed:
+            self.errors += 1
+        self.last_used = time.monotonic()
+
+    def stats(self):
+        return {
+            'url': self.base_url,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'connections_opened': self.connections_opened,
+            'connections_reused': max(self.requests - self.connections_opened, 0),
+            'idle_seconds': round(time.monotonic() - self.last_used, 3)
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class AsyncProxyEngine:
+    """Non-blocking counterpart of gateway_proxy.ProxyEngine built on httpx"""
+
+    def __init__(self, upstreams, pool_size=GATEWAY_POOL_SIZE, idle_timeout=GATEWAY_POOL_IDLE_TIMEOUT,
+                 max_connections=GATEWAY_ASYNC_MAX_CONNECTIONS, timeout=GATEWAY_UPSTREAM_TIMEOUT):
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=pool_size,
+                              keepalive_expiry=idle_timeout)
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.services = {}
+        for name, urls in upstreams.items():
+            replica_set = ReplicaSet(name, urls)
+            for replica in replica_set.replicas:
+                replica.transport = AsyncUpstreamPool(replica.url, limits, timeout)
+            self.services[name] = replica_set
+
+    async def forward(self, service_name, path, method, headers=None, content=None, query_string=b'', timeout=None):
+        """Send a request to the best replica and return the response with its body still unread.
+
+        Also returns an async release callback that must be awaited once the body
+        has been consumed, to free the connection and record the outcome.
+        """
+        replica_set = self.services[service_name]
+        if isinstance(query_string, bytes):
+            query_string = query_string.decode('latin-1')
+        url = f"{path}?{query_string}" if query_string else path
+        loop = asyncio.get_running_loop()
+        tried = []
+        while True:
+            replica = replica_set.acquire(exclude=tried)
+            pool = replica.transport
+            upstream_request = pool.client.build_request(method, url, headers=headers, content=content,
+                                                         timeout=timeout or httpx.USE_CLIENT_DEFAULT,
+                                                         extensions={'trace': pool.trace})
+            started = loop.time()
+            pool.begin()
+            try:
+                response = await pool.client.send(upstream_request, stream=True)
+            except Exception as e:
+                pool.end(failed=True)
+                replica_set.release(replica, failed=True)
+                tried.append(replica)
+                if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) and len(tried) < len(replica_set.replicas):
+                    continue
+                raise
+            latency = loop.time() - started
+            break
+
+        async def release():
+            await response.aclose()
+            pool.end()
+            replica_set.release(replica, latency, failed=response.status_code in UPSTREAM_FAILURE_STATUSES)
+
+        return response, release
+
+    async def probe(self, service_name, path='/api/health', timeout=None):
+        """Check every replica of a service concurrently, bypassing routing and circuit breakers"""
+        async def probe_replica(replica):
+            try:
+                response = await replica.transport.client.get(path, timeout=timeout or httpx.USE_CLIENT_DEFAULT,
+                                                              extensions={'trace': replica.transport.trace})
+                return {'url': replica.url, 'healthy': response.status_code == 200,
+                        'response_time': response.elapsed.total_seconds()}
+            except Exception as e:
+                return {'url': replica.url, 'healthy': False, 'error': str(e)}
+
+        return await asyncio.gather(*(probe_replica(r) for r in self.services[service_name].replicas))
+
+    def stats(self):
+        upstreams = {}
+        for name, replica_set in self.services.items():
+            service_stats = replica_set.stats()
+            for replica, replica_stats in zip(replica_set.replicas, service_stats['replicas']):
+                replica_stats.update(replica.transport.stats())
+            upstreams[name] = service_stats
+        return {
+            'pool_size': self.pool_size,
+            'idle_timeout': self.idle_timeout,
+            'max_connections': self.max_connections,
+            'upstreams': upstreams
+        }
+
+    async def close(self):
+        for replica_set in self.services.values():
+            for replica in replica_set.replicas:
+                await replica.transport.close()
+
+
+proxy_engine = AsyncProxyEngine(MICROSERVICES)
+health_prober = HealthProber(MICROSERVICES)
+response_cache = ResponseCache()
+single_flight = AsyncSingleFlight()
+static_assets = StaticAssetIndex(FRONTEND_BUILD_DIR).build()
+
+
+def filter_async_response_headers(headers):
+    """Drop hop-by-hop and origin Date/Server headers from a raw httpx response, keeping repeated headers intact"""
+    return [(key.lower().encode('latin-1'), value.encode('latin-1'))
+            for key, value in headers.multi_items() if key.lower() not in RESPONSE_EXCLUDED_HEADERS]
+
+
+def buffered_response(body, status, headers):
+    """Response from (name, value) header pairs; a dict would keep one Set-Cookie or Vary of several"""
+    response = Response(body, status_code=status)
+    response.raw_headers.extend((key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers)
+    return response
+
+
+async def cached_response(request, fetch):
+    """Answer a GET from the response cache, awaiting fetch() on a miss (see main.cached_response)"""
+    ttl = response_cache.ttl_for(request.url.path)
+    if ttl is None or request.method != 'GET':
+        return buffered_response(*await fetch())
+
+    key = cache_key(f"{request.url.path}?{request.url.query}", request.headers)
+    entry = response_cache.get(key)
+    cache_status = 'HIT'
+    if entry is None:
+        body, status, headers = await fetch()
+        headers = [(k, v) for (k, v) in headers if k.lower() not in ('etag', 'cache-control')]
+        entry = response_cache.store(key, ttl, body, status, headers)
+        cache_status = 'MISS'
+    if entry.status != 200:
+        return buffered_response(entry.body, entry.status, entry.headers)
+
+    validators = [('ETag', entry.etag), ('Cache-Control', f'max-age={entry.remaining_ttl()}'), ('X-Cache', cache_status)]
+    if etag_matches(request.headers.get('if-none-match'), entry.etag):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=dict(validators))
+    return buffered_response(entry.body, entry.status, entry.headers + validators)
+
+
+async def forward_request(request, service_name, service_label):
+    """Stream the incoming request to a microservice and stream its reply back"""
+    upstream_path = f"/api/{request.path_params['path']}"
+
+    async def fetch(content=None):
+        response, release = await proxy_engine.forward(
+            service_name, upstream_path, request.method,
+            headers=filter_request_headers(request.headers.items()),
+            content=content,
+            query_string=request.url.query
+        )
+        try:
+            body = await response.aread()
+        finally:
+            await release()
+        headers = [(k, v) for (k, v) in response.headers.multi_items()
+                   if k.lower() not in DECODED_RESPONSE_EXCLUDED_HEADERS]
+        return body, response.status_code, headers
+
+    try:
+        if coalescing_requested(request.url.path, request.headers):
+            # Identical concurrent calls share one upstream round trip and its buffered result
+            content = await request.body()
+            full_path = f"{request.url.path}?{request.url.query}"
+            key = coalescing_key(request.method, full_path, content, request.headers)
+            shared_fetch = lambda: single_flight.do(key, lambda: fetch(content or None))
+            if request.method == 'GET':
+                return await cached_response(request, shared_fetch)
+            body, status, headers = await shared_fetch()
+            response_cache.invalidate_for_write(request.method, request.url.path)
+            return buffered_response(body, status, headers)
+
+        if request.method == 'GET' and response_cache.ttl_for(request.url.path) is not None:
+            return await cached_response(request, fetch)
+
+        has_body = request.headers.get('content-length', '0') != '0' or \
+            request.headers.get('transfer-encoding', '').lower() == 'chunked'
+        response, release = await proxy_engine.forward(
+            service_name,
+            upstream_path,
+            request.method,
+            headers=filter_request_headers(request.headers.items()),
+            content=request.stream() if has_body else None,
+            query_string=request.url.query
+        )
+    except Exception as e:
+        return JSONResponse({'error': f'{service_label} service unavailable: {str(e)}'}, status_code=503)
+
+    response_cache.invalidate_for_write(request.method, request.url.path)
+    streamed = StreamingResponse(response.aiter_raw(), status_code=response.status_code,
+                                 background=BackgroundTask(release))
+    streamed.raw_headers = filter_async_response_headers(response.headers)
+    return streamed
+
+
+async def proxy_planning(request):
+    """Proxy requests to Planning Brain service"""
+    return await forward_request(request, 'planning-brain', 'Planning')
+
+
+async def proxy_tools(request):
+    """Proxy requests to Tools Manager service"""
+    return await forward_request(request, 'tools-manager', 'Tools')
+
+
+async def proxy_memory(request):
+    """Proxy requests to Memory service"""
+    return await forward_request(request, 'memory-service', 'Memory')
+
+
+async def run_sub_request(sub_request, base_headers):
+    """Forward one batch entry (see main.run_sub_request)"""
+    if sub_request.error:
+        return batch_result(sub_request, 400, {'error': sub_request.error})
+
+    headers = dict(base_headers)
+    headers.update(sub_request.headers)
+    content = sub_request.encoded_body()
+    if content is not None and not any(k.lower() == 'content-type' for k in headers):
+        headers['Content-Type'] = 'application/json'
+
+    async def fetch():
+        response, release = await proxy_engine.forward(
+            sub_request.service_name, sub_request.upstream_path, sub_request.method,
+            headers=headers,
+            content=content,
+            query_string=sub_request.query_string
+        )
+        try:
+            body = await response.aread()
+        finally:
+            await release()
+        headers_out = [(k, v) for (k, v) in response.headers.multi_items()
+                       if k.lower() not in DECODED_RESPONSE_EXCLUDED_HEADERS]
+        return body, response.status_code, headers_out
+
+    try:
+        if coalescing_requested(sub_request.path, headers):
+            key = coalescing_key(sub_request.method, sub_request.cache_key, content, headers)
+            unshared_fetch = fetch
+            fetch = lambda: single_flight.do(key, unshared_fetch)
+
+        ttl = response_cache.ttl_for(sub_request.path)
+        if sub_request.method == 'GET' and ttl is not None:
+            key = cache_key(sub_request.cache_key, headers)
+            entry = response_cache.get(key)
+            if entry is None:
+                body, status, response_headers = await fetch()
+                response_headers = [(k, v) for (k, v) in response_headers if k.lower() not in ('etag', 'cache-control')]
+                entry = response_cache.store(key, ttl, body, status, response_headers)
+            body, status, response_headers = entry.body, entry.status, entry.headers
+        else:
+            body, status, response_headers = await fetch()
+            response_cache.invalidate_for_write(sub_request.method, sub_request.path)
+    except Exception as e:
+        return batch_result(sub_request, 503, {'error': f'{sub_request.service_name} service unavailable: {str(e)}'})
+
+    content_type = next((v for (k, v) in response_headers if k.lower() == 'content-type'), None)
+    return batch_result(sub_request, status, decode_body(body, content_type))
+
+
+async def batch(request):
+    """Run many sub-requests concurrently in one round trip (see main.batch)"""
+    try:
+        payload = json.loads(await request.body() or b'null')
+    except ValueError:
+        payload = None
+    try:
+        sub_requests, concurrency, stream = parse_batch(payload)
+    except BatchError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    base_headers = {k: v for (k, v) in filter_request_headers(request.headers.items()).items()
+                    if k.lower() not in ('content-length', 'content-type')}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(sub_request):
+        async with semaphore:
+            return await run_sub_request(sub_request, base_headers)
+
+    if stream:
+        async def generate():
+            tasks = [asyncio.create_task(bounded(sub_request)) for sub_request in sub_requests]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield json.dumps(await next_done) + '\n'
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    results = await asyncio.gather(*(bounded(sub_request) for sub_request in sub_requests))
+    return JSONResponse({'results': results})
+
+
+async def gateway_pools(request):
+    """Replica routing, circuit breaker and connection pool statistics for the upstream microservices"""
+    return JSONResponse(proxy_engine.stats())
+
+
+async def probe_service(service_name):
+    """Health probe recorded into the shared prober history: a service is healthy while any replica is"""
+    results = await proxy_engine.probe(service_name, timeout=health_prober.timeout)
+    healthy_times = [r['response_time'] for r in results if r['healthy']]
+    if not healthy_times and all('error' in r for r in results):
+        health_prober.record(service_name, False, error='; '.join(f"{r['url']}: {r['error']}" for r in results))
+    else:
+        health_prober.record(service_name, bool(healthy_times), min(healthy_times) if healthy_times else None)
+
+
+async def run_health_prober():
+    """Probe every upstream concurrently on the prober interval"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.gather(*(probe_service(name) for name in MICROSERVICES))
+        await asyncio.sleep(max(health_prober.interval - (loop.time() - started), 0))
+
+
+async def health_check(request):
+    """Health check endpoint, answered from the background prober's cached state"""
+    async def fetch():
+        payload = JSONResponse({
+            'gateway': 'healthy',
+            'services': health_prober.snapshot()
+        })
+        return payload.body, 200, [('Content-Type', 'application/json')]
+    return await cached_response(request, fetch)
+
+
+async def gateway_coalescing(request):
+    """Request coalescing statistics"""
+    return JSONResponse(single_flight.stats())
+
+
+async def gateway_cache(request):
+    """Response cache statistics"""
+    return JSONResponse(response_cache.stats())
+
+
+async def gateway_static(request):
+    """Static asset index statistics"""
+    return JSONResponse(static_assets.stats())
+
+
+async def serve(request):
+    """Serve the React frontend from the shared precompressed asset index"""
+    result = static_assets.respond(request.path_params.get('path', ''), request.headers)
+    headers = dict(result.headers)
+    if isinstance(result.body, bytes):
+        response = Response(result.body, status_code=result.status, headers=headers)
+    else:
+        response = StreamingResponse(result.body, status_code=result.status, headers=headers)
+    return response
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    prober_task = asyncio.create_task(run_health_prober())
+    yield
+    prober_task.cancel()
+    await proxy_engine.close()
+
+
+METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+
+app = Starlette(
+    routes=[
+        Route('/api/planning/{path:path}', proxy_planning, methods=METHODS),
+        Route('/api/tools/{path:path}', proxy_tools, methods=METHODS),
+        Route('/api/memory/{path:path}', proxy_memory, methods=METHODS),
+        Route('/api/batch', batch, methods=['POST']),
+        Route('/api/gateway/pools', gateway_pools),
+        Route('/api/gateway/cache', gateway_cache),
+        Route('/api/gateway/coalescing', gateway_coalescing),
+        Route('/api/gateway/static', gateway_static),
+        Route('/api/health', health_check),
+        Route('/', serve),
+        Route('/{path:path}', serve),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    uvicorn.run(app, host='0.0.0.0', port=GATEWAY_PORT)
@@ -0,0 +1,109 @@
+"""Recall/latency/memory benchmark of the IVF and quantised vector indexes against exact search.
+
+Encodes a synthetic corpus of French/English planning texts with the configured
+embedding provider, then compares the approximate index at several nprobe
+values, and int8/binary quantised scans with and without rescoring, with the
+exact float32 matrix product:
+
+    python bench_vector_search.py --rows 200000 --queries 200 --k 10 --rescore-factor 4 8 16
+
+Rescoring here reads the float32 vectors from RAM; the memory service reads
+them from SQLite, so its rescored latencies are somewhat higher.
+"""
+import argparse
+import random
+import time
+import numpy as np
+
+from embeddings import get_encoder
+from vector_index import VectorIndex
+
+VOCABULARY = (
+    'créer planifier analyser rapport données marché stratégie robot image audio générer code python '
+    'tester déployer serveur base recherche web résumé article client vente budget équipe projet '
+    'objectif tâche étape résultat échec succès erreur corriger optimiser mémoire service api '
+    'create plan analyze report data market strategy image audio generate code test deploy server '
+    'search summary article customer sales budget team project goal task step result failure success'
+).split()
+
+
+def synthetic_texts(count, seed):
+    rng = random.Random(seed)
+    # Zipf-like word frequencies so some words are common and most are rare
+    weights = [1.0 / (rank + 1) for rank in range(len(VOCABULARY))]
+    return [' '.join(rng.choices(VOCABULARY, weights, k=rng.randint(5, 20))) + f' ref{rng.randint(0, count)}'
+            for _ in range(count)]
+
+
+def encode_in_batches(encoder, texts, batch_size=5000):
+    return np.vstack([encoder.encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+
+
+def timed_search(index, queries, k, exact, load_vectors=None):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        ids, _ = index.search(query, k, exact=exact, load_vectors=load_vectors)
+        latencies.append(time.perf_counter() - started)
+        results.append(set(ids.tolist()))
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--quantization', nargs='*', default=['int8', 'binary'], choices=['int8', 'binary'])
+    parser.add_argument('--rescore-factor', type=int, nargs='+', default=[4, 8, 16, 64],
+                        help='shortlists rescored exactly, in results asked for')
+    parser.add_argument('--provider', default=None)
+    args = parser.parse_args()
+
+    encoder = get_encoder(args.provider)
+    started = time.perf_counter()
+    vectors = encode_in_batches(encoder, synthetic_texts(args.rows, seed=1))
+    encode_seconds = time.perf_counter() - started
+    queries = encoder.encode(synthetic_texts(args.queries, seed=2))
+
+    index = VectorIndex(encoder.dim, ann_min_rows=0)
+    started = time.perf_counter()
+    index.add(np.arange(1, args.rows + 1), vectors)
+    build_seconds = time.perf_counter() - started
+
+    print(f'{args.rows} vectors, dim {encoder.dim} ({encoder.name}), '
+          f'encoded in {encode_seconds:.1f}s ({args.rows / encode_seconds:.0f}/s), '
+          f'IVF with {index.stats()["lists"]} lists built in {build_seconds:.1f}s')
+
+    truth, exact_ms = timed_search(index, queries, args.k, exact=True)
+    float_mb = index.stats()['bytes'] / 1e6
+
+    def report(method, found, latencies, megabytes):
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f'{method:<14}{recall:>10.3f}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}'
+              f'{megabytes:>10.1f}')
+
+    print(f'{"method":<14}{"recall@" + str(args.k):>10}{"p50 ms":>10}{"p95 ms":>10}{"index MB":>10}')
+    report('exact', truth, exact_ms, float_mb)
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        found, ivf_ms = timed_search(index, queries, args.k, exact=False)
+        report(f'ivf/{nprobe}', found, ivf_ms, float_mb)
+
+    # Quantised scans of the whole store; rescoring reads the float32 vectors of its shortlist by id
+    load_vectors = lambda ids: vectors[ids - 1]
+    for quantization in args.quantization:
+        quantized = VectorIndex(encoder.dim, ann_min_rows=args.rows + 1, quantization=quantization)
+        quantized.add(np.arange(1, args.rows + 1), vectors)
+        megabytes = quantized.stats()['bytes'] / 1e6
+        found, latencies = timed_search(quantized, queries, args.k, exact=True)
+        report(quantization, found, latencies, megabytes)
+        for factor in args.rescore_factor:
+            quantized.rescore_factor = factor
+            found, latencies = timed_search(quantized, queries, args.k, exact=True, load_vectors=load_vectors)
+            report(f'{quantization}+r{factor}', found, latencies, megabytes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import os
+import re
+import zlib
+import threading
+import numpy as np
+
+from text_analysis import fold
+
+# Embedding provider for memory retrieval; 'hashing' works offline and is deterministic
+MEMORY_EMBEDDING_PROVIDER = os.getenv('MEMORY_EMBEDDING_PROVIDER', 'hashing')
+MEMORY_EMBEDDING_DIM = int(os.getenv('MEMORY_EMBEDDING_DIM', '384'))
+MEMORY_EMBEDDING_MODEL = os.getenv('MEMORY_EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+
+WORD_PATTERN = re.compile(r'\w+')
+# Relative weight of character trigrams against whole words
+TRIGRAM_WEIGHT = 0.5
+# Hashed words kept in memory before the vocabulary is rebuilt from scratch
+MAX_VOCABULARY = 500000
+
+
+class HashingEncoder:
+    """Feature-hashing encoder over words and character trigrams.
+
+    No model to download and the same text always maps to the same vector, so
+    stored embeddings stay valid across restarts and machines. Trigrams give
+    some tolerance to inflections and typos ("planifier" / "planification").
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim=MEMORY_EMBEDDING_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._reset_vocabulary()
+
+    def _reset_vocabulary(self):
+        # Hashed features of every word seen so far, stored CSR-style: word id -> slice of the flat arrays.
+        # The arrays only grow (by reallocating to twice the size), so slices handed out stay valid.
+        self._vocabulary = {}
+        self._starts = np.zeros(1024, dtype=np.intp)
+        self._lengths = np.zeros(1024, dtype=np.intp)
+        self._indices = np.zeros(16384, dtype=np.intp)
+        self._weights = np.zeros(16384, dtype=np.float64)
+        self._features = 0
+
+    def _add_words(self, words):
+        """Hash the word and trigram features of new lowercased words and append them to the vocabulary"""
+        grams, lengths = [], []
+        for word in words:
+            folded = word if word.isascii() else fold(word)
+            padded = f'#{folded}#'
+            word_grams = [f'w:{folded}'] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+            grams.extend(word_grams)
+            lengths.append(len(word_grams))
+        hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.int64, count=len(grams))
+        weights = np.full(len(grams), TRIGRAM_WEIGHT)
+        lengths = np.asarray(lengths, dtype=np.intp)
+        weights[np.cumsum(lengths) - lengths] = 1.0
+
+        first, count = len(self._vocabulary), len(words)
+        self._starts = grow(self._starts, first + count)
+        self._lengths = grow(self._lengths, first + count)
+        self._indices = grow(self._indices, self._features + len(grams))
+        self._weights = grow(self._weights, self._features + len(grams))
+        self._starts[first:first + count] = self._features + np.cumsum(lengths) - lengths
+        self._lengths[first:first + count] = lengths
+        self._indices[self._features:self._features + len(grams)] = hashes % self.dim
+        self._weights[self._features:self._features + len(grams)] = np.where(hashes & 0x80000000, weights, -weights)
+        self._features += len(grams)
+        self._vocabulary.update(zip(words, range(first, first + count)))
+
+    def encode(self, texts):
+        """L2-normalised float32 matrix with one row per text"""
+        rows = [WORD_PATTERN.findall((text or '').lower()) for text in texts]
+        with self._lock:
+            unseen = list(dict.fromkeys(word for words in rows for word in words if word not in self._vocabulary))
+            # The cap is only enforced before a call's words are resolved, so its ids all refer to one vocabulary
+            if unseen and len(self._vocabulary) + len(unseen) > MAX_VOCABULARY:
+                self._reset_vocabulary()
+                unseen = list(dict.fromkeys(word for words in rows for word in words))
+            if unseen:
+                self._add_words(unseen)
+            lookup = self._vocabulary.__getitem__
+            word_ids = [lookup(word) for words in rows for word in words]
+            starts, lengths, indices, weights = self._starts, self._lengths, self._indices, self._weights
+        word_rows = [row for row, words in enumerate(rows) for _ in words]
+
+        # Expand each word occurrence into its feature slice with NumPy gathers
+        word_ids = np.asarray(word_ids, dtype=np.intp)
+        counts = lengths[word_ids]
+        total = int(counts.sum())
+        ends = np.cumsum(counts)
+        positions = np.arange(total) - np.repeat(ends - counts, counts) + np.repeat(starts[word_ids], counts)
+        cells = np.repeat(np.asarray(word_rows, dtype=np.intp) * self.dim, counts) + indices[positions]
+        matrix = np.bincount(cells, weights=weights[positions], minlength=len(texts) * self.dim)
+        return normalize(matrix.reshape(len(texts), self.dim).astype(np.float32))
+
+
+class SentenceTransformerEncoder:
+    """Neural embeddings from a local sentence-transformers model (optional dependency)"""
+
+    name = 'sentence-transformers'
+
+    def __init__(self, model=MEMORY_EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=64, convert_to_numpy=True)
+        return normalize(vectors.astype(np.float32))
+
+
+PROVIDERS = {
+    'hashing': HashingEncoder,
+    'sentence-transformers': SentenceTransformerEncoder
+}
+
+
+def register_provider(name, factory):
+    """Make an encoder available under MEMORY_EMBEDDING_PROVIDER=name.
+
+    factory() must return an object with name, dim and encode(texts) giving an
+    L2-normalised float32 matrix.
+    """
+    PROVIDERS[name] = factory
+
+
+def get_encoder(provider=None):
+    return PROVIDERS[provider or MEMORY_EMBEDDING_PROVIDER]()
+
+
+def grow(array, size):
+    """array, or a copy at least twice as large when it cannot hold size items"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def to_blob(vector):
+    """Compact storage: little-endian float32 bytes"""
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype='<f4')
@@ -0,0 +1,173 @@
+"""Offline ranking-quality/latency evaluation of the memory retrieval modes.
+
+By default builds a synthetic store in a temporary database: experiences on
+ten topics written with varying inflections (FR/EN), random success flags and
+ages spread over six months. A result's gain for a query is 0 when it is off
+topic, otherwise 1, plus 1 if the experience succeeded, plus 1 if it is less
+than 30 days old, i.e. the memories worth spending prompt tokens on.
+
+    python eval_ranking.py --rows 20000 --queries 200 --k 10
+
+With --judgments, evaluates the configured store (MEMORY_DB_PATH) instead,
+from one JSON object per line: {"query": "...", "gains": {"<id>": gain, ...}}.
+Hybrid weight variants to compare are given as JSON with --weights.
+"""
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import tempfile
+import time
+import numpy as np
+
+TOPICS = [
+    [('planifier', 'planification', 'planifié'), ('rapport', 'rapports'), ('analyser', 'analyse', 'analyses'), ('donnée', 'données')],
+    [('marché', 'marchés'), ('stratégie', 'stratégies'), ('client', 'clients'), ('vente', 'ventes')],
+    [('robot', 'robots', 'robotique'), ('image', 'images'), ('vidéo', 'vidéos'), ('musique', 'musiques')],
+    [('serveur', 'serveurs'), ('déployer', 'déploiement', 'déployé'), ('réseau', 'réseaux'), ('sécurité', 'sécuriser', 'sécurisé')],
+    [('tester', 'tests', 'testing'), ('code', 'coder', 'codé'), ('python', 'pythonique'), ('optimiser', 'optimisation', 'optimisé')],
+    [('budget', 'budgets'), ('facture', 'factures'), ('contrat', 'contrats'), ('prix', 'tarif', 'tarifs')],
+    [('recrutement', 'recruter', 'recruté'), ('formation', 'former', 'formations'), ('salarié', 'salariés'), ('entretien', 'entretiens')],
+    [('traduction', 'traduire', 'traduit'), ('résumé', 'résumer', 'résumés'), ('article', 'articles'), ('recherche', 'rechercher', 'recherches')],
+    [('email', 'emails'), ('campagne', 'campagnes'), ('produit', 'produits'), ('newsletter', 'newsletters')],
+    [('livraison', 'livrer', 'livré'), ('stock', 'stocks'), ('commande', 'commandes'), ('entrepôt', 'entrepôts')]
+]
+FILLER = 'tâche projet équipe étape objectif résultat nouveau rapide complet task project team step goal result'.split()
+
+DEFAULT_WEIGHT_VARIANTS = [
+    {'lexical': 0.5, 'vector': 0.5, 'recency': 0.0, 'success': 0.0},
+    {},
+    {'recency': 0.3, 'success': 0.3}
+]
+
+
+def synthetic_corpus(rows, seed):
+    rng = random.Random(seed)
+    items, meta = [], []
+    for _ in range(rows):
+        topic = rng.randrange(len(TOPICS))
+        words = [rng.choice(family) for family in rng.sample(TOPICS[topic], rng.randint(2, 3))]
+        words += rng.sample(FILLER, 2)
+        rng.shuffle(words)
+        success = rng.random() < 0.5
+        items.append({
+            'objective': ' '.join(words),
+            'results': f"{rng.choice(rng.choice(TOPICS[topic]))} {'terminé' if success else 'interrompu'}",
+            'success': success,
+            'source': 'eval'
+        })
+        meta.append((topic, success, rng.uniform(0, 180)))
+    return items, meta
+
+
+def synthetic_queries(count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        topic = rng.randrange(len(TOPICS))
+        families = rng.sample(TOPICS[topic], 2)
+        queries.append((topic, ' '.join(rng.choice(family) for family in families)))
+    return queries
+
+
+def synthetic_judgments(memory, rows, query_count, seed):
+    """Store a synthetic corpus and return (query, {id: gain}) judgments for it"""
+    items, meta = synthetic_corpus(rows, seed)
+    stored = {}
+    batch_size = memory.MEMORY_BULK_BATCH_SIZE
+    for start in range(0, len(items), batch_size):
+        for result in memory.bulk_store('experiences', memory.EXPERIENCE_FIELDS,
+                                        enumerate(items[start:start + batch_size]), memory.experience_row):
+            if 'id' in result and not result.get('duplicate'):
+                stored[result['id']] = meta[start + result['index']]
+    if memory.embedding_pool is not None:
+        memory.embedding_pool.wait()
+    if memory.term_indexer is not None:
+        memory.term_indexer.flush()
+    for shard in memory.shards:
+        with shard.db.write() as conn:
+            conn.executemany("UPDATE experiences SET timestamp = datetime('now', ?) WHERE id = ?",
+                             [(f'-{round(age * 86400)} seconds', row_id) for row_id, (_, _, age) in stored.items()])
+
+    gains = {}
+    for row_id, (topic, success, age) in stored.items():
+        gains.setdefault(topic, {})[row_id] = 1 + int(success) + int(age < 30)
+    return [(query, gains.get(topic, {})) for topic, query in synthetic_queries(query_count, seed + 1)]
+
+
+def load_judgments(path):
+    with open(path) as f:
+        return [(record['query'], {int(row_id): gain for row_id, gain in record['gains'].items()})
+                for record in map(json.loads, filter(str.strip, f))]
+
+
+def ndcg(ranked_gains, ideal_gains, k):
+    dcg = sum(gain / math.log2(rank + 2) for rank, gain in enumerate(ranked_gains[:k]))
+    ideal = sum(gain / math.log2(rank + 2) for rank, gain in enumerate(sorted(ideal_gains, reverse=True)[:k]))
+    return dcg / ideal if ideal else 0.0
+
+
+def evaluate(memory, table, judgments, k, mode, weights=None):
+    scores, reciprocal_ranks, precisions, latencies = [], [], [], []
+    for query, gains in judgments:
+        request = {'query': query, 'mode': mode, 'limit': k, 'fields': ['id']}
+        if weights:
+            request['weights'] = weights
+        # Synthetic query sets repeat queries: time the retrieval itself, not a retrieval cache hit
+        memory.retrieval_cache.clear()
+        started = time.perf_counter()
+        payload, status = memory.find_records(table, request)
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            raise RuntimeError(payload['error'])
+        ranked = [gains.get(result['id'], 0) for result in payload[table]]
+        scores.append(ndcg(ranked, list(gains.values()), k))
+        best = max(gains.values(), default=0)
+        reciprocal_ranks.append(next((1 / (rank + 1) for rank, gain in enumerate(ranked) if gain == best), 0.0))
+        precisions.append(sum(1 for gain in ranked if gain > 0) / k)
+    latencies = np.array(latencies) * 1000
+    return np.mean(scores), np.mean(reciprocal_ranks), np.mean(precisions), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--judgments', help='JSONL judgments against the configured store instead of a synthetic one')
+    parser.add_argument('--table', default='experiences', choices=['experiences', 'knowledge'])
+    parser.add_argument('--weights', action='append', type=json.loads,
+                        help='hybrid weight overrides to compare, as JSON (repeatable)')
+    args = parser.parse_args()
+
+    if not args.judgments:
+        # A throwaway store: point the memory service at a temporary database before importing it
+        store = tempfile.TemporaryDirectory(prefix='eval-ranking-')
+        os.environ['MEMORY_DB_PATH'] = os.path.join(store.name, 'memory.db')
+    os.environ.setdefault('MEMORY_WRITE_BEHIND', 'false')
+    os.environ.setdefault('MEMORY_COMPACTION_INTERVAL', '0')
+    import memory
+
+    if args.judgments:
+        judgments = load_judgments(args.judgments)
+    else:
+        started = time.perf_counter()
+        judgments = synthetic_judgments(memory, args.rows, args.queries, args.seed)
+        print(f'{args.rows} synthetic experiences stored in {time.perf_counter() - started:.1f}s, '
+              f'{len(judgments)} queries', file=sys.stderr)
+
+    print(f'{"method":<60}{"nDCG@" + str(args.k):>9}{"MRR":>8}{"P@" + str(args.k):>8}{"p50 ms":>9}{"p95 ms":>9}')
+    runs = [(mode, None) for mode in ('lexical', 'keyword', 'semantic')]
+    runs += [('hybrid', weights) for weights in (args.weights or DEFAULT_WEIGHT_VARIANTS)]
+    for mode, weights in runs:
+        label = mode if weights is None else 'hybrid ' + ' '.join(
+            f'{name}={weight:g}' for name, weight in memory.memory_ranking.resolve_weights(weights).items())
+        quality, mrr, precision, p50, p95 = evaluate(memory, args.table, judgments, args.k, mode, weights)
+        print(f'{label:<60}{quality:>9.3f}{mrr:>8.3f}{precision:>8.3f}{p50:>9.2f}{p95:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import os
+import json
+from gateway_proxy import filter_request_headers
+
+# Batch endpoint limits
+GATEWAY_BATCH_MAX_REQUESTS = int(os.getenv('GATEWAY_BATCH_MAX_REQUESTS', '100'))
+GATEWAY_BATCH_MAX_CONCURRENCY = int(os.getenv('GATEWAY_BATCH_MAX_CONCURRENCY', '8'))
+
+# Public path prefixes of the proxied services
+SERVICE_ROUTES = {
+    '/api/planning/': 'planning-brain',
+    '/api/tools/': 'tools-manager',
+    '/api/memory/': 'memory-service'
+}
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+
+class BatchError(ValueError):
+    """Raised for a malformed batch payload"""
+
+
+class SubRequest:
+    """One entry of a batch, resolved to its upstream service; error is set when the entry is invalid"""
+
+    def __init__(self, index, item):
+        self.index = index
+        self.method = None
+        self.path = None
+        self.query_string = ''
+        self.body = None
+        self.headers = {}
+        self.service_name = None
+        self.upstream_path = None
+        self.error = self._parse(item)
+
+    def _parse(self, item):
+        """Validate the entry and resolve its service; returns why it is invalid, or None"""
+        if not isinstance(item, dict):
+            return 'Each request must be an object'
+        method, path, headers = item.get('method', 'GET'), item.get('path'), item.get('headers') or {}
+        if not isinstance(path, str) or not path:
+            return 'path must be a non-empty string'
+        self.path, _, self.query_string = path.partition('?')
+        if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+            return f'Unsupported method: {method}'
+        self.method = method.upper()
+        if not isinstance(headers, dict) or not all(isinstance(value, str) for value in headers.values()):
+            return 'headers must be an object of string values'
+        # Filtered like proxied requests; the body is re-encoded, so its length is recomputed too
+        self.headers = {key: value for key, value in filter_request_headers(headers.items()).items()
+                        if key.lower() != 'content-length'}
+        # Any JSON value: strings are sent as is, anything else JSON-encoded
+        self.body = item.get('body')
+        for prefix, service_name in SERVICE_ROUTES.items():
+            if self.path.startswith(prefix):
+                self.service_name = service_name
+                self.upstream_path = '/api/' + self.path[len(prefix):]
+                return None
+        return f'Path is not routed by the gateway: {path}'
+
+    @property
+    def cache_key(self):
+        """Same key format as request.full_path, so batch reads share the response cache"""
+        return f"{self.path}?{self.query_string}"
+
+    def encoded_body(self):
+        if self.body is None:
+            return None
+        if isinstance(self.body, str):
+            return self.body.encode('utf-8')
+        return json.dumps(self.body).encode('utf-8')
+
+
+def parse_batch(payload, max_requests=GATEWAY_BATCH_MAX_REQUESTS, max_concurrency=GATEWAY_BATCH_MAX_CONCURRENCY):
+    """Validate a batch payload and return (sub_requests, concurrency, stream).
+
+    The payload is either a list of {method, path, body, headers} objects or an
+    object with a 'requests' list plus optional 'stream' and 'max_concurrency'.
+    """
+    options = {}
+    if isinstance(payload, dict):
+        options = payload
+        payload = payload.get('requests')
+    if not isinstance(payload, list) or not payload:
+        raise BatchError('A non-empty list of requests is required')
+    if len(payload) > max_requests:
+        raise BatchError(f'At most {max_requests} requests are allowed per batch')
+
+    # An invalid entry gets its own 400 result; the rest of the batch still runs
+    sub_requests = [SubRequest(index, item) for index, item in enumerate(payload)]
+
+    concurrency = options.get('max_concurrency') or max_concurrency
+    try:
+        concurrency = max(1, min(int(concurrency), max_concurrency))
+    except (TypeError, ValueError):
+        raise BatchError('max_concurrency must be an integer')
+    return sub_requests, concurrency, bool(options.get('stream', False))
+
+
+def decode_body(content, content_type):
+    """Embed an upstream body in the batch result: parsed JSON when possible, text otherwise"""
+    if 'json' in (content_type or ''):
+        try:
+            return json.loads(content)
+        except ValueError:
+            pass
+    return content.decode('utf-8', errors='replace')
+
+
+def batch_result(sub_request, status, body):
+    return {'index': sub_request.index, 'path': sub_request.path, 'status': status, 'body': body}
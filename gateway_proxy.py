@@ -0,0 +1,301 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from load_balancer import ReplicaSet
+
+# Upstream connection pool configuration
+GATEWAY_POOL_SIZE = int(os.getenv('GATEWAY_POOL_SIZE', '20'))
+GATEWAY_POOL_IDLE_TIMEOUT = float(os.getenv('GATEWAY_POOL_IDLE_TIMEOUT', '60'))
+GATEWAY_POOL_BLOCK = os.getenv('GATEWAY_POOL_BLOCK', 'true').lower() in ('1', 'true', 'yes')
+GATEWAY_UPSTREAM_TIMEOUT = float(os.getenv('GATEWAY_UPSTREAM_TIMEOUT', '120'))
+
+# Streaming pass-through configuration
+GATEWAY_STREAMING = os.getenv('GATEWAY_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+GATEWAY_STREAM_CHUNK_SIZE = int(os.getenv('GATEWAY_STREAM_CHUNK_SIZE', str(64 * 1024)))
+
+# Upstream statuses that count as a replica failure for circuit breaking
+UPSTREAM_FAILURE_STATUSES = {502, 503, 504}
+
+# Headers that only make sense for a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host'
+}
+
+# Upstream response headers the gateway's own server sets; forwarding them would duplicate them
+ORIGIN_RESPONSE_HEADERS = {'date', 'server'}
+RESPONSE_EXCLUDED_HEADERS = HOP_BY_HOP_HEADERS | ORIGIN_RESPONSE_HEADERS
+DECODED_RESPONSE_EXCLUDED_HEADERS = RESPONSE_EXCLUDED_HEADERS | {'content-encoding', 'content-length'}
+
+
+def filter_request_headers(headers):
+    """Drop hop-by-hop headers from an incoming request before forwarding it"""
+    return {key: value for (key, value) in headers if key.lower() not in HOP_BY_HOP_HEADERS}
+
+
+def filter_response_headers(headers, decoded=True):
+    """Drop hop-by-hop and origin Date/Server headers from an upstream response.
+
+    A decoded (buffered) body no longer matches the upstream framing, so its
+    Content-Encoding and Content-Length are dropped too. Streamed bodies are
+    passed through byte for byte and keep them.
+    """
+    excluded = DECODED_RESPONSE_EXCLUDED_HEADERS if decoded else RESPONSE_EXCLUDED_HEADERS
+    return [(key, value) for (key, value) in headers.items() if key.lower() not in excluded]
+
+
+class RequestBodyStream:
+    """Forward an incoming request body in chunks instead of reading it into memory.
+
+    When the length is known it is advertised so the upstream receives a plain
+    Content-Length body; otherwise requests falls back to chunked encoding.
+    """
+
+    def __init__(self, stream, length=None, chunk_size=GATEWAY_STREAM_CHUNK_SIZE):
+        self.stream = stream
+        self.length = length or 0
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class StreamingBody:
+    """Iterate a streamed upstream response and release its pooled connection when done"""
+
+    def __init__(self, response, on_close, chunk_size=GATEWAY_STREAM_CHUNK_SIZE):
+        self.response = response
+        self.on_close = on_close
+        self.chunk_size = chunk_size
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.response.raw.stream(self.chunk_size, decode_content=False):
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.response.close()
+            self.on_close()
+
+
+class UpstreamPool:
+    """Persistent keep-alive connections to a single upstream service"""
+
+    def __init__(self, name, base_url, pool_size, pool_block):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                   pool_block=pool_block, max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.idle_evictions = 0
+        self.closed_connections = 0
+
+    def _connection_pools(self):
+        pools = self.adapter.poolmanager.pools
+        return [pools[key] for key in pools.keys()]
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.requests += 1
+            self.last_used = time.monotonic()
+
+    def end(self, failed=False):
+        with self.lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors += 1
+            self.last_used = time.monotonic()
+
+    def evict_if_idle(self, idle_timeout):
+        """Close pooled sockets if the upstream has not been used for idle_timeout seconds"""
+        with self.lock:
+            if self.in_flight or time.monotonic() - self.last_used < idle_timeout:
+                return False
+            pools = self._connection_pools()
+            if not pools:
+                return False
+            self.closed_connections += sum(pool.num_connections for pool in pools)
+            self.adapter.poolmanager.clear()
+            self.idle_evictions += 1
+            return True
+
+    def stats(self):
+        opened = self.closed_connections
+        idle = 0
+        for pool in self._connection_pools():
+            opened += pool.num_connections
+            idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        with self.lock:
+            return {
+                'url': self.base_url,
+                'pool_size': self.pool_size,
+                'in_flight': self.in_flight,
+                'idle_connections': idle,
+                'requests': self.requests,
+                'errors': self.errors,
+                'connections_opened': opened,
+                'connections_reused': max(self.requests - opened, 0),
+                'idle_evictions': self.idle_evictions,
+                'idle_seconds': round(time.monotonic() - self.last_used, 3)
+            }
+
+    def close(self):
+        self.session.close()
+
+
+def is_connect_failure(error):
+    """True when a request failed before reaching the upstream, so another replica can safely take it"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], 'reason', error.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class ProxyEngine:
+    """Shared proxy engine routing each service across its replicas over bounded keep-alive pools"""
+
+    def __init__(self, upstreams, pool_size=GATEWAY_POOL_SIZE, idle_timeout=GATEWAY_POOL_IDLE_TIMEOUT,
+                 pool_block=GATEWAY_POOL_BLOCK, timeout=GATEWAY_UPSTREAM_TIMEOUT):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.services = {}
+        for name, urls in upstreams.items():
+            replica_set = ReplicaSet(name, urls)
+            for replica in replica_set.replicas:
+                replica.transport = UpstreamPool(name, replica.url, pool_size, pool_block)
+            self.services[name] = replica_set
+        self._reaper = None
+        self._reaper_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _pools(self):
+        return [replica.transport for replica_set in self.services.values() for replica in replica_set.replicas]
+
+    def _start_reaper(self):
+        if self._reaper is not None or self.idle_timeout <= 0:
+            return
+        with self._reaper_lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_idle, name='proxy-pool-reaper', daemon=True)
+                self._reaper.start()
+
+    def _reap_idle(self):
+        interval = max(self.idle_timeout / 2, 1)
+        while not self._stopped.wait(interval):
+            for pool in self._pools():
+                pool.evict_if_idle(self.idle_timeout)
+
+    def _send(self, service_name, path, method, headers, data, query_string, timeout, stream):
+        """Dispatch to the best replica, failing over to the next one when a connection cannot be made"""
+        replica_set = self.services[service_name]
+        self._start_reaper()
+        if isinstance(query_string, bytes):
+            query_string = query_string.decode('latin-1')
+        tried = []
+        while True:
+            replica = replica_set.acquire(exclude=tried)
+            pool = replica.transport
+            url = f"{pool.base_url}{path}?{query_string}" if query_string else f"{pool.base_url}{path}"
+            started = time.monotonic()
+            pool.begin()
+            try:
+                response = pool.session.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    data=data,
+                    allow_redirects=False,
+                    timeout=timeout or self.timeout,
+                    stream=stream
+                )
+            except Exception as e:
+                pool.end(failed=True)
+                replica_set.release(replica, failed=True)
+                tried.append(replica)
+                if is_connect_failure(e) and len(tried) < len(replica_set.replicas):
+                    continue
+                raise
+            return response, replica_set, replica, time.monotonic() - started
+
+    def forward(self, service_name, path, method, headers=None, data=None, query_string=b'', timeout=None):
+        """Send a request to an upstream over its pooled connections and return the buffered response"""
+        response, replica_set, replica, latency = self._send(service_name, path, method, headers, data,
+                                                             query_string, timeout, stream=False)
+        replica.transport.end()
+        replica_set.release(replica, latency, failed=response.status_code in UPSTREAM_FAILURE_STATUSES)
+        return response
+
+    def forward_streaming(self, service_name, path, method, headers=None, data=None, query_string=b'', timeout=None):
+        """Send a request upstream without buffering its response.
+
+        Returns the response together with a StreamingBody; the pooled connection
+        and the replica's outstanding slot are held until the body has been
+        iterated or closed.
+        """
+        response, replica_set, replica, latency = self._send(service_name, path, method, headers, data,
+                                                             query_string, timeout, stream=True)
+        failed = response.status_code in UPSTREAM_FAILURE_STATUSES
+
+        def release():
+            replica.transport.end()
+            replica_set.release(replica, latency, failed=failed)
+
+        return response, StreamingBody(response, release)
+
+    def probe(self, service_name, path='/api/health', timeout=None):
+        """Check every replica of a service directly, bypassing routing and circuit breakers"""
+        results = []
+        for replica in self.services[service_name].replicas:
+            try:
+                response = replica.transport.session.get(f"{replica.url}{path}", timeout=timeout or self.timeout)
+                results.append({'url': replica.url, 'healthy': response.status_code == 200,
+                                'response_time': response.elapsed.total_seconds()})
+            except Exception as e:
+                results.append({'url': replica.url, 'healthy': False, 'error': str(e)})
+        return results
+
+    def stats(self):
+        upstreams = {}
+        for name, replica_set in self.services.items():
+            service_stats = replica_set.stats()
+            for replica, replica_stats in zip(replica_set.replicas, service_stats['replicas']):
+                replica_stats.update(replica.transport.stats())
+            upstreams[name] = service_stats
+        return {
+            'pool_size': self.pool_size,
+            'idle_timeout': self.idle_timeout,
+            'streaming': GATEWAY_STREAMING,
+            'upstreams': upstreams
+        }
+
+    def close(self):
+        self._stopped.set()
+        for pool in self._pools():
+            pool.close()
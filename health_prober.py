@@ -0,0 +1,107 @@
+import os
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Background health probing configuration
+GATEWAY_HEALTH_INTERVAL = float(os.getenv('GATEWAY_HEALTH_INTERVAL', '5'))
+GATEWAY_HEALTH_TIMEOUT = float(os.getenv('GATEWAY_HEALTH_TIMEOUT', '2'))
+GATEWAY_HEALTH_HISTORY = int(os.getenv('GATEWAY_HEALTH_HISTORY', '120'))
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class HealthProber:
+    """Probe upstream services on an interval and keep a rolling latency/availability history.
+
+    The history is fed either by the built-in probing thread (start) or by an
+    external scheduler calling record, so /api/health never waits on an upstream.
+    """
+
+    def __init__(self, services, interval=GATEWAY_HEALTH_INTERVAL, timeout=GATEWAY_HEALTH_TIMEOUT,
+                 history=GATEWAY_HEALTH_HISTORY):
+        self.services = list(services)
+        self.interval = interval
+        self.timeout = timeout
+        self.history = {name: deque(maxlen=history) for name in self.services}
+        self.latest = {name: None for name in self.services}
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def record(self, service_name, healthy, response_time=None, error=None):
+        """Store the outcome of one probe"""
+        sample = {
+            'healthy': healthy,
+            'response_time': response_time,
+            'error': error,
+            'checked_at': time.time()
+        }
+        with self.lock:
+            self.history[service_name].append(sample)
+            self.latest[service_name] = sample
+
+    def start(self, probe):
+        """Run probe(service_name, timeout) for every service concurrently on a background thread.
+
+        probe returns (healthy, response_time) or raises; calling start again is a no-op.
+        """
+        if self._thread is not None:
+            return
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(probe,), name='health-prober', daemon=True)
+            self._thread.start()
+
+    def _probe_one(self, probe, service_name):
+        try:
+            healthy, response_time = probe(service_name, self.timeout)
+            self.record(service_name, healthy, response_time)
+        except Exception as e:
+            self.record(service_name, False, error=str(e))
+
+    def _run(self, probe):
+        with ThreadPoolExecutor(max_workers=max(len(self.services), 1), thread_name_prefix='health-probe') as executor:
+            while True:
+                started = time.monotonic()
+                list(executor.map(lambda name: self._probe_one(probe, name), self.services))
+                if self._stopped.wait(max(self.interval - (time.monotonic() - started), 0)):
+                    break
+
+    def stop(self):
+        self._stopped.set()
+
+    def service_status(self, service_name):
+        with self.lock:
+            samples = list(self.history[service_name])
+            latest = self.latest[service_name]
+        if latest is None:
+            return {'status': 'unknown'}
+
+        latencies = sorted(s['response_time'] for s in samples if s['healthy'] and s['response_time'] is not None)
+        status = {
+            'status': 'healthy' if latest['healthy'] else ('unhealthy' if latest['error'] is None else 'unavailable'),
+            'response_time': latest['response_time'],
+            'last_checked': latest['checked_at'],
+            'availability': sum(1 for s in samples if s['healthy']) / len(samples),
+            'samples': len(samples),
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99)
+        }
+        if latest['error'] is not None:
+            status['error'] = latest['error']
+        return status
+
+    def snapshot(self):
+        """Cached health of every service, answered without touching the network"""
+        return {name: self.service_status(name) for name in self.services}
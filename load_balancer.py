@@ -0,0 +1,157 @@
+import os
+import random
+import threading
+import time
+
+# Replica routing configuration
+GATEWAY_LB_STRATEGY = os.getenv('GATEWAY_LB_STRATEGY', 'least_outstanding')
+GATEWAY_EWMA_DECAY = float(os.getenv('GATEWAY_EWMA_DECAY', '0.3'))
+GATEWAY_BREAKER_FAILURES = int(os.getenv('GATEWAY_BREAKER_FAILURES', '5'))
+GATEWAY_BREAKER_RESET_TIMEOUT = float(os.getenv('GATEWAY_BREAKER_RESET_TIMEOUT', '10'))
+
+STRATEGIES = ('least_outstanding', 'ewma')
+
+
+def parse_replicas(env_name, default):
+    """Read a comma-separated list of replica URLs from the environment"""
+    value = os.getenv(env_name, default)
+    return [url.strip().rstrip('/') for url in value.split(',') if url.strip()]
+
+
+# Microservices configuration shared by the gateways: each service maps to one or more replicas,
+# overridable with a comma-separated list of URLs (e.g. PLANNING_BRAIN_REPLICAS)
+MICROSERVICES = {
+    'planning-brain': parse_replicas('PLANNING_BRAIN_REPLICAS', 'http://localhost:5001'),
+    'tools-manager': parse_replicas('TOOLS_MANAGER_REPLICAS', 'http://localhost:5002'),
+    'memory-service': parse_replicas('MEMORY_SERVICE_REPLICAS', 'http://localhost:5003')
+}
+
+
+class NoHealthyReplica(Exception):
+    """Raised when every replica of a service has an open circuit breaker"""
+
+
+class CircuitBreaker:
+    """Per-replica breaker: opens after consecutive failures, lets one trial through after a cool-down"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=GATEWAY_BREAKER_FAILURES, reset_timeout=GATEWAY_BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    def allows_request(self, now):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+        return self.state == self.HALF_OPEN and not self.trial_in_flight
+
+    def on_dispatch(self):
+        if self.state == self.HALF_OPEN:
+            self.trial_in_flight = True
+
+    def on_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def on_failure(self, now):
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = now
+
+
+class Replica:
+    """One instance of a service, with its load and latency bookkeeping"""
+
+    def __init__(self, url, breaker=None):
+        self.url = url
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.requests = 0
+        self.failures = 0
+        # Engine-specific connection pool or client for this replica
+        self.transport = None
+
+    def score(self, strategy):
+        if strategy == 'ewma':
+            # Unmeasured replicas score zero so they receive traffic and get a latency estimate
+            return (self.ewma_latency or 0.0) * (self.outstanding + 1)
+        return self.outstanding
+
+    def stats(self):
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'ewma_latency': self.ewma_latency,
+            'requests': self.requests,
+            'failures': self.failures,
+            'breaker': self.breaker.state,
+            'breaker_opened': self.breaker.times_opened
+        }
+
+
+class ReplicaSet:
+    """Load-aware routing across the replicas of one service"""
+
+    def __init__(self, name, urls, strategy=GATEWAY_LB_STRATEGY, decay=GATEWAY_EWMA_DECAY,
+                 failure_threshold=GATEWAY_BREAKER_FAILURES, reset_timeout=GATEWAY_BREAKER_RESET_TIMEOUT):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown load balancing strategy: {strategy}')
+        if isinstance(urls, str):
+            urls = [urls]
+        self.name = name
+        self.strategy = strategy
+        self.decay = decay
+        self.replicas = [Replica(url.rstrip('/'), CircuitBreaker(failure_threshold, reset_timeout)) for url in urls]
+        self.lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """Pick the least loaded replica whose breaker allows traffic and mark a request outstanding"""
+        now = time.monotonic()
+        with self.lock:
+            candidates = [r for r in self.replicas if r not in exclude and r.breaker.allows_request(now)]
+            if not candidates:
+                raise NoHealthyReplica(f'No healthy replica available for {self.name}')
+            best_score = min(r.score(self.strategy) for r in candidates)
+            replica = random.choice([r for r in candidates if r.score(self.strategy) == best_score])
+            replica.breaker.on_dispatch()
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def release(self, replica, latency=None, failed=False):
+        """Record the outcome of a request sent to replica"""
+        with self.lock:
+            replica.outstanding -= 1
+            if failed:
+                replica.failures += 1
+                replica.breaker.on_failure(time.monotonic())
+                return
+            replica.breaker.on_success()
+            if latency is not None:
+                if replica.ewma_latency is None:
+                    replica.ewma_latency = latency
+                else:
+                    replica.ewma_latency = self.decay * latency + (1 - self.decay) * replica.ewma_latency
+
+    def stats(self):
+        with self.lock:
+            return {
+                'strategy': self.strategy,
+                'replicas': [replica.stats() for replica in self.replicas]
+            }
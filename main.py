@@ -1,107 +1,266 @@
 import os
 import sys
-import requests
-from flask import Flask, request, jsonify, send_from_directory
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from gateway_proxy import (ProxyEngine, RequestBodyStream, GATEWAY_STREAMING,
+                           filter_request_headers, filter_response_headers)
+from gateway_batch import BatchError, parse_batch, decode_body, batch_result
+from health_prober import HealthProber
+from load_balancer import MICROSERVICES
+from response_cache import ResponseCache, cache_key, etag_matches
+from singleflight import SingleFlight, coalescing_key, coalescing_requested
+from static_assets import StaticAssetIndex, FRONTEND_BUILD_DIR
 
 # DON\"T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'frontend_build')) # Assuming frontend build will be here
+app = Flask(__name__, static_folder=FRONTEND_BUILD_DIR)
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 # Enable CORS for all routes
 CORS(app)
 
-# Microservices configuration
-MICROSERVICES = {
-    'planning-brain': 'http://localhost:5001',
-    'tools-manager': 'http://localhost:5002', 
-    'memory-service': 'http://localhost:5003'
-}
+# Shared keep-alive connection pools for all proxied routes
+proxy_engine = ProxyEngine(MICROSERVICES)
+
+# Upstream health is probed in the background; /api/health only reads the cache
+health_prober = HealthProber(MICROSERVICES)
+
+# Idempotent GET responses cached at the gateway (see response_cache for the route TTLs)
+response_cache = ResponseCache()
+
+# Opt-in coalescing of identical in-flight calls (see singleflight for configuration)
+single_flight = SingleFlight()
+
+# Frontend build indexed once at startup: hashes, gzip/brotli variants and hot files in memory
+static_assets = StaticAssetIndex(app.static_folder).build()
+
+def streaming_request_body():
+    """Request body to forward in streaming mode, or None when there is nothing to send"""
+    if not request.content_length and request.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+        return None
+    return RequestBodyStream(request.stream, request.content_length)
+
+def cached_response(fetch):
+    """Answer the current GET from the response cache, calling fetch() on a miss.
+
+    fetch returns (body, status, headers). Clients presenting a matching
+    If-None-Match get a 304 without the body.
+    """
+    ttl = response_cache.ttl_for(request.path)
+    if ttl is None or request.method != 'GET':
+        body, status, headers = fetch()
+        return Response(body, status=status, headers=headers)
+
+    key = cache_key(request.full_path, request.headers)
+    entry = response_cache.get(key)
+    cache_status = 'HIT'
+    if entry is None:
+        body, status, headers = fetch()
+        headers = [(k, v) for (k, v) in headers if k.lower() not in ('etag', 'cache-control')]
+        entry = response_cache.store(key, ttl, body, status, headers)
+        cache_status = 'MISS'
+    if entry.status != 200:
+        return Response(entry.body, status=entry.status, headers=entry.headers)
+
+    validators = [('ETag', entry.etag), ('Cache-Control', f'max-age={entry.remaining_ttl()}'), ('X-Cache', cache_status)]
+    if etag_matches(request.headers.get('If-None-Match'), entry.etag):
+        response_cache.record_not_modified()
+        return Response(status=304, headers=validators)
+    return Response(entry.body, status=entry.status, headers=entry.headers + validators)
+
+def forward_request(service_name, service_label, path):
+    """Forward the current request to a microservice through the shared proxy engine"""
+    try:
+        def fetch(data=None):
+            response = proxy_engine.forward(
+                service_name,
+                f"/api/{path}",
+                request.method,
+                headers=filter_request_headers(request.headers),
+                data=data,
+                query_string=request.query_string
+            )
+            return response.content, response.status_code, filter_response_headers(response.headers)
+
+        if coalescing_requested(request.path, request.headers):
+            # Identical concurrent calls share one upstream round trip and its buffered result
+            data = request.get_data()
+            key = coalescing_key(request.method, request.full_path, data, request.headers)
+            shared_fetch = lambda: single_flight.do(key, lambda: fetch(data))
+            if request.method == 'GET':
+                return cached_response(shared_fetch)
+            body, status, headers = shared_fetch()
+            response_cache.invalidate_for_write(request.method, request.path)
+            return Response(body, status=status, headers=headers)
+
+        if request.method == 'GET' and response_cache.ttl_for(request.path) is not None:
+            return cached_response(fetch)
+
+        if GATEWAY_STREAMING:
+            response, body = proxy_engine.forward_streaming(
+                service_name,
+                f"/api/{path}",
+                request.method,
+                headers=filter_request_headers(request.headers),
+                data=streaming_request_body(),
+                query_string=request.query_string
+            )
+            response_cache.invalidate_for_write(request.method, request.path)
+            return Response(body, status=response.status_code,
+                            headers=filter_response_headers(response.headers, decoded=False),
+                            direct_passthrough=True)
+
+        body, status, headers = fetch(request.get_data())
+        response_cache.invalidate_for_write(request.method, request.path)
+        return Response(body, status=status, headers=headers)
+    except Exception as e:
+        return jsonify({'error': f'{service_label} service unavailable: {str(e)}'}), 503
 
 # API Gateway routes for microservices
 @app.route('/api/planning/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_planning(path):
     """Proxy requests to Planning Brain service"""
-    try:
-        url = f"{MICROSERVICES['planning-brain']}/api/{path}"
-        response = requests.request(
-            method=request.method,
-            url=url,
-            headers={key: value for (key, value) in request.headers if key != 'Host'},
-            data=request.get_data(),
-            cookies=request.cookies,
-            allow_redirects=False
-        )
-        return response.content, response.status_code, response.headers.items()
-    except Exception as e:
-        return jsonify({'error': f'Planning service unavailable: {str(e)}'}), 503
+    return forward_request('planning-brain', 'Planning', path)
 
 @app.route('/api/tools/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_tools(path):
     """Proxy requests to Tools Manager service"""
-    try:
-        url = f"{MICROSERVICES['tools-manager']}/api/{path}"
-        response = requests.request(
-            method=request.method,
-            url=url,
-            headers={key: value for (key, value) in request.headers if key != 'Host'},
-            data=request.get_data(),
-            cookies=request.cookies,
-            allow_redirects=False
-        )
-        return response.content, response.status_code, response.headers.items()
-    except Exception as e:
-        return jsonify({'error': f'Tools service unavailable: {str(e)}'}), 503
+    return forward_request('tools-manager', 'Tools', path)
 
 @app.route('/api/memory/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def proxy_memory(path):
     """Proxy requests to Memory service"""
-    try:
-        url = f"{MICROSERVICES['memory-service']}/api/{path}"
-        response = requests.request(
-            method=request.method,
-            url=url,
-            headers={key: value for (key, value) in request.headers if key != 'Host'},
-            data=request.get_data(),
-            cookies=request.cookies,
-            allow_redirects=False
+    return forward_request('memory-service', 'Memory', path)
+
+def run_sub_request(sub_request, base_headers):
+    """Forward one batch entry, sharing the response cache and coalescing with regular traffic"""
+    if sub_request.error:
+        return batch_result(sub_request, 400, {'error': sub_request.error})
+
+    headers = dict(base_headers)
+    headers.update(sub_request.headers)
+    data = sub_request.encoded_body()
+    if data is not None and not any(k.lower() == 'content-type' for k in headers):
+        headers['Content-Type'] = 'application/json'
+
+    def fetch():
+        response = proxy_engine.forward(
+            sub_request.service_name,
+            sub_request.upstream_path,
+            sub_request.method,
+            headers=headers,
+            data=data,
+            query_string=sub_request.query_string
         )
-        return response.content, response.status_code, response.headers.items()
+        return response.content, response.status_code, filter_response_headers(response.headers)
+
+    try:
+        if coalescing_requested(sub_request.path, headers):
+            key = coalescing_key(sub_request.method, sub_request.cache_key, data, headers)
+            unshared_fetch = fetch
+            fetch = lambda: single_flight.do(key, unshared_fetch)
+
+        ttl = response_cache.ttl_for(sub_request.path)
+        if sub_request.method == 'GET' and ttl is not None:
+            key = cache_key(sub_request.cache_key, headers)
+            entry = response_cache.get(key)
+            if entry is None:
+                body, status, response_headers = fetch()
+                response_headers = [(k, v) for (k, v) in response_headers if k.lower() not in ('etag', 'cache-control')]
+                entry = response_cache.store(key, ttl, body, status, response_headers)
+            body, status, response_headers = entry.body, entry.status, entry.headers
+        else:
+            body, status, response_headers = fetch()
+            response_cache.invalidate_for_write(sub_request.method, sub_request.path)
     except Exception as e:
-        return jsonify({'error': f'Memory service unavailable: {str(e)}'}), 503
+        return batch_result(sub_request, 503, {'error': f'{sub_request.service_name} service unavailable: {str(e)}'})
+
+    content_type = next((v for (k, v) in response_headers if k.lower() == 'content-type'), None)
+    return batch_result(sub_request, status, decode_body(body, content_type))
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run many sub-requests against the microservices concurrently in one round trip.
+
+    Results come back in request order, or as NDJSON lines in completion order
+    when the batch sets "stream": true.
+    """
+    try:
+        sub_requests, concurrency, stream = parse_batch(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+
+    base_headers = {k: v for (k, v) in filter_request_headers(request.headers).items()
+                    if k.lower() not in ('content-length', 'content-type')}
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(sub_requests)))
+    futures = [executor.submit(run_sub_request, sub_request, base_headers) for sub_request in sub_requests]
+
+    if stream:
+        def generate():
+            try:
+                for future in as_completed(futures):
+                    yield json.dumps(future.result()) + '\n'
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    try:
+        return jsonify({'results': [future.result() for future in futures]})
+    finally:
+        executor.shutdown(wait=False)
+
+@app.route('/api/gateway/pools')
+def gateway_pools():
+    """Replica routing, circuit breaker and connection pool statistics for the upstream microservices"""
+    return jsonify(proxy_engine.stats())
+
+def probe_service(service_name, timeout):
+    """Health probe used by the background prober: a service is healthy while any replica is"""
+    results = proxy_engine.probe(service_name, timeout=timeout)
+    healthy_times = [r['response_time'] for r in results if r['healthy']]
+    if not healthy_times and all('error' in r for r in results):
+        raise ConnectionError('; '.join(f"{r['url']}: {r['error']}" for r in results))
+    return bool(healthy_times), min(healthy_times) if healthy_times else None
+
+@app.before_request
+def start_health_prober():
+    health_prober.start(probe_service)
 
 @app.route('/api/health')
 def health_check():
-    """Health check endpoint"""
-    services_status = {}
-    for service_name, service_url in MICROSERVICES.items():
-        try:
-            response = requests.get(f"{service_url}/api/health", timeout=5)
-            services_status[service_name] = {
-                'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-                'response_time': response.elapsed.total_seconds()
-            }
-        except Exception as e:
-            services_status[service_name] = {
-                'status': 'unavailable',
-                'error': str(e)
-            }
-    
-    return jsonify({
-        'gateway': 'healthy',
-        'services': services_status
-    })
-
-# Serve React Frontend
+    """Health check endpoint, answered from the background prober's cached state"""
+    def fetch():
+        payload = jsonify({
+            'gateway': 'healthy',
+            'services': health_prober.snapshot()
+        })
+        return payload.get_data(), 200, [('Content-Type', 'application/json')]
+    return cached_response(fetch)
+
+@app.route('/api/gateway/coalescing')
+def gateway_coalescing():
+    """Request coalescing statistics"""
+    return jsonify(single_flight.stats())
+
+@app.route('/api/gateway/cache')
+def gateway_cache():
+    """Response cache statistics"""
+    return jsonify(response_cache.stats())
+
+@app.route('/api/gateway/static')
+def gateway_static():
+    """Static asset index statistics"""
+    return jsonify(static_assets.stats())
+
+# Serve React Frontend from the precompressed in-memory asset index
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
+    result = static_assets.respond(path, request.headers)
+    return Response(result.body, status=result.status, headers=result.headers, direct_passthrough=True)
 
 
 if __name__ == '__main__':
@@ -1,22 +1,72 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+from service_client import local_route
+import io
 import os
+import copy
+import re
 import json
-import sqlite3
-from datetime import datetime
+import time
+import zlib
+import base64
 import hashlib
+import itertools
+import logging
+import threading
+from operator import itemgetter
+from datetime import datetime, timedelta
+import numpy as np
+from embeddings import get_encoder, to_blob, from_blob
+from text_analysis import tokens, term_frequencies
+from vector_index import VectorIndex
+from write_queue import WriteQueue, QueueFull, QueueUnavailable
+from memory_compaction import Compactor, decode_entries
+from memory_embedding import EmbeddingPool, MEMORY_EMBEDDING_WORKERS
+from memory_terms import TermIndexer, MEMORY_DEFERRED_TERMS
+from memory_shards import ShardSet, shard_path, merge_ranked
+from memory_db import trigger_guard, suspended_triggers
+from memory_cache import RetrievalCache
+from memory_snapshot import Snapshot
+import memory_ranking
 
 memory_bp = Blueprint('memory', __name__)
+logger = logging.getLogger(__name__)
 
 # Database path for memory storage
-MEMORY_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'memory.db')
+MEMORY_DB_PATH = os.getenv('MEMORY_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'database', 'memory.db'))
 
-def init_memory_db():
-    """Initialize the memory database"""
-    conn = sqlite3.connect(MEMORY_DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create experiences table
-    cursor.execute('''
+# Rows per transaction for bulk ingestion, and the content types read as NDJSON
+MEMORY_BULK_BATCH_SIZE = int(os.getenv('MEMORY_BULK_BATCH_SIZE', '5000'))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+NDJSON_READ_BUFFER = 1024 * 1024
+# Bulk batches from this size update the full-text index and statistics in one statement each
+# instead of through the per-row insert triggers
+SET_BASED_INSERT_MIN_ROWS = 256
+
+# Single-item stores are acknowledged once in the write-behind queue's log (pass "sync": true to wait for the insert)
+MEMORY_WRITE_BEHIND = os.getenv('MEMORY_WRITE_BEHIND', 'true').lower() == 'true'
+MEMORY_QUEUE_PATH = os.getenv('MEMORY_QUEUE_PATH', os.path.join(os.path.dirname(MEMORY_DB_PATH), 'memory-write-queue.log'))
+
+# Snapshot file (see memory_snapshot) served read-only instead of the database files when set
+MEMORY_SNAPSHOT_PATH = os.getenv('MEMORY_SNAPSHOT_PATH')
+
+# Embedding provider (see embeddings.MEMORY_EMBEDDING_PROVIDER)
+encoder = get_encoder()
+
+snapshot = Snapshot(MEMORY_SNAPSHOT_PATH) if MEMORY_SNAPSHOT_PATH else None
+if snapshot is not None and snapshot.embedding != {'provider': encoder.name, 'dim': encoder.dim}:
+    raise ValueError(f"{MEMORY_SNAPSHOT_PATH} holds {snapshot.embedding['provider']} embeddings, "
+                     f"the service encodes queries with {encoder.name}")
+
+# Shards of the store (see memory_shards.MEMORY_SHARDS), each with per-thread WAL connections shared
+# by every route and in-memory vector indexes, loaded lazily from the stored float32 blobs
+shards = ShardSet(MEMORY_DB_PATH, vector_indexes=lambda: {
+    'experiences': VectorIndex(encoder.dim),
+    'knowledge': VectorIndex(encoder.dim)
+})
+
+def create_base_tables(conn):
+    """Migration 1: experiences and knowledge tables"""
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS experiences (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             objective TEXT NOT NULL,
@@ -30,9 +80,7 @@ def init_memory_db():
             keywords TEXT
         )
     ''')
-    
-    # Create knowledge table
-    cursor.execute('''
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS knowledge (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             topic TEXT NOT NULL,
@@ -43,228 +91,1459 @@ def init_memory_db():
             keywords TEXT
         )
     ''')
-    
-    conn.commit()
-    conn.close()
 
-# Initialize database on import
-init_memory_db()
+# Full-text indexed columns with their BM25 weights (objective and topic matter most)
+EXPERIENCE_FTS_COLUMNS = [('objective', 10.0), ('task_description', 5.0), ('plan', 2.0), ('results', 2.0), ('actions', 1.0)]
+KNOWLEDGE_FTS_COLUMNS = [('topic', 5.0), ('content', 1.0)]
+# French prompts: fold accents so "creer" matches "créer"
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+def fts_insert_trigger(table, columns, when=''):
+    names = ', '.join(name for name, _ in columns)
+    new_values = ', '.join(f'new.{name}' for name, _ in columns)
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} {when} BEGIN
+            INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values});
+        END
+    """
+
+def create_fts_index(conn, table, columns):
+    """External-content FTS5 index over table, kept in sync by triggers and backfilled"""
+    names = ', '.join(name for name, _ in columns)
+    new_values = ', '.join(f'new.{name}' for name, _ in columns)
+    old_values = ', '.join(f'old.{name}' for name, _ in columns)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            {names}, content='{table}', content_rowid='id', tokenize="{FTS_TOKENIZER}"
+        )
+    """)
+    conn.execute(fts_insert_trigger(table, columns))
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {names} ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values});
+        END
+    """)
+    # Backfill rows stored before the index existed
+    conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+FTS_COLUMNS = {'experiences': EXPERIENCE_FTS_COLUMNS, 'knowledge': KNOWLEDGE_FTS_COLUMNS}
+
+def create_fts_indexes(conn):
+    """Migration 2: FTS5 indexes for experience and knowledge retrieval"""
+    for table, columns in FTS_COLUMNS.items():
+        create_fts_index(conn, table, columns)
+
+def experience_text(objective, task_description, plan, actions_json, results):
+    return f"{objective} {task_description} {plan} {actions_json} {results}"
+
+def knowledge_text(topic, content):
+    return f"{topic} {content}"
+
+# Stored columns each table's text is built from, for backfills
+TEXT_COLUMNS = {
+    'experiences': ('objective, task_description, plan, actions, results', experience_text),
+    'knowledge': ('topic, content', knowledge_text)
+}
+
+def texts_in_batches(conn, table, batch_size=1000):
+    """(ids, texts) of every stored row, batch_size rows at a time"""
+    columns, to_text = TEXT_COLUMNS[table]
+    last_id = 0
+    while True:
+        rows = conn.execute(f'SELECT id, {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?',
+                            (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        yield [row[0] for row in rows], [to_text(*row[1:]) for row in rows]
+        last_id = rows[-1][0]
+
+def add_embeddings(conn):
+    """Migration 3: float32 embedding blobs replace the SHA-256 placeholder, backfilled in batches"""
+    for table in TEXT_COLUMNS:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN embedding BLOB')
+        for ids, texts in texts_in_batches(conn, table):
+            conn.executemany(f'UPDATE {table} SET embedding = ? WHERE id = ?',
+                             [(to_blob(vector), row_id) for row_id, vector in zip(ids, encoder.encode(texts))])
+        conn.execute(f'ALTER TABLE {table} DROP COLUMN embedding_vector')
+
+# Success flag expression per table, for the statistics triggers
+STATS_SUCCESS = {'experiences': 'COALESCE({row}.success, 0) != 0', 'knowledge': '0'}
+
+def stats_upsert(table, row, sign):
+    """Statements adding (sign '+') or removing (sign '-') one row to the totals and the hourly series"""
+    source = f"COALESCE({row}.source, '')"
+    success = STATS_SUCCESS[table].format(row=row)
+    bucket = f"strftime('%Y-%m-%d %H:00', COALESCE({row}.timestamp, CURRENT_TIMESTAMP))"
+    return f"""
+        INSERT INTO memory_totals (kind, source, total, successful) VALUES ('{table}', {source}, {sign}1, {sign}({success}))
+        ON CONFLICT (kind, source) DO UPDATE SET total = total + excluded.total, successful = successful + excluded.successful;
+        INSERT INTO memory_series (kind, bucket, source, total, successful) VALUES ('{table}', {bucket}, {source}, {sign}1, {sign}({success}))
+        ON CONFLICT (kind, bucket, source) DO UPDATE SET total = total + excluded.total, successful = successful + excluded.successful;
+    """
+
+def stats_insert_trigger(table, when=''):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table} {when} BEGIN
+            {stats_upsert(table, 'new', '+')}
+        END
+    """
+
+def stats_delete_trigger(table, when=''):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_stats_delete AFTER DELETE ON {table} {when} BEGIN
+            {stats_upsert(table, 'old', '-')}
+        END
+    """
+
+def stats_catch_up(table):
+    """Set-based equivalent of the insert trigger for the rows from id ? on"""
+    success = STATS_SUCCESS[table].format(row=table)
+    bucket = f"strftime('%Y-%m-%d %H:00', COALESCE(timestamp, CURRENT_TIMESTAMP))"
+    return [f"""
+        INSERT INTO memory_totals (kind, source, total, successful)
+        SELECT '{table}', COALESCE(source, ''), COUNT(*), SUM({success}) FROM {table} WHERE id >= ? GROUP BY 2
+        ON CONFLICT (kind, source) DO UPDATE SET total = total + excluded.total, successful = successful + excluded.successful
+    """, f"""
+        INSERT INTO memory_series (kind, bucket, source, total, successful)
+        SELECT '{table}', {bucket}, COALESCE(source, ''), COUNT(*), SUM({success}) FROM {table} WHERE id >= ? GROUP BY 2, 3
+        ON CONFLICT (kind, bucket, source) DO UPDATE SET total = total + excluded.total, successful = successful + excluded.successful
+    """]
+
+def create_incremental_stats(conn):
+    """Migration 5: per-source totals and hourly series maintained by triggers, plus a source column on experiences"""
+    conn.execute('ALTER TABLE experiences ADD COLUMN source TEXT')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memory_totals (
+            kind TEXT NOT NULL,
+            source TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            successful INTEGER NOT NULL,
+            PRIMARY KEY (kind, source)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memory_series (
+            kind TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            source TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            successful INTEGER NOT NULL,
+            PRIMARY KEY (kind, bucket, source)
+        ) WITHOUT ROWID
+    """)
+    for table in STATS_SUCCESS:
+        conn.execute(stats_insert_trigger(table))
+        conn.execute(stats_delete_trigger(table))
+        success_column = ', success' if table == 'experiences' else ''
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_update AFTER UPDATE OF source, timestamp{success_column} ON {table} BEGIN
+                {stats_upsert(table, 'old', '-')}
+                {stats_upsert(table, 'new', '+')}
+            END
+        """)
+        # Backfill from the rows already stored
+        for sql in stats_catch_up(table):
+            conn.execute(sql, (0,))
+
+def create_write_queue_checkpoint(conn):
+    """Migration 4: last write-behind queue record applied, committed with the rows it wrote"""
+    conn.execute('CREATE TABLE IF NOT EXISTS write_queue_checkpoint (name TEXT PRIMARY KEY, applied_seq INTEGER NOT NULL)')
+
+def insert_postings(conn, table, ids, terms):
+    """Add the term frequencies of the given rows (terms[i] belongs to ids[i]) to the inverted index"""
+    # Sorted by term (stable, so doc ids stay ascending), the postings land in order in the (term, doc_id) B-tree
+    conn.executemany(f'INSERT INTO {table}_terms (term, doc_id, tf) VALUES (?, ?, ?)', sorted(
+        ((term, doc_id, tf) for doc_id, frequencies in zip(ids, terms) for term, tf in frequencies.items()),
+        key=itemgetter(0)))
+
+def insert_terms(conn, table, ids, terms):
+    """Index the term frequencies of the given rows: their postings, and each row's term list"""
+    insert_postings(conn, table, ids, terms)
+    # Most frequent first, ties alphabetical (sorting is stable, reversed too)
+    conn.executemany(f'INSERT INTO {table}_doc_terms (doc_id, terms) VALUES (?, ?)', [
+        (doc_id, json.dumps(sorted(sorted(frequencies), key=frequencies.__getitem__, reverse=True), separators=(',', ':')))
+        for doc_id, frequencies in zip(ids, terms)])
+
+def create_term_index(conn):
+    """Migration 6: term -> (doc id, term frequency) inverted index replaces the comma-joined keywords column"""
+    for table in TEXT_COLUMNS:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table}_terms (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID
+        """)
+        # Per-document lookups: keywords of retrieved rows and cleanup on delete
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_terms_doc ON {table}_terms(doc_id)')
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_terms_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM {table}_terms WHERE doc_id = old.id;
+            END
+        """)
+        for ids, texts in texts_in_batches(conn, table):
+            insert_postings(conn, table, ids, [term_frequencies(text) for text in texts])
+        conn.execute(f'ALTER TABLE {table} DROP COLUMN keywords')
+
+# Columns filled from the row builders' values, in order
+EXPERIENCE_FIELDS = ('objective', 'task_description', 'plan', 'actions', 'results', 'success', 'source')
+KNOWLEDGE_FIELDS = ('topic', 'content', 'source')
+STORED_FIELDS = {'experiences': EXPERIENCE_FIELDS, 'knowledge': KNOWLEDGE_FIELDS}
+
+def content_hash(values):
+    """Digest identifying a row's content, the same whether computed from a payload or read back from SQLite"""
+    canonical = [int(value) if isinstance(value, bool) else value for value in values]
+    return hashlib.blake2b(json.dumps(canonical, separators=(',', ':')).encode('utf-8'), digest_size=16).digest()
+
+def add_deduplication_and_archive(conn, batch_size=1000):
+    """Migration 7: content hashes with occurrence counts, source/time indexes for retention, experience archive"""
+    for table, fields in STORED_FIELDS.items():
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN content_hash BLOB')
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1')
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN last_seen DATETIME')
+        conn.execute(f"UPDATE {table} SET source = '' WHERE source IS NULL")
+        # Hash the stored rows, folding duplicates into the oldest copy
+        first_ids, repeats, last_id = {}, {}, 0
+        while True:
+            rows = conn.execute(f'SELECT id, {", ".join(fields)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?',
+                                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                digest = content_hash(row[1:])
+                if digest in first_ids:
+                    repeats.setdefault(first_ids[digest], []).append(row[0])
+                else:
+                    first_ids[digest] = row[0]
+                    updates.append((digest, row[0]))
+            conn.executemany(f'UPDATE {table} SET content_hash = ? WHERE id = ?', updates)
+            last_id = rows[-1][0]
+        for kept_id, duplicate_ids in repeats.items():
+            conn.execute(f'UPDATE {table} SET occurrences = occurrences + ?, last_seen = CURRENT_TIMESTAMP WHERE id = ?',
+                         (len(duplicate_ids), kept_id))
+            conn.execute(f'DELETE FROM {table} WHERE id IN ({", ".join("?" * len(duplicate_ids))})', duplicate_ids)
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {table}_content_hash ON {table}(content_hash)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_source_timestamp ON {table}(source, timestamp)')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS experiences_archive (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            day TEXT NOT NULL,
+            entries INTEGER NOT NULL,
+            successful INTEGER NOT NULL,
+            occurrences INTEGER NOT NULL,
+            first_timestamp DATETIME,
+            last_timestamp DATETIME,
+            payload BLOB NOT NULL
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS experiences_archive_source_day ON experiences_archive(source, day)')
+
+def add_background_embedding(conn):
+    """Migration 8: rows stored before their embedding is computed, and the order the background pool embedded them in"""
+    for table in TEXT_COLUMNS:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN embedding_pending INTEGER NOT NULL DEFAULT 0')
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN embedded_seq INTEGER')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_embedding_pending ON {table}(id) WHERE embedding_pending = 1')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_embedded_seq ON {table}(embedded_seq)')
+
+def index_terms_by_document(conn):
+    """Migration 9: each row's term list (most frequent first) replaces the postings' doc_id index.
+
+    Indexing every posting a second time made bulk inserts twice as slow;
+    one term list per row is a single append.
+    """
+    for table in TEXT_COLUMNS:
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table}_doc_terms (doc_id INTEGER PRIMARY KEY, terms TEXT NOT NULL)')
+        conn.execute(f"""
+            INSERT INTO {table}_doc_terms (doc_id, terms)
+            SELECT doc_id, json_group_array(term) FROM (
+                SELECT doc_id, term FROM {table}_terms ORDER BY doc_id, tf DESC, term
+            ) GROUP BY doc_id
+        """)
+        conn.execute(f'DROP TRIGGER IF EXISTS {table}_terms_delete')
+        conn.execute(f'DROP INDEX IF EXISTS {table}_terms_doc')
+        # A deleted row's postings are found through its term list, by primary key
+        conn.execute(f"""
+            CREATE TRIGGER {table}_terms_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM {table}_terms WHERE doc_id = old.id AND term IN (
+                    SELECT value FROM json_each((SELECT terms FROM {table}_doc_terms WHERE doc_id = old.id)));
+                DELETE FROM {table}_doc_terms WHERE doc_id = old.id;
+            END
+        """)
+
+def create_embedding_sequence(conn):
+    """Migration 10: last embedded_seq stamped per table, persisted so compaction deleting the newest rows cannot reuse it"""
+    conn.execute('CREATE TABLE IF NOT EXISTS embedding_sequence (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)')
+    for table in TEXT_COLUMNS:
+        conn.execute(f'INSERT OR IGNORE INTO embedding_sequence (name, seq) SELECT ?, COALESCE(MAX(embedded_seq), 0) FROM {table}',
+                     (table,))
+
+def guard_bulk_triggers(conn):
+    """Migration 11: triggers that bulk inserts and rollups bypass check a flag table instead of being dropped"""
+    conn.execute('CREATE TABLE IF NOT EXISTS suspended_triggers (name TEXT PRIMARY KEY) WITHOUT ROWID')
+    for table in TEXT_COLUMNS:
+        for name in (f'{table}_fts_insert', f'{table}_stats_insert', f'{table}_stats_delete'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute(fts_insert_trigger(table, FTS_COLUMNS[table], trigger_guard(f'{table}_fts_insert')))
+        conn.execute(stats_insert_trigger(table, trigger_guard(f'{table}_stats_insert')))
+        conn.execute(stats_delete_trigger(table, trigger_guard(f'{table}_stats_delete')))
+
+def add_deferred_terms(conn):
+    """Migration 12: rows bulk-inserted before their index terms are written"""
+    for table in TEXT_COLUMNS:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN terms_pending INTEGER NOT NULL DEFAULT 0')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_terms_pending ON {table}(id) WHERE terms_pending = 1')
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    create_base_tables,
+    create_fts_indexes,
+    add_embeddings,
+    create_write_queue_checkpoint,
+    create_incremental_stats,
+    create_term_index,
+    add_deduplication_and_archive,
+    add_background_embedding,
+    index_terms_by_document,
+    create_embedding_sequence,
+    guard_bulk_triggers,
+    add_deferred_terms
+]
+
+def deferred_insert_triggers(table):
+    """Insert triggers that bulk inserts suspend and replace with set-based statements: (name, catch-up statements)"""
+    names = ', '.join(name for name, _ in FTS_COLUMNS[table])
+    return [
+        (f'{table}_fts_insert', [f'INSERT INTO {table}_fts(rowid, {names}) SELECT id, {names} FROM {table} WHERE id >= ?']),
+        (f'{table}_stats_insert', stats_catch_up(table))
+    ]
+
+RETRIEVAL_MODES = ('lexical', 'semantic', 'keyword', 'hybrid')
+
+# Result fields each store can return; 'fields' in a retrieval request selects a subset
+EXPERIENCE_RESULT_FIELDS = ('id', 'objective', 'task_description', 'plan', 'actions', 'results', 'success',
+                            'source', 'timestamp', 'occurrences', 'keywords', 'score')
+KNOWLEDGE_RESULT_FIELDS = ('id', 'topic', 'content', 'source', 'timestamp', 'occurrences', 'keywords', 'score')
+RESULT_FIELDS = {'experiences': EXPERIENCE_RESULT_FIELDS, 'knowledge': KNOWLEDGE_RESULT_FIELDS}
+# Result fields not read from the table's own columns
+DERIVED_FIELDS = ('keywords', 'score')
+RESULT_DECODERS = {
+    'actions': lambda value: json.loads(value) if value else [],
+    'success': bool
+}
+
+# Largest page a retrieval returns at once; streamed retrievals are read in pages of MEMORY_STREAM_PAGE_SIZE
+MEMORY_RETRIEVE_MAX_LIMIT = int(os.getenv('MEMORY_RETRIEVE_MAX_LIMIT', '1000'))
+MEMORY_STREAM_PAGE_SIZE = int(os.getenv('MEMORY_STREAM_PAGE_SIZE', '500'))
+
+def fts_queries(query):
+    """FTS5 queries for free text: all of its words first, then any of them"""
+    tokens = [f'"{token}"' for token in dict.fromkeys(re.findall(r'\w+', query.lower()))]
+    if len(tokens) <= 1:
+        return tokens
+    return [' '.join(tokens), ' OR '.join(tokens)]
+
+def bm25_weights(columns):
+    return ', '.join(str(weight) for _, weight in columns)
+
+def keyset_filter(after, phase, id_column='id'):
+    """WHERE clause and parameters resuming a (score DESC, id) ranking after the cursor position, if it is in phase"""
+    if after is None or after[0] != phase:
+        return '', []
+    return f' WHERE score < ? OR (score = ? AND {id_column} > ?)', [after[1], after[1], after[2]]
+
+def lexical_matches(conn, table, columns, query, limit, after=None):
+    """Rows matching every query word ranked by BM25 (phase 0), then rows matching only some of them (phase 1).
+
+    Requiring every word keeps the posting lists to intersect small, so the
+    broader OR query is only paid for when it is needed to fill the page.
+    Returns (row + (score,), phase) pairs.
+    """
+    matches = fts_queries(query)
+    rows = []
+    for phase in range(after[0] if after else 0, len(matches)):
+        sql = f"""
+            SELECT {columns}, -bm25({table}_fts, {bm25_weights(FTS_COLUMNS[table])}) AS score
+            FROM {table}_fts
+            JOIN {table} ON {table}.id = {table}_fts.rowid
+            WHERE {table}_fts MATCH ?
+        """
+        params = [matches[phase]]
+        if phase > 0:
+            # Rows matching every word were returned by the previous phase
+            sql += f' AND {table}_fts.rowid NOT IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)'
+            params.append(matches[phase - 1])
+        where, keyset = keyset_filter(after, phase)
+        rows.extend((row, phase) for row in conn.execute(
+            f'SELECT * FROM ({sql}){where} ORDER BY score DESC, id LIMIT ?', params + keyset + [limit - len(rows)]))
+        if len(rows) >= limit:
+            break
+    return rows
+
+def sync_vector_index(index, conn, table):
+    """Load embeddings stored since the index was last synced (by this or another process).
+
+    Rows past the index's max_id are loaded once embedded; rows the background
+    pool embedded after the index had gone past their id are found by their
+    embedded_seq. Both are read from one snapshot, so no row is loaded twice.
+    """
+    with index.lock:
+        embedded_seq = conn.execute('SELECT seq FROM embedding_sequence WHERE name = ?', (table,)).fetchone()[0]
+        rows = conn.execute(f'SELECT id, embedding FROM {table} WHERE embedded_seq > ? AND id <= ? ORDER BY id',
+                            (index.embedded_seq, index.max_id)).fetchall()
+        rows += conn.execute(f'SELECT id, embedding FROM {table} WHERE id > ? AND embedding IS NOT NULL ORDER BY id',
+                             (index.max_id,)).fetchall()
+        index.embedded_seq = max(index.embedded_seq, embedded_seq)
+        # Vectors from another provider or dimension cannot be compared and are skipped
+        rows = [row for row in rows if len(row[1]) == index.dim * 4]
+        if rows:
+            index.add([row[0] for row in rows], [from_blob(row[1]) for row in rows])
+
+def rows_by_id(conn, table, columns, ids, scores):
+    """Rows of table for ids, in that order, each with its score appended"""
+    if not len(ids):
+        return []
+    placeholders = ', '.join('?' * len(ids))
+    rows = {row[0]: row for row in conn.execute(
+        f'SELECT {columns} FROM {table} WHERE id IN ({placeholders})', [int(i) for i in ids])}
+    return [rows[i] + (float(score),) for i, score in zip(ids, scores) if i in rows]
+
+def stored_vectors(conn, table, ids, chunk=500):
+    """Stored embeddings of ids in that order, zeros for rows deleted since (rescoring of quantised searches)"""
+    vectors = np.zeros((len(ids), encoder.dim), dtype=np.float32)
+    positions = {row_id: position for position, row_id in enumerate(ids.tolist())}
+    for start in range(0, len(ids), chunk):
+        selected = ids[start:start + chunk].tolist()
+        for row_id, blob in conn.execute(
+                f'SELECT id, embedding FROM {table} WHERE id IN ({", ".join("?" * len(selected))})', selected):
+            if blob and len(blob) == encoder.dim * 4:
+                vectors[positions[row_id]] = from_blob(blob)
+    return vectors
+
+def semantic_matches(index, conn, table, columns, query, limit, after=None):
+    """Rows of table closest to the query embedding in its vector index, as (row + (cosine similarity,), 0) pairs.
+
+    A quantised index rescores its shortlist with the float32 embeddings stored in the table.
+    """
+    sync_vector_index(index, conn, table)
+    ids, scores = index.search(encoder.encode([query])[0], limit, after=after[1:] if after else None,
+                               load_vectors=lambda ids: stored_vectors(conn, table, ids))
+    return [(row, 0) for row in rows_by_id(conn, table, columns, ids.tolist(), scores)]
+
+# Posting lists at least this many times longer than the candidate set are probed per candidate instead of scanned
+SEEK_RATIO = 8
+SEEK_CHUNK = 500
+
+def term_statistics(conn, table, terms):
+    """Document frequency and BM25 idf of each term"""
+    documents = conn.execute('SELECT COALESCE(SUM(total), 0) FROM memory_totals WHERE kind = ?', (table,)).fetchone()[0]
+    frequencies = {term: conn.execute(f'SELECT COUNT(*) FROM {table}_terms WHERE term = ?', (term,)).fetchone()[0]
+                   for term in terms}
+    return frequencies, {term: memory_ranking.idf(documents, df) for term, df in frequencies.items()}
+
+def keyword_matches(conn, table, columns, query, limit, after=None):
+    """Rows containing every analysed query term ranked by BM25 over the term index (phase 0), then rows with
+    only some of them (phase 1), as (row + (score,), phase) pairs.
+
+    The intersection starts from the rarest term's posting list and narrows it
+    term by term, probing (term, doc_id) keys directly while the candidate set
+    is much smaller than the next posting list.
+    """
+    terms = list(dict.fromkeys(tokens(query)))
+    if not terms:
+        return []
+    frequencies, idf = term_statistics(conn, table, terms)
+
+    scores = {}
+    if all(frequencies.values()):
+        terms.sort(key=frequencies.get)
+        scores = {doc_id: memory_ranking.term_weight(tf, idf[terms[0]]) for doc_id, tf in conn.execute(
+            f'SELECT doc_id, tf FROM {table}_terms WHERE term = ?', (terms[0],))}
+        for term in terms[1:]:
+            if not scores:
+                break
+            if len(scores) * SEEK_RATIO < frequencies[term]:
+                candidates = list(scores)
+                postings = []
+                for start in range(0, len(candidates), SEEK_CHUNK):
+                    chunk = candidates[start:start + SEEK_CHUNK]
+                    postings.extend(conn.execute(
+                        f'SELECT doc_id, tf FROM {table}_terms WHERE term = ? AND doc_id IN ({", ".join("?" * len(chunk))})',
+                        [term] + chunk))
+            else:
+                postings = conn.execute(f'SELECT doc_id, tf FROM {table}_terms WHERE term = ?', (term,)).fetchall()
+            scores = {doc_id: scores[doc_id] + memory_ranking.term_weight(tf, idf[term]) for doc_id, tf in postings if doc_id in scores}
+    ranked = []
+    if after is None or after[0] == 0:
+        ranked = [(doc_id, score, 0) for doc_id, score in scores.items()
+                  if after is None or score < after[1] or (score == after[1] and doc_id > after[2])]
+        ranked = sorted(ranked, key=lambda item: (-item[1], item[0]))[:limit]
+
+    weights = [(term, weight) for term, weight in idf.items() if frequencies[term]]
+    if len(ranked) < limit and len(terms) > 1 and weights:
+        # Too few documents have every term: fill up with the best partial matches
+        values = ', '.join('(?, ?)' for _ in weights)
+        where, keyset = keyset_filter(after, 1, 'doc_id')
+        partial = conn.execute(f"""
+            SELECT * FROM (
+                WITH weights(term, idf) AS (VALUES {values})
+                SELECT doc_id, SUM(tf * {memory_ranking.BM25_K1 + 1} / (tf + {memory_ranking.BM25_K1}) * idf) AS score
+                FROM weights JOIN {table}_terms ON {table}_terms.term = weights.term
+                GROUP BY doc_id
+            ){where}
+            ORDER BY score DESC, doc_id
+        """, [value for weight in weights for value in weight] + keyset)
+        for doc_id, score in partial:
+            if doc_id not in scores:
+                ranked.append((doc_id, score, 1))
+                if len(ranked) >= limit:
+                    break
+
+    phases = {doc_id: phase for doc_id, _, phase in ranked}
+    rows = rows_by_id(conn, table, columns, [doc_id for doc_id, _, _ in ranked], [score for _, score, _ in ranked])
+    return [(row, phases[row[0]]) for row in rows]
+
+def hybrid_matches(index, conn, table, columns, query, limit, after=None, weights=None, as_of=None):
+    """Rows reranked by memory_ranking from BM25 and vector-search candidates, as (row + (score,), 0) pairs.
+
+    Each generator contributes its MEMORY_RANK_CANDIDATES best rows; every
+    candidate then gets all four signals (its BM25 score for the any-word
+    query, cosine similarity from its stored embedding, age and success), so
+    a row found by only one generator is still scored on both. The lexical
+    signal is BM25 over the term index, read with (term, doc_id) key lookups.
+    Ages are taken at as_of (a Julian day, default now) so that every page of
+    one ranking uses the same reference time. Only the candidates are ranked:
+    paging ends after the last of them.
+    """
+    candidates = memory_ranking.MEMORY_RANK_CANDIDATES
+    ids = {row[0] for row, _ in lexical_matches(conn, table, f'{table}.id', query, candidates)}
+    ids.update(row[0] for row, _ in semantic_matches(index, conn, table, f'{table}.id', query, candidates))
+    if not ids:
+        return []
+    ids = sorted(ids)
+    placeholders = ', '.join('?' * len(ids))
+
+    terms = list(dict.fromkeys(tokens(query)))
+    bm25 = {}
+    if terms:
+        _, idf = term_statistics(conn, table, terms)
+        for term in terms:
+            for doc_id, tf in conn.execute(f'SELECT doc_id, tf FROM {table}_terms WHERE term = ? AND doc_id IN ({placeholders})',
+                                           [term] + ids):
+                bm25[doc_id] = bm25.get(doc_id, 0.0) + memory_ranking.term_weight(tf, idf[term])
+    success = 'COALESCE(success, 0) != 0' if table == 'experiences' else '0'
+    details = {row[0]: row[1:] for row in conn.execute(f"""
+        SELECT id, embedding, COALESCE(?, julianday('now')) - julianday(COALESCE(last_seen, timestamp)), {success}
+        FROM {table} WHERE id IN ({placeholders})
+    """, [as_of] + ids)}
+    ids = [row_id for row_id in ids if row_id in details]
+    query_vector = encoder.encode([query])[0]
+    cosine = [float(from_blob(details[row_id][0]) @ query_vector)
+              if details[row_id][0] and len(details[row_id][0]) == encoder.dim * 4 else 0.0 for row_id in ids]
+
+    scores = memory_ranking.hybrid_scores(memory_ranking.signals(
+        [bm25.get(row_id, 0.0) for row_id in ids], cosine,
+        [details[row_id][1] or 0.0 for row_id in ids], [details[row_id][2] for row_id in ids]
+    ), weights or memory_ranking.MEMORY_RANK_WEIGHTS)
+    ranked = sorted(((float(score), row_id) for row_id, score in zip(ids, scores)
+                     if after is None or score < after[1] or (score == after[1] and row_id > after[2])),
+                    key=lambda item: (-item[0], item[1]))[:limit]
+    return [(row, 0) for row in rows_by_id(conn, table, columns, [row_id for _, row_id in ranked],
+                                           [score for score, _ in ranked])]
+
+def listed_rows(conn, table, columns, limit, after=None):
+    """Rows of table in id order, for walking the whole store: (row + (None,), 0) pairs"""
+    return [(row + (None,), 0) for row in conn.execute(
+        f'SELECT {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?', (after[2] if after else 0, limit))]
+
+def document_keywords(conn, table, ids):
+    """Indexed terms of each row id, most frequent first"""
+    keywords = {row_id: [] for row_id in ids}
+    if ids:
+        placeholders = ', '.join('?' * len(ids))
+        for doc_id, terms in conn.execute(
+                f'SELECT doc_id, terms FROM {table}_doc_terms WHERE doc_id IN ({placeholders})', list(ids)):
+            keywords[doc_id] = json.loads(terms)
+    return keywords
+
+def init_memory_db():
+    """Initialize the memory database: migrate every shard and check that it belongs to this layout"""
+    shards.open(MIGRATIONS, STORED_FIELDS)
+
+# Initialize database on import (a snapshot replica never opens the database files)
+if snapshot is None:
+    init_memory_db()
+
+# Answer of every write and maintenance route on a snapshot replica
+READ_ONLY_ANSWER = {'error': 'Memory service is a read-only snapshot replica'}, 503
 
 @memory_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'service': 'memory-service'})
 
-@memory_bp.route('/store/experience', methods=['POST'])
-def store_experience():
-    """Store an experience in long-term memory"""
+# JSON types a stored field may hold; arrays and objects cannot be bound as SQLite parameters
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+def field(data, name, default='', types=SCALAR_TYPES):
+    """data[name] (default when absent); raises ValueError when its JSON type is not one of types"""
+    value = data.get(name, default)
+    if not isinstance(value, types):
+        raise ValueError(f'{name} must be a {"string" if types is str else "string, number, boolean or null"}')
+    return value
+
+def experience_row(data):
+    """Validate an experience payload into (column values, text to embed); raises ValueError"""
+    objective = field(data, "objective", types=str)
+    task_description = field(data, "task_description")
+    plan = field(data, "plan")
+    actions = json.dumps(data.get("actions", []))
+    results = field(data, "results")
+    success = field(data, "success", False)
+    source = field(data, "source", None) or ""
+    
+    if not objective:
+        raise ValueError("Objective is required")
+    
+    text = experience_text(objective, task_description, plan, actions, results)
+    return (objective, task_description, plan, actions, results, success, source), text
+
+def knowledge_row(data):
+    """Validate a knowledge payload into (column values, text to embed); raises ValueError"""
+    topic = field(data, 'topic', types=str)
+    content = field(data, 'content')
+    source = field(data, 'source', None) or ''
+    
+    if not topic or not content:
+        raise ValueError('Topic and content are required')
+    
+    text = knowledge_text(topic, content)
+    return (topic, content, source), text
+
+def insert_sql(table, fields):
+    """INSERT taking an explicit id, the row builder's values, the embedding blob, the content hash and the pending flags"""
+    columns = ('id',) + fields + ('embedding', 'content_hash', 'embedding_pending', 'terms_pending')
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+@local_route('memory-service', '/api/store/experience')
+def store_experience_record(data):
+    """Store an experience in long-term memory, returning (payload, status)"""
     try:
-        data = request.get_json()
-        objective = data.get("objective", "")
-        task_description = data.get("task_description", "")
-        plan = data.get("plan", "")
-        actions = data.get("actions", [])
-        results = data.get("results", "")
-        success = data.get("success", False)
+        try:
+            values, text = experience_row(data)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if snapshot is not None:
+            return READ_ONLY_ANSWER
+        shard = shards.route(values[0])
         
-        if not objective:
-            return jsonify({"error": "Objective is required"}), 400
+        if not data.get("sync"):
+            queued = enqueue_write("experience", data, shard)
+            if queued is not None:
+                return queued
         
-        # Simulate embedding vector and keyword extraction
-        experience_text = f"{objective} {task_description} {plan} {json.dumps(actions)} {results}"
-        embedding_vector = hashlib.sha256(experience_text.encode()).hexdigest() # Placeholder for actual embedding
-        keywords = ", ".join(sorted(list(set(word.lower() for word in experience_text.split() if len(word) > 2)))) # Simple keyword extraction
+        # Embedding and keyword extraction
+        embeddings = embed_texts([text])
+        terms = term_frequencies(text)
+        with shard.db.write() as conn:
+            [(experience_id, duplicate)] = insert_rows(conn, 'experiences', EXPERIENCE_FIELDS, [values], embeddings, [terms])
+        embedded_later(embeddings)
         
-        conn = sqlite3.connect(MEMORY_DB_PATH)
-        cursor = conn.cursor()
+        return {
+            "id": experience_id,
+            "status": "duplicate" if duplicate else "stored",
+            "embedding_provider": encoder.name,
+            "keywords": sorted(terms)
+        }, 200
         
-        cursor.execute("""
-            INSERT INTO experiences (objective, task_description, plan, actions, results, success, embedding_vector, keywords)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (objective, task_description, plan, json.dumps(actions), results, success, embedding_vector, keywords))
+    except Exception as e:
+        return {"error": f"Failed to store experience: {str(e)}"}, 500
+
+@memory_bp.route('/store/experience', methods=['POST'])
+def store_experience():
+    """Store an experience in long-term memory"""
+    return store_response(*store_experience_record(request.get_json()))
+
+@local_route('memory-service', '/api/store/knowledge')
+def store_knowledge_record(data):
+    """Store knowledge in long-term memory, returning (payload, status)"""
+    try:
+        try:
+            values, text = knowledge_row(data)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if snapshot is not None:
+            return READ_ONLY_ANSWER
+        shard = shards.route(values[0])
         
-        experience_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        if not data.get('sync'):
+            queued = enqueue_write('knowledge', data, shard)
+            if queued is not None:
+                return queued
         
-        return jsonify({
-            "id": experience_id,
-            "status": "stored",
-            "embedding_vector": embedding_vector,
-            "keywords": keywords
-        })
+        # Embedding and keyword extraction
+        embeddings = embed_texts([text])
+        terms = term_frequencies(text)
+        with shard.db.write() as conn:
+            [(knowledge_id, duplicate)] = insert_rows(conn, 'knowledge', KNOWLEDGE_FIELDS, [values], embeddings, [terms])
+        embedded_later(embeddings)
+        
+        return {
+            "id": knowledge_id,
+            "status": "duplicate" if duplicate else "stored",
+            "embedding_provider": encoder.name,
+            "keywords": sorted(terms)
+        }, 200
         
     except Exception as e:
-        return jsonify({"error": f"Failed to store experience: {str(e)}"}), 500
+        return {'error': f'Failed to store knowledge: {str(e)}'}, 500
 
 @memory_bp.route('/store/knowledge', methods=['POST'])
 def store_knowledge():
     """Store knowledge in long-term memory"""
+    return store_response(*store_knowledge_record(request.get_json()))
+
+def request_items():
+    """Items of a bulk request: a JSON array, or one JSON document per line for NDJSON bodies.
+
+    Yields (index, item) pairs; an NDJSON line that is not valid JSON yields
+    its ValueError as the item so it is reported without failing the batch.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        index = 0
+        # Buffered: the raw WSGI input stream reads lines a byte at a time
+        for line in io.BufferedReader(request.stream, NDJSON_READ_BUFFER):
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, e
+            index += 1
+        return
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array or an NDJSON body')
+    yield from enumerate(items)
+
+def next_id(conn, table):
+    """First free id of table; ids from there on are ours until the current write transaction ends.
+
+    AUTOINCREMENT never reuses ids, so the next one is above both the
+    sqlite_sequence high-water mark and the current max id. Inserting explicit
+    ids lets executemany report every row's id without a lastrowid per row.
+    """
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    max_id = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+    return max(sequence[0] if sequence else 0, max_id or 0) + 1
+
+def prepare_rows(items, to_row):
+    """Validate (index, item) pairs; returns indices, row values and texts of the valid items, and the errors"""
+    indices, rows, texts, errors = [], [], [], []
+    for index, item in items:
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError('Each item must be a JSON object')
+            values, text = to_row(item)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        indices.append(index)
+        rows.append(values)
+        texts.append(text)
+    return indices, rows, texts, errors
+
+def stored_ids(conn, table, hashes, chunk=500):
+    """Content hash -> id of the rows already stored with one of hashes"""
+    found = {}
+    hashes = list(set(hashes))
+    for start in range(0, len(hashes), chunk):
+        part = hashes[start:start + chunk]
+        found.update(conn.execute(
+            f'SELECT content_hash, id FROM {table} WHERE content_hash IN ({", ".join("?" * len(part))})', part))
+    return found
+
+def insert_rows(conn, table, fields, rows, embeddings, terms):
+    """Insert validated rows and their index terms with consecutive ids inside the current write transaction.
+
+    A row whose content is already stored, or repeated earlier in rows, is not
+    inserted again: the stored row's occurrence count and last_seen are bumped
+    instead. Rows whose terms are None are left to the term indexer.
+    Returns (id, duplicate) for each row.
+    """
+    hashes = [content_hash(values) for values in rows]
+    ids = stored_ids(conn, table, hashes)
+    first_id = next_id(conn, table)
+    results, new_rows, new_terms, repeats = [], [], [], {}
+    for values, embedding, frequencies, digest in zip(rows, embeddings, terms, hashes):
+        if digest in ids:
+            repeats[ids[digest]] = repeats.get(ids[digest], 0) + 1
+            results.append((ids[digest], True))
+            continue
+        row_id = ids[digest] = first_id + len(new_rows)
+        new_rows.append((row_id,) + values + (embedding, digest, int(embedding is None), int(frequencies is None)))
+        if frequencies is not None:
+            new_terms.append((row_id, frequencies))
+        results.append((row_id, False))
+
+    # One INSERT ... SELECT per index is several times faster than triggers firing per row
+    deferred = deferred_insert_triggers(table) if len(new_rows) >= SET_BASED_INSERT_MIN_ROWS else []
+    with suspended_triggers(conn, [name for name, _ in deferred]):
+        conn.executemany(insert_sql(table, fields), new_rows)
+    for _, catch_up in deferred:
+        for sql in catch_up:
+            conn.execute(sql, (first_id,))
+    insert_terms(conn, table, [row_id for row_id, _ in new_terms], [frequencies for _, frequencies in new_terms])
+    conn.executemany(f'UPDATE {table} SET occurrences = occurrences + ?, last_seen = CURRENT_TIMESTAMP WHERE id = ?',
+                     [(count, row_id) for row_id, count in repeats.items()])
+    return results
+
+# Stored columns copied with the row builder's fields when rows move between stores
+COPIED_COLUMNS = ('timestamp', 'embedding', 'content_hash', 'occurrences', 'last_seen', 'embedding_pending')
+
+def copy_rows(conn, table, columns, rows):
+    """Insert rows moved from another store (values of columns) with new consecutive ids, indexed set-based.
+
+    Unlike insert_rows nothing is deduplicated: rows come from a store whose
+    content hashes were already unique.
+    """
+    first_id = next_id(conn, table)
+    ids = list(range(first_id, first_id + len(rows)))
+    deferred = deferred_insert_triggers(table)
+    with suspended_triggers(conn, [name for name, _ in deferred]):
+        conn.executemany(f'INSERT INTO {table} (id, {", ".join(columns)}) VALUES ({", ".join("?" * (len(columns) + 1))})',
+                         [(row_id,) + tuple(row) for row_id, row in zip(ids, rows)])
+    for _, catch_up in deferred:
+        for sql in catch_up:
+            conn.execute(sql, (first_id,))
+    text_columns, to_text = TEXT_COLUMNS[table]
+    positions = [columns.index(name.strip()) for name in text_columns.split(',')]
+    insert_terms(conn, table, ids, [term_frequencies(to_text(*(row[i] for i in positions))) for row in rows])
+
+def insert_routed(table, fields, rows, embeddings, terms):
+    """Insert rows into their owning shards, one write transaction per shard, the shards in parallel.
+
+    Returns (id, duplicate) for each row, in order.
+    """
+    positions = {}
+    for position, values in enumerate(rows):
+        positions.setdefault(shards.route(values[0]), []).append(position)
+
+    def insert_shard(shard):
+        selected = positions[shard]
+        with shard.db.write() as conn:
+            return insert_rows(conn, table, fields, [rows[i] for i in selected],
+                               [embeddings[i] for i in selected], [terms[i] for i in selected])
+
+    stored = [None] * len(rows)
+    for shard, results in zip(positions, shards.map(insert_shard, positions)):
+        for position, result in zip(positions[shard], results):
+            stored[position] = result
+    return stored
+
+def bulk_store(table, fields, items, to_row, batch_size=MEMORY_BULK_BATCH_SIZE):
+    """Validate, embed and insert (index, item) pairs in batched transactions.
+
+    Returns one result per item, in input order: {'index', 'id'} when stored,
+    {'index', 'id', 'duplicate': True} when already stored, {'index', 'error'} when rejected.
+    """
+    results = []
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            break
+        indices, rows, texts, errors = prepare_rows(batch, to_row)
+        results.extend(errors)
+        if not rows:
+            continue
+        # Encode and analyse the whole batch at once, outside the write transaction
+        embeddings = embed_texts(texts)
+        terms = analyse_texts(texts)
+        stored = insert_routed(table, fields, rows, embeddings, terms)
+        embedded_later(embeddings)
+        analysed_later(terms)
+        results.extend({'index': index, 'id': row_id, 'duplicate': True} if duplicate else {'index': index, 'id': row_id}
+                       for index, (row_id, duplicate) in zip(indices, stored))
+    results.sort(key=lambda result: result['index'])
+    return results
+
+# Write-behind record kinds: target table, columns and row builder
+QUEUED_KINDS = {
+    'experience': ('experiences', EXPERIENCE_FIELDS, experience_row),
+    'knowledge': ('knowledge', KNOWLEDGE_FIELDS, knowledge_row)
+}
+
+def prepare_queued(records):
+    """Validate and embed a batch of queued writes, grouped by table, outside the write transaction"""
+    prepared, rejected = [], 0
+    for kind, (table, fields, to_row) in QUEUED_KINDS.items():
+        items = [(record['seq'], record['data']) for record in records if record['kind'] == kind]
+        if not items:
+            continue
+        _, rows, texts, errors = prepare_rows(items, to_row)
+        rejected += len(errors)
+        if rows:
+            # Queued rows left to the embedding pool are found by its next scan, once the batch commits
+            prepared.append((table, fields, rows, embed_texts(texts), [term_frequencies(text) for text in texts]))
+    return prepared, rejected
+
+def apply_queued(conn, prepared):
+    for table, fields, rows, embeddings, terms in prepared:
+        insert_rows(conn, table, fields, rows, embeddings, terms)
+
+write_queue_lock = threading.Lock()
+write_queue_started = False
+
+@memory_bp.before_app_request
+def start_write_queue():
+    """Open each shard's write-behind queue once, replaying writes left unapplied by a previous run"""
+    global write_queue_started
+    if write_queue_started or not MEMORY_WRITE_BEHIND or snapshot is not None:
+        return
+    with write_queue_lock:
+        if write_queue_started:
+            return
+        for shard in shards:
+            try:
+                shard.write_queue = WriteQueue('memory', shard_path(MEMORY_QUEUE_PATH, shard.index), shard.db,
+                                               prepare_queued, apply_queued).open()
+            except QueueUnavailable as e:
+                shard.write_queue_error = str(e)
+                logger.warning('Write-behind disabled for shard %d, its stores are synchronous: %s', shard.index, e)
+        write_queue_started = True
+
+def index_remover(shard):
+    """Compaction callback dropping deleted rows from the shard's vector indexes"""
+    return lambda table, ids: shard.vector_indexes[table].remove(ids)
+
+# Retention and rollup (see memory_compaction.RETENTION_POLICIES), run in the background once the app serves requests
+for shard in shards:
+    shard.compactor = Compactor(shard.db, index_remover(shard))
+
+@memory_bp.before_app_request
+def start_compactor():
+    if snapshot is not None:
+        return
+    for shard in shards:
+        shard.compactor.start()
+
+# Stored rows are embedded in the background (see memory_embedding) unless MEMORY_EMBEDDING_WORKERS is 0
+embedding_pool = EmbeddingPool(shards, encoder, TEXT_COLUMNS) if MEMORY_EMBEDDING_WORKERS > 0 and snapshot is None else None
+
+@memory_bp.before_app_request
+def start_embedding_pool():
+    """Start the pool with the app, so rows left pending by a previous run are embedded"""
+    if embedding_pool is not None:
+        embedding_pool.start()
+
+def embed_texts(texts):
+    """Embedding blobs of texts, or None for each (stored as pending) when the embedding pool computes them"""
+    if embedding_pool is not None:
+        return [None] * len(texts)
+    return [to_blob(vector) for vector in encoder.encode(texts)]
+
+def embedded_later(embeddings):
+    """Wake the embedding pool once rows stored without their embedding are committed"""
+    if embedding_pool is not None and None in embeddings:
+        embedding_pool.start().notify()
+
+# Bulk-inserted rows are term-indexed in the background (see memory_terms) unless MEMORY_DEFERRED_TERMS is false
+term_indexer = TermIndexer(shards, TEXT_COLUMNS, term_frequencies, insert_terms) if MEMORY_DEFERRED_TERMS and snapshot is None else None
+
+@memory_bp.before_app_request
+def start_term_indexer():
+    """Start the indexer with the app, so rows left pending by a previous run are indexed"""
+    if term_indexer is not None:
+        term_indexer.start()
+
+def analyse_texts(texts):
+    """Term frequencies of bulk-inserted texts, or None for each (stored as pending) when the term indexer computes them"""
+    if term_indexer is not None:
+        return [None] * len(texts)
+    return [term_frequencies(text) for text in texts]
+
+def analysed_later(terms):
+    """Wake the term indexer once rows stored without their terms are committed"""
+    if term_indexer is not None and None in terms:
+        term_indexer.start().notify()
+
+def enqueue_write(kind, data, shard):
+    """Queue a validated store in its shard's queue; returns the (payload, status) answer, or None to store synchronously"""
+    start_write_queue()
+    if shard.write_queue is None:
+        return None
     try:
-        data = request.get_json()
-        topic = data.get('topic', '')
-        content = data.get('content', '')
-        source = data.get('source', '')
-        
-        if not topic or not content:
-            return jsonify({'error': 'Topic and content are required'}), 400
-        
-        # Create a simple hash for the knowledge (in real implementation, use embeddings)
-        knowledge_text = f"{topic} {content}"
-        embedding_vector = hashlib.sha256(knowledge_text.encode()).hexdigest() # Placeholder for actual embedding
-        keywords = ", ".join(sorted(list(set(word.lower() for word in knowledge_text.split() if len(word) > 2)))) # Simple keyword extraction
-        
-        conn = sqlite3.connect(MEMORY_DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO knowledge (topic, content, source, embedding_vector, keywords)
-            VALUES (?, ?, ?, ?, ?)
-        """, (topic, content, source, embedding_vector, keywords))
+        sequence = shard.write_queue.enqueue(kind, data)
+    except QueueFull as e:
+        return {'error': 'Memory write queue is full, retry later', 'retry_after': e.retry_after}, 429
+    return {'status': 'queued', 'sequence': sequence}, 202
+
+def store_response(payload, status):
+    response = jsonify(payload)
+    if status == 429:
+        response.headers['Retry-After'] = str(payload['retry_after'])
+    return response, status
+
+def bulk_response(table, fields, to_row):
+    if snapshot is not None:
+        return jsonify(READ_ONLY_ANSWER[0]), READ_ONLY_ANSWER[1]
+    try:
+        results = bulk_store(table, fields, request_items(), to_row)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to store {table}: {str(e)}'}), 500
+    stored = sum(1 for result in results if 'id' in result)
+    return jsonify({
+        'status': 'stored',
+        'stored': stored,
+        'duplicates': sum(1 for result in results if result.get('duplicate')),
+        'failed': len(results) - stored,
+        'results': results
+    })
+
+@memory_bp.route('/store/experiences:bulk', methods=['POST'])
+def store_experiences_bulk():
+    """Store many experiences from a JSON array or an NDJSON stream"""
+    return bulk_response('experiences', EXPERIENCE_FIELDS, experience_row)
+
+@memory_bp.route('/store/knowledge:bulk', methods=['POST'])
+def store_knowledge_bulk():
+    """Store many knowledge items from a JSON array or an NDJSON stream"""
+    return bulk_response('knowledge', KNOWLEDGE_FIELDS, knowledge_row)
+
+# Retrievers reading only the database; semantic and hybrid retrieval also search the shard's vector index
+RETRIEVERS = {'lexical': lexical_matches, 'keyword': keyword_matches}
+
+# Recent pages, served until the next committed write (see memory_cache)
+retrieval_cache = RetrievalCache(shards.generation)
+
+def normalized_query(query):
+    """Query text as every retriever reads it: case and spacing make no difference to the results"""
+    return ' '.join(query.lower().split())
+
+def ranking_key(query, weights):
+    """Checksum of what a ranking depends on besides the mode, so a cursor cannot resume another ranking"""
+    return zlib.crc32((normalized_query(query) + (json.dumps(weights, sort_keys=True) if weights else '')).encode('utf-8'))
+
+def cache_key(table, request_spec, limit):
+    """Everything a page depends on; a first page's reference time is left out since it is always now"""
+    return (table, request_spec['mode'], normalized_query(request_spec['query']),
+            json.dumps(request_spec['weights'], sort_keys=True) if request_spec['weights'] else None,
+            tuple(request_spec['fields']), limit, request_spec['after'],
+            request_spec['as_of'] if request_spec['after'] else None)
+
+def encode_cursor(request_spec, position):
+    """Opaque cursor for the (phase, score, id) position of the last result of a page"""
+    key = {'m': request_spec['mode'], 'q': ranking_key(request_spec['query'], request_spec['weights']), 'p': position}
+    if request_spec['as_of'] is not None:
+        key['t'] = request_spec['as_of']
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, mode, ranking):
+    """(position, reference time) of a cursor; raises ValueError when it does not belong to this ranking"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        position = tuple(key['p'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if key.get('m') != mode or key.get('q') != ranking:
+        raise ValueError('Cursor belongs to another query or mode')
+    return position, key.get('t')
+
+def retrieval_request(table, data):
+    """Validate a retrieval payload; raises ValueError.
+
+    An empty query walks the whole store in id order. 'fields' (a list or a
+    comma-separated string) projects the results, 'cursor' resumes after the
+    last result of a previous page and 'weights' overrides the hybrid
+    ranking weights (see memory_ranking).
+    """
+    query = data.get('query') or ''
+    mode = data.get('mode', 'lexical')
+    fields = data.get('fields') or RESULT_FIELDS[table]
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f'Unknown mode: {mode}')
+    unknown = [field for field in fields if field not in RESULT_FIELDS[table]]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    limit = data.get('limit')
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+        raise ValueError('Limit must be a positive integer')
+    weights = data.get('weights')
+    if weights is not None and not isinstance(weights, dict):
+        raise ValueError('Weights must be an object of signal weights')
+    weights = memory_ranking.resolve_weights(weights) if mode == 'hybrid' else None
+    cursor = data.get('cursor')
+    after, as_of = decode_cursor(cursor, mode, ranking_key(query, weights)) if cursor else (None, None)
+    if mode == 'hybrid' and as_of is None:
+        # Julian day of now: recency is measured from here on every page of this ranking
+        as_of = time.time() / 86400 + 2440587.5
+    return {
+        'query': query,
+        'mode': mode,
+        'fields': list(dict.fromkeys(fields)),
+        'limit': limit,
+        'weights': weights,
+        'as_of': as_of,
+        'after': after
+    }
+
+def match_order(match):
+    """Sort key of a (row + (score,), phase) match in the order every retriever returns them"""
+    row, phase = match
+    return (phase, -row[-1] if row[-1] is not None else 0, row[0])
+
+def shard_matches(shard, table, request_spec, columns, limit, after):
+    """The shard's first limit matches after the position, and the keywords of their rows when requested"""
+    query, mode = request_spec['query'], request_spec['mode']
+    with shard.db.read() as conn:
+        if not query:
+            rows = listed_rows(conn, table, columns, limit, after)
+        elif mode == 'hybrid':
+            rows = hybrid_matches(shard.vector_indexes[table], conn, table, columns, query, limit, after,
+                                  request_spec['weights'], request_spec['as_of'])
+        elif mode == 'semantic':
+            rows = semantic_matches(shard.vector_indexes[table], conn, table, columns, query, limit, after)
+        else:
+            rows = RETRIEVERS[mode](conn, table, columns, query, limit, after)
+        rows = rows[:limit]
+        keywords = document_keywords(conn, table, [row[0] for row, _ in rows]) if 'keywords' in request_spec['fields'] else {}
+    return rows, keywords
+
+def snapshot_matches(table, request_spec, stored, limit, after):
+    """shard_matches for a snapshot replica; lexical queries are answered by the keyword ranking"""
+    query, mode = request_spec['query'], request_spec['mode']
+    if not query:
+        matches = snapshot.listed(table, limit, after)
+    elif mode == 'hybrid':
+        matches = snapshot.hybrid_matches(table, query, encoder.encode([query])[0], limit, after,
+                                          request_spec['weights'], request_spec['as_of'])
+    elif mode == 'semantic':
+        matches = snapshot.semantic_matches(table, encoder.encode([query])[0], limit, after)
+    else:
+        matches = snapshot.keyword_matches(table, query, limit, after)
+    positions = [position for position, _, _ in matches]
+    columns = [snapshot.values(table, name, positions) for name in ('id',) + tuple(stored)]
+    rows = [(tuple(values) + (score,), phase) for values, (_, score, phase) in zip(zip(*columns), matches)]
+    keywords = {}
+    if 'keywords' in request_spec['fields']:
+        keywords = {row[0]: terms.split() for (row, _), terms in zip(rows, snapshot.values(table, 'keywords', positions))}
+    return rows, keywords
+
+def retrieve_page(table, request_spec, limit, after):
+    """One page of results, best first, and the position of its last result when more may follow.
+
+    Every shard is queried in parallel for a page after the same position;
+    ids are unique across shards and each shard returns its matches in
+    match_order, so the page is the head of their merge. Scores are computed
+    per shard (BM25 document frequencies are the shard's own), which hash
+    routing keeps close to store-wide ones.
+    """
+    fields = request_spec['fields']
+    stored = [field for field in RESULT_FIELDS[table] if field in fields and field not in DERIVED_FIELDS + ('id',)]
+    columns = ', '.join(f'{table}.{name}' for name in ('id',) + tuple(stored))
+    if snapshot is not None:
+        pages = [snapshot_matches(table, request_spec, stored, limit + 1, after)]
+    else:
+        pages = shards.map(lambda shard: shard_matches(shard, table, request_spec, columns, limit + 1, after))
+    rows = merge_ranked([shard_rows for shard_rows, _ in pages], match_order, limit + 1)
+    keywords = {row_id: terms for _, shard_keywords in pages for row_id, terms in shard_keywords.items()}
+
+    results = []
+    for row, _ in rows[:limit]:
+        values = dict(zip(('id',) + tuple(stored) + ('score',), row))
+        values['keywords'] = keywords.get(row[0])
+        results.append({field: RESULT_DECODERS[field](values[field]) if field in RESULT_DECODERS else values[field]
+                        for field in fields})
+    if len(rows) <= limit:
+        return results, None
+    row, phase = rows[limit - 1]
+    return results, (phase, row[-1], row[0])
+
+def find_records(table, data):
+    """One page of retrieval results as a (payload, status) answer, from the retrieval cache when possible"""
+    try:
+        try:
+            request_spec = retrieval_request(table, data)
+        except ValueError as e:
+            return {'error': str(e)}, 400
         
-        knowledge_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        limit = min(request_spec['limit'] or 5, MEMORY_RETRIEVE_MAX_LIMIT)
+        key = cache_key(table, request_spec, limit)
+        payload = retrieval_cache.get(key)
+        if payload is None:
+            # Read before querying, so a write committed meanwhile invalidates the page
+            generation = shards.generation()
+            results, position = retrieve_page(table, request_spec, limit, request_spec['after'])
+            payload = {
+                'mode': request_spec['mode'],
+                table: results,
+                'count': len(results),
+                'next_cursor': encode_cursor(request_spec, position) if position else None
+            }
+            retrieval_cache.put(key, generation, payload)
         
-        return jsonify({
-            "id": knowledge_id,
-            "status": "stored",
-            "embedding_vector": embedding_vector,
-            "keywords": keywords
-        })
+        # In-process callers get their own copy of the cached results
+        return {'query': request_spec['query'], **copy.deepcopy(payload)}, 200
         
     except Exception as e:
-        return jsonify({'error': f'Failed to store knowledge: {str(e)}'}), 500
+        return {'error': f'Failed to retrieve {table}: {str(e)}'}, 500
+
+def stream_records(table, request_spec):
+    """NDJSON lines of every result up to the limit (all by default), read page by page, then a summary line.
+
+    Each page is read in its own short transaction and resumed from the last
+    position, so memory stays constant however many rows are walked.
+    """
+    remaining, after, count = request_spec['limit'], request_spec['after'], 0
+    while remaining is None or remaining > 0:
+        page_size = MEMORY_STREAM_PAGE_SIZE if remaining is None else min(remaining, MEMORY_STREAM_PAGE_SIZE)
+        try:
+            results, position = retrieve_page(table, request_spec, page_size, after)
+        except Exception as e:
+            yield json.dumps({'error': f'Failed to retrieve {table}: {str(e)}'}) + '\n'
+            return
+        for result in results:
+            yield json.dumps(result) + '\n'
+        count += len(results)
+        remaining = None if remaining is None else remaining - len(results)
+        after = position
+        if position is None:
+            break
+    next_cursor = encode_cursor(request_spec, after) if after else None
+    yield json.dumps({'count': count, 'next_cursor': next_cursor}) + '\n'
+
+def retrieval_response(table):
+    """JSON page, or an NDJSON stream when the request asks for "stream": true"""
+    data = request.get_json(silent=True) or {}
+    if data.get('stream'):
+        try:
+            request_spec = retrieval_request(table, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return Response(stream_records(table, request_spec), mimetype='application/x-ndjson')
+    payload, status = find_records(table, data)
+    return jsonify(payload), status
+
+@local_route('memory-service', '/api/retrieve/experiences')
+def find_experiences(data):
+    """Retrieve similar experiences from memory, returning (payload, status)"""
+    return find_records('experiences', data)
 
 @memory_bp.route('/retrieve/experiences', methods=['POST'])
 def retrieve_experiences():
     """Retrieve similar experiences from memory"""
+    return retrieval_response('experiences')
+
+@local_route('memory-service', '/api/retrieve/knowledge')
+def find_knowledge(data):
+    """Retrieve relevant knowledge from memory, returning (payload, status)"""
+    return find_records('knowledge', data)
+
+@memory_bp.route('/retrieve/knowledge', methods=['POST'])
+def retrieve_knowledge():
+    """Retrieve relevant knowledge from memory"""
+    return retrieval_response('knowledge')
+
+def source_breakdown(rows):
+    totals = {'total': 0, 'successful': 0, 'by_source': {}}
+    for source, total, successful in rows:
+        totals['total'] += total
+        totals['successful'] += successful
+        totals['by_source'][source or 'unknown'] = {
+            'total': total,
+            'successful': successful,
+            'success_rate': successful / total if total > 0 else 0
+        }
+    totals['success_rate'] = totals['successful'] / totals['total'] if totals['total'] > 0 else 0
+    return totals
+
+def shard_totals(shard):
+    with shard.db.read() as conn:
+        return conn.execute('SELECT kind, source, total, successful FROM memory_totals').fetchall()
+
+@memory_bp.route('/stats', methods=['GET'])
+def memory_stats():
+    """Get memory statistics, read from the counters the triggers maintain"""
     try:
-        data = request.get_json()
-        query = data.get('query', '')
-        limit = data.get('limit', 5)
-        
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        conn = sqlite3.connect(MEMORY_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Advanced text-based search using keywords and objective/task_description
-        # In a real implementation, this would involve vector similarity search
-        cursor.execute("""
-            SELECT id, objective, task_description, plan, actions, results, success, timestamp, embedding_vector, keywords
-            FROM experiences
-            WHERE objective LIKE ? OR task_description LIKE ? OR keywords LIKE ? OR plan LIKE ? OR results LIKE ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%', limit))
-        
-        experiences = []
-        for row in cursor.fetchall():
-            experiences.append({
-                'id': row[0],
-                'objective': row[1],
-                'task_description': row[2],
-                'plan': row[3],
-                'actions': json.loads(row[4]) if row[4] else [],
-                'results': row[5],
-                'success': bool(row[6]),
-                'timestamp': row[7],
-                'embedding_vector': row[8],
-                'keywords': row[9]
-            })
-        
-        conn.close()
+        totals = {}
+        for rows in ([snapshot.query('SELECT kind, source, total, successful FROM memory_totals')] if snapshot is not None
+                     else shards.map(shard_totals)):
+            for kind, source, total, successful in rows:
+                counts = totals.setdefault((kind, source), [0, 0])
+                counts[0] += total
+                counts[1] += successful
         
+        experiences = source_breakdown([(source, *counts) for (kind, source), counts in totals.items() if kind == 'experiences'])
+        knowledge = source_breakdown([(source, *counts) for (kind, source), counts in totals.items() if kind == 'knowledge'])
         return jsonify({
-            'query': query,
             'experiences': experiences,
-            'count': len(experiences)
+            'knowledge': {
+                'total': knowledge['total'],
+                'by_source': {source: {'total': item['total']} for source, item in knowledge['by_source'].items()}
+            },
+            'embedding_provider': encoder.name,
+            'retrieval_cache': retrieval_cache.stats(),
+            'embedding_pool': embedding_pool.stats() if embedding_pool is not None else None,
+            'term_indexer': term_indexer.stats() if term_indexer is not None else None,
+            'snapshot': snapshot.stats() if snapshot is not None else None,
+            'shards': [] if snapshot is not None else [{
+                'index': shard.index,
+                'database': shard.db.stats(),
+                'write_queue': shard.write_queue.stats() if shard.write_queue is not None else None,
+                # Why the shard's stores are synchronous although write-behind is enabled
+                'write_queue_error': shard.write_queue_error,
+                'compaction': shard.compactor.stats(),
+                'vector_index': {
+                    'experiences': shard.vector_indexes['experiences'].stats(),
+                    'knowledge': shard.vector_indexes['knowledge'].stats()
+                }
+            } for shard in shards]
         })
         
     except Exception as e:
-        return jsonify({'error': f'Failed to retrieve experiences: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to get memory stats: {str(e)}'}), 500
 
-@memory_bp.route('/retrieve/knowledge', methods=['POST'])
-def retrieve_knowledge():
-    """Retrieve relevant knowledge from memory"""
+# Length of the bucket key prefix for each series granularity ('YYYY-MM-DD HH:00' is stored per hour)
+SERIES_BUCKETS = {'hour': 16, 'day': 10}
+
+@memory_bp.route('/stats/series', methods=['GET'])
+def memory_stats_series():
+    """Stored rows and success rate per hour or day, optionally for one source"""
     try:
-        data = request.get_json()
-        query = data.get('query', '')
-        limit = data.get('limit', 5)
+        kind = request.args.get('kind', 'experiences')
+        bucket = request.args.get('bucket', 'day')
+        source = request.args.get('source')
+        until = request.args.get('until') or (datetime.utcnow() + timedelta(hours=1)).strftime('%Y-%m-%d %H:00')
+        since = request.args.get('since') or (datetime.utcnow() - timedelta(days=7)).strftime('%Y-%m-%d')
         
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        conn = sqlite3.connect(MEMORY_DB_PATH)
-        cursor = conn.cursor()
+        if kind not in STATS_SUCCESS:
+            return jsonify({'error': f'Unknown kind: {kind}'}), 400
+        if bucket not in SERIES_BUCKETS:
+            return jsonify({'error': f'Unknown bucket: {bucket}'}), 400
         
-        # Advanced text-based search using keywords and topic/content
-        # In a real implementation, this would involve vector similarity search
-        cursor.execute("""
-            SELECT id, topic, content, source, timestamp, embedding_vector, keywords
-            FROM knowledge
-            WHERE topic LIKE ? OR content LIKE ? OR keywords LIKE ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (f'%{query}%', f'%{query}%', f'%{query}%', limit))
+        sql = f"""
+            SELECT substr(bucket, 1, {SERIES_BUCKETS[bucket]}) AS period, SUM(total), SUM(successful)
+            FROM memory_series
+            WHERE kind = ? AND bucket >= ? AND bucket < ?
+        """
+        params = [kind, since, until]
+        if source is not None:
+            sql += ' AND source = ?'
+            params.append('' if source == 'unknown' else source)
+        sql += ' GROUP BY period ORDER BY period'
         
-        knowledge_items = []
-        for row in cursor.fetchall():
-            knowledge_items.append({
-                'id': row[0],
-                'topic': row[1],
-                'content': row[2],
-                'source': row[3],
-                'timestamp': row[4],
-                'embedding_vector': row[5],
-                'keywords': row[6]
-            })
+        def shard_series(shard):
+            with shard.db.read() as conn:
+                return conn.execute(sql, params).fetchall()
         
-        conn.close()
+        periods = {}
+        for rows in [snapshot.query(sql, params)] if snapshot is not None else shards.map(shard_series):
+            for period, total, successful in rows:
+                counts = periods.setdefault(period, [0, 0])
+                counts[0] += total
+                counts[1] += successful
         
         return jsonify({
-            'query': query,
-            'knowledge': knowledge_items,
-            'count': len(knowledge_items)
+            'kind': kind,
+            'bucket': bucket,
+            'since': since,
+            'until': until,
+            'source': source,
+            'series': [{
+                'bucket': period,
+                'total': total,
+                'successful': successful,
+                'success_rate': successful / total if total > 0 else 0
+            } for period, (total, successful) in sorted(periods.items()) if total]
         })
         
     except Exception as e:
-        return jsonify({'error': f'Failed to retrieve knowledge: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to get memory stats series: {str(e)}'}), 500
 
-@memory_bp.route('/stats', methods=['GET'])
-def memory_stats():
-    """Get memory statistics"""
+def combined_report(reports):
+    """Sum of the shards' compaction reports; they run in parallel, so seconds is the slowest shard's"""
+    report = {'expired': {table: sum(shard_report['expired'][table] for shard_report in reports)
+                          for table in ('experiences', 'knowledge')}}
+    for key in ('rolled_up', 'archive_chunks_written', 'archive_entries_expired', 'bytes_reclaimed'):
+        report[key] = sum(shard_report[key] for shard_report in reports)
+    report['seconds'] = max(shard_report['seconds'] for shard_report in reports)
+    return report
+
+@memory_bp.route('/compact', methods=['POST'])
+def compact_memory():
+    """Run a retention and rollup pass now and report what it removed"""
+    if snapshot is not None:
+        return jsonify(READ_ONLY_ANSWER[0]), READ_ONLY_ANSWER[1]
     try:
-        conn = sqlite3.connect(MEMORY_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Count experiences
-        cursor.execute('SELECT COUNT(*) FROM experiences')
-        experience_count = cursor.fetchone()[0]
-        
-        # Count knowledge items
-        cursor.execute('SELECT COUNT(*) FROM knowledge')
-        knowledge_count = cursor.fetchone()[0]
+        return jsonify(combined_report(shards.map(lambda shard: shard.compactor.run())))
+    except Exception as e:
+        return jsonify({'error': f'Failed to compact memory: {str(e)}'}), 500
+
+@memory_bp.route('/archive/experiences', methods=['GET'])
+def archived_experiences():
+    """Experiences rolled up into the archive, per source and day; entries=true decompresses them"""
+    if snapshot is not None:
+        return jsonify(READ_ONLY_ANSWER[0]), READ_ONLY_ANSWER[1]
+    try:
+        source = request.args.get('source')
+        since = request.args.get('since', '')
+        until = request.args.get('until', '9999')
+        with_entries = request.args.get('entries', 'false').lower() == 'true'
         
-        # Count successful experiences
-        cursor.execute('SELECT COUNT(*) FROM experiences WHERE success = 1')
-        successful_experiences = cursor.fetchone()[0]
+        sql = """
+            SELECT id, source, day, entries, successful, occurrences, first_timestamp, last_timestamp,
+                   length(payload), {payload}
+            FROM experiences_archive
+            WHERE day >= ? AND day < ?
+        """.format(payload='payload' if with_entries else 'NULL')
+        params = [since, until]
+        if source is not None:
+            sql += ' AND source = ?'
+            params.append(source)
+        sql += ' ORDER BY day, id'
         
-        conn.close()
+        def shard_chunks(shard):
+            with shard.db.read() as conn:
+                return [(shard.index,) + row for row in conn.execute(sql, params)]
         
-        return jsonify({
-            'experiences': {
-                'total': experience_count,
-                'successful': successful_experiences,
-                'success_rate': successful_experiences / experience_count if experience_count > 0 else 0
-            },
-            'knowledge': {
-                'total': knowledge_count
+        # Chunk ids are per shard
+        rows = sorted((row for rows in shards.map(shard_chunks) for row in rows), key=lambda row: (row[3], row[0], row[1]))
+        chunks = []
+        for shard_index, *row in rows:
+            chunk = {
+                'shard': shard_index,
+                'id': row[0],
+                'source': row[1] or 'unknown',
+                'day': row[2],
+                'entries': row[3],
+                'successful': row[4],
+                'occurrences': row[5],
+                'first_timestamp': row[6],
+                'last_timestamp': row[7],
+                'compressed_bytes': row[8]
             }
-        })
+            if with_entries:
+                chunk['experiences'] = [dict(entry, actions=json.loads(entry['actions']) if entry['actions'] else [])
+                                        for entry in decode_entries(row[9])]
+            chunks.append(chunk)
+        
+        return jsonify({'chunks': chunks, 'count': len(chunks)})
         
     except Exception as e:
-        return jsonify({'error': f'Failed to get memory stats: {str(e)}'}), 500
-
+        return jsonify({'error': f'Failed to read archived experiences: {str(e)}'}), 500
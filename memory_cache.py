@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Retrieval pages kept by the memory service (0 disables the cache)
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', '1024'))
+# Upper bound on an entry's age: hybrid recency moves with the clock, and writes made by another
+# process on the same files do not move this process's write generation
+MEMORY_CACHE_TTL = float(os.getenv('MEMORY_CACHE_TTL', '60'))
+
+
+class RetrievalCache:
+    """LRU of retrieval results tagged with the write generation they were computed at.
+
+    generation() returns the store's current write generation; an entry is only
+    served while it is unchanged, so any committed write (store, queued batch,
+    compaction) turns every older entry into a miss. Callers read the
+    generation before running the query they cache: a write committing
+    meanwhile then invalidates the entry instead of leaving it stale.
+    """
+
+    def __init__(self, generation, max_entries=MEMORY_CACHE_MAX_ENTRIES, ttl=MEMORY_CACHE_TTL):
+        self.generation = generation
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    def get(self, key):
+        """Cached value of key, or None when absent, written over or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, expires_at, value = entry
+            if generation != self.generation() or expires_at <= time.monotonic():
+                del self.entries[key]
+                self.invalidated += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, generation, value):
+        """Cache value, computed from the store as of generation"""
+        if self.max_entries <= 0 or generation != self.generation():
+            return
+        with self.lock:
+            self.entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'generation': self.generation(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0,
+                'evictions': self.evictions,
+                'invalidated': self.invalidated
+            }
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import zlib
+import threading
+from collections import Counter
+from memory_db import suspended_triggers
+
+# Seconds between background compaction runs; 0 leaves compaction to POST /api/memory/compact
+MEMORY_COMPACTION_INTERVAL = int(os.getenv('MEMORY_COMPACTION_INTERVAL', '3600'))
+# Rows per write transaction, so compaction never holds the writer lock for long
+MEMORY_COMPACTION_BATCH = int(os.getenv('MEMORY_COMPACTION_BATCH', '500'))
+
+# Retention per source: experiences not seen for rollup_after_days move to the compressed archive,
+# rows and archived entries older than ttl_days are deleted; None disables a step.
+# Rows are kept by default; only the sources listed opt in to rollup and expiry.
+# MEMORY_RETENTION_POLICIES (JSON) overrides or adds sources, e.g. {"web": {"rollup_after_days": 30, "ttl_days": 90}}
+RETENTION_POLICIES = {
+    'default': {'rollup_after_days': None, 'ttl_days': None},
+    'simple-planning': {'rollup_after_days': 7, 'ttl_days': 365},
+    'self-evaluation': {'rollup_after_days': 14, 'ttl_days': 365}
+}
+RETENTION_POLICIES.update(json.loads(os.getenv('MEMORY_RETENTION_POLICIES', '{}')))
+
+# Experience columns kept for each archived entry (the embedding is dropped)
+ARCHIVE_FIELDS = ('id', 'objective', 'task_description', 'plan', 'actions', 'results', 'success',
+                  'timestamp', 'occurrences', 'last_seen')
+
+
+def retention_policy(source):
+    policy = dict(RETENTION_POLICIES['default'])
+    policy.update(RETENTION_POLICIES.get(source or 'default', {}))
+    return policy
+
+
+def encode_entries(entries):
+    return zlib.compress(json.dumps(entries, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def decode_entries(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+def placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def insert_archive_chunk(conn, source, day, entries):
+    """Store entries (dicts of ARCHIVE_FIELDS) of one source and day as a compressed archive chunk"""
+    conn.execute("""
+        INSERT INTO experiences_archive
+            (source, day, entries, successful, occurrences, first_timestamp, last_timestamp, payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (source, day, len(entries), sum(1 for entry in entries if entry['success']),
+          sum(entry['occurrences'] for entry in entries),
+          min(entry['timestamp'] for entry in entries), max(entry['timestamp'] for entry in entries),
+          encode_entries(entries)))
+
+
+def restore_archive_chunk(conn, source, day, entries):
+    """Archive entries moved in from another store, counting them in the statistics as rolled-up rows are"""
+    insert_archive_chunk(conn, source, day, entries)
+    totals, series = archived_counts(entries)
+    conn.execute("""
+        INSERT INTO memory_totals (kind, source, total, successful) VALUES ('experiences', ?, ?, ?)
+        ON CONFLICT (kind, source) DO UPDATE SET total = total + excluded.total, successful = successful + excluded.successful
+    """, (source, totals['total'], totals['successful']))
+    conn.executemany("""
+        INSERT INTO memory_series (kind, bucket, source, total, successful) VALUES ('experiences', ?, ?, ?, ?)
+        ON CONFLICT (kind, bucket, source) DO UPDATE SET total = total + excluded.total, successful = successful + excluded.successful
+    """, [(bucket, source, series[bucket, 'total'], series[bucket, 'successful'])
+          for bucket in {bucket for bucket, _ in series}])
+
+
+def archived_counts(entries):
+    """Counters of archived entries: totals by 'total'/'successful', series by (hourly bucket, 'total'/'successful')"""
+    totals, series = Counter(), Counter()
+    for entry in entries:
+        bucket = f"{(entry['timestamp'] or '')[:13]}:00"
+        totals['total'] += 1
+        totals['successful'] += bool(entry['success'])
+        series[bucket, 'total'] += 1
+        series[bucket, 'successful'] += bool(entry['success'])
+    return totals, series
+
+
+class Compactor:
+    """Retention for the memory store: TTL expiry and rollup of old experiences into the archive.
+
+    Every step deletes or moves at most batch_size rows per write transaction;
+    in WAL mode readers keep reading the last committed state meanwhile and
+    queued writes interleave between batches. Rolled-up experiences still count
+    in memory_totals and memory_series (they are archived, not forgotten);
+    expired rows and archived entries are subtracted. After each run
+    on_delete(table, ids) receives every row id that left the table.
+    """
+
+    def __init__(self, db, on_delete, interval=MEMORY_COMPACTION_INTERVAL, batch_size=MEMORY_COMPACTION_BATCH):
+        self.db = db
+        self.on_delete = on_delete
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.thread = None
+        self.runs = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_report = None
+        self.bytes_reclaimed = 0
+
+    def start(self):
+        if self.interval > 0 and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='memory-compaction', daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+
+    def run(self):
+        """One compaction pass over every source; returns its report"""
+        with self.lock:
+            started = time.perf_counter()
+            used_before = self.used_bytes()
+            report = {'expired': {'experiences': 0, 'knowledge': 0}, 'rolled_up': 0,
+                      'archive_chunks_written': 0, 'archive_entries_expired': 0}
+            for table in ('experiences', 'knowledge'):
+                removed = []
+                for source in self.sources(table):
+                    policy = retention_policy(source)
+                    if policy.get('ttl_days') is not None:
+                        expired = self.expire(table, source, policy['ttl_days'])
+                        report['expired'][table] += len(expired)
+                        removed.extend(expired)
+                    if table == 'experiences' and policy.get('rollup_after_days') is not None:
+                        rolled_up, chunks = self.roll_up(source, policy['rollup_after_days'])
+                        report['rolled_up'] += len(rolled_up)
+                        report['archive_chunks_written'] += chunks
+                        removed.extend(rolled_up)
+                if removed:
+                    self.on_delete(table, removed)
+            report['archive_entries_expired'] = self.expire_archive()
+
+            report['bytes_reclaimed'] = used_before - self.used_bytes()
+            report['seconds'] = time.perf_counter() - started
+            self.runs += 1
+            self.bytes_reclaimed += report['bytes_reclaimed']
+            self.last_report = report
+            return report
+
+    def sources(self, table):
+        with self.db.read() as conn:
+            return [row[0] for row in conn.execute(
+                'SELECT source FROM memory_totals WHERE kind = ? AND total > 0', (table,))]
+
+    def used_bytes(self):
+        """Bytes of the database file holding live pages (freed pages are reused before the file grows)"""
+        with self.db.read() as conn:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            pages = conn.execute('PRAGMA page_count').fetchone()[0]
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (pages - free) * page_size
+
+    def stale_rows(self, conn, table, columns, source, days):
+        """Up to batch_size rows of source neither stored nor seen again in the last days"""
+        age = f'-{days} days'
+        return conn.execute(f"""
+            SELECT {columns} FROM {table}
+            WHERE source = ? AND timestamp < datetime('now', ?) AND COALESCE(last_seen, timestamp) < datetime('now', ?)
+            LIMIT ?
+        """, (source, age, age, self.batch_size)).fetchall()
+
+    def expire(self, table, source, days):
+        """Delete the rows of source past their TTL; returns their ids"""
+        removed = []
+        while True:
+            with self.db.write() as conn:
+                ids = [row[0] for row in self.stale_rows(conn, table, 'id', source, days)]
+                if ids:
+                    conn.execute(f'DELETE FROM {table} WHERE id IN ({placeholders(ids)})', ids)
+            removed.extend(ids)
+            if len(ids) < self.batch_size:
+                return removed
+
+    def roll_up(self, source, days):
+        """Move old experiences of source into compressed per-day archive chunks; returns (ids, chunks written)"""
+        removed, chunks = [], 0
+        while True:
+            with self.db.write() as conn:
+                rows = self.stale_rows(conn, 'experiences', ', '.join(ARCHIVE_FIELDS), source, days)
+                by_day = {}
+                for row in rows:
+                    by_day.setdefault((row[7] or '')[:10], []).append(dict(zip(ARCHIVE_FIELDS, row)))
+                for day, entries in by_day.items():
+                    insert_archive_chunk(conn, source, day, entries)
+                ids = [row[0] for row in rows]
+                if ids:
+                    self.delete_keeping_stats(conn, ids)
+            removed.extend(ids)
+            chunks += len(by_day)
+            if len(rows) < self.batch_size:
+                return removed, chunks
+
+    def delete_keeping_stats(self, conn, ids):
+        """Delete experiences without subtracting them from the statistics"""
+        with suspended_triggers(conn, ['experiences_stats_delete']):
+            conn.execute(f'DELETE FROM experiences WHERE id IN ({placeholders(ids)})', ids)
+
+    def expire_archive(self):
+        """Delete archive chunks past their source's TTL and subtract their entries from the statistics"""
+        with self.db.read() as conn:
+            sources = [row[0] for row in conn.execute('SELECT DISTINCT source FROM experiences_archive')]
+        expired = 0
+        for source in sources:
+            days = retention_policy(source).get('ttl_days')
+            if days is None:
+                continue
+            while True:
+                with self.db.write() as conn:
+                    chunks = conn.execute("""
+                        SELECT id, payload FROM experiences_archive
+                        WHERE source = ? AND last_timestamp < datetime('now', ?)
+                        LIMIT ?
+                    """, (source, f'-{days} days', self.batch_size)).fetchall()
+                    totals, series = archived_counts(entry for _, payload in chunks for entry in decode_entries(payload))
+                    if chunks:
+                        conn.execute("""
+                            UPDATE memory_totals SET total = total - ?, successful = successful - ?
+                            WHERE kind = 'experiences' AND source = ?
+                        """, (totals['total'], totals['successful'], source))
+                        conn.executemany("""
+                            UPDATE memory_series SET total = total - ?, successful = successful - ?
+                            WHERE kind = 'experiences' AND bucket = ? AND source = ?
+                        """, [(series[bucket, 'total'], series[bucket, 'successful'], bucket, source)
+                              for bucket in {bucket for bucket, _ in series}])
+                        ids = [chunk[0] for chunk in chunks]
+                        conn.execute(f'DELETE FROM experiences_archive WHERE id IN ({placeholders(ids)})', ids)
+                expired += totals['total']
+                if len(chunks) < self.batch_size:
+                    break
+        return expired
+
+    def stats(self):
+        return {
+            'interval_seconds': self.interval,
+            'batch_size': self.batch_size,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'bytes_reclaimed_total': self.bytes_reclaimed,
+            'last_run': self.last_report,
+            'policies': RETENTION_POLICIES
+        }
@@ -0,0 +1,174 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# SQLite tuning for the memory service
+MEMORY_DB_SYNCHRONOUS = os.getenv('MEMORY_DB_SYNCHRONOUS', 'NORMAL')
+MEMORY_DB_CACHE_SIZE_KB = int(os.getenv('MEMORY_DB_CACHE_SIZE_KB', '65536'))
+MEMORY_DB_MMAP_SIZE = int(os.getenv('MEMORY_DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+MEMORY_DB_BUSY_TIMEOUT_MS = int(os.getenv('MEMORY_DB_BUSY_TIMEOUT_MS', '5000'))
+MEMORY_DB_CACHED_STATEMENTS = int(os.getenv('MEMORY_DB_CACHED_STATEMENTS', '256'))
+
+
+def trigger_guard(name):
+    """WHEN clause letting suspended_triggers() silence the trigger name"""
+    return f"WHEN NOT EXISTS (SELECT 1 FROM suspended_triggers WHERE name = '{name}')"
+
+
+@contextmanager
+def suspended_triggers(conn, names):
+    """Silence the guarded triggers names for the statements run inside, within the current write transaction.
+
+    The flags are rows of suspended_triggers, written and removed by the same
+    transaction: other connections never see them, a rollback discards them,
+    and unlike dropping the triggers the schema (and every connection's
+    prepared statements) stays as it is.
+    """
+    conn.executemany('INSERT INTO suspended_triggers (name) VALUES (?)', [(name,) for name in names])
+    try:
+        yield conn
+    finally:
+        conn.executemany('DELETE FROM suspended_triggers WHERE name = ?', [(name,) for name in names])
+
+
+class ConnectionManager:
+    """Per-thread SQLite connections in WAL mode with a single serialized writer.
+
+    Each thread keeps one connection open for its lifetime, so the prepared
+    statement cache survives across requests. WAL lets readers run while a write
+    is in progress; writers queue on an in-process lock instead of spinning in
+    SQLite's busy handler, which also lets us measure lock contention.
+    """
+
+    def __init__(self, path, synchronous=MEMORY_DB_SYNCHRONOUS, cache_size_kb=MEMORY_DB_CACHE_SIZE_KB,
+                 mmap_size=MEMORY_DB_MMAP_SIZE, busy_timeout_ms=MEMORY_DB_BUSY_TIMEOUT_MS,
+                 cached_statements=MEMORY_DB_CACHED_STATEMENTS):
+        self.path = path
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.connections = []
+        self.reads = 0
+        self.writes = 0
+        self.rollbacks = 0
+        self.contended_writes = 0
+        self.write_wait_total = 0.0
+        self.write_wait_max = 0.0
+        self.write_hold_total = 0.0
+        # Committed write transactions: moves whenever what readers can see changes
+        self.generation = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def connection(self):
+        """The calling thread's connection, opened and tuned on first use"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: transactions are opened explicitly by read()/write()
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   timeout=self.busy_timeout_ms / 1000, cached_statements=self.cached_statements)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            conn.execute(f'PRAGMA cache_size=-{self.cache_size_kb}')
+            conn.execute(f'PRAGMA mmap_size={self.mmap_size}')
+            conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self.local.conn = conn
+            with self.stats_lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """Run queries against a consistent snapshot"""
+        conn = self.connection()
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.execute('COMMIT')
+            with self.stats_lock:
+                self.reads += 1
+
+    @contextmanager
+    def write(self):
+        """Run statements in one IMMEDIATE transaction, committed on success and rolled back on error"""
+        conn = self.connection()
+        started = time.perf_counter()
+        contended = not self.write_lock.acquire(blocking=False)
+        if contended:
+            self.write_lock.acquire()
+        acquired = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                with self.stats_lock:
+                    self.rollbacks += 1
+                raise
+            conn.execute('COMMIT')
+            with self.stats_lock:
+                self.generation += 1
+        finally:
+            self.write_lock.release()
+            waited = acquired - started
+            with self.stats_lock:
+                self.writes += 1
+                self.contended_writes += contended
+                self.write_wait_total += waited
+                self.write_wait_max = max(self.write_wait_max, waited)
+                self.write_hold_total += time.perf_counter() - acquired
+
+    def migrate(self, migrations):
+        """Apply the schema migrations newer than PRAGMA user_version, each in its own transaction.
+
+        migrations is the ordered list of functions taking a connection; the
+        schema version is the number of migrations applied.
+        """
+        applied = []
+        for version, migration in enumerate(migrations, start=1):
+            with self.write() as conn:
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                    continue
+                migration(conn)
+                conn.execute(f'PRAGMA user_version={version}')
+                applied.append(version)
+        return applied
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'path': os.path.abspath(self.path),
+                'journal_mode': 'wal',
+                'synchronous': self.synchronous,
+                'connections': len(self.connections),
+                'reads': self.reads,
+                'writes': self.writes,
+                'rollbacks': self.rollbacks,
+                'generation': self.generation,
+                'write_lock': {
+                    'contended': self.contended_writes,
+                    'contention_ratio': self.contended_writes / self.writes if self.writes else 0,
+                    'wait_seconds_total': self.write_wait_total,
+                    'wait_seconds_max': self.write_wait_max,
+                    'hold_seconds_total': self.write_hold_total
+                }
+            }
+
+    def close(self):
+        with self.stats_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
@@ -0,0 +1,203 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from embeddings import to_blob
+
+# Threads embedding stored rows in the background; 0 embeds on the request path as each row is stored
+MEMORY_EMBEDDING_WORKERS = int(os.getenv('MEMORY_EMBEDDING_WORKERS', '2'))
+# Rows encoded per call: larger batches amortise the encoder's per-call cost (and fill a GPU)
+MEMORY_EMBEDDING_BATCH_SIZE = int(os.getenv('MEMORY_EMBEDDING_BATCH_SIZE', '64'))
+# Seconds a partial batch waits for more rows before it is encoded
+MEMORY_EMBEDDING_LINGER = float(os.getenv('MEMORY_EMBEDDING_LINGER', '0.02'))
+# Seconds between scans for pending rows nobody announced (previous runs, other processes)
+MEMORY_EMBEDDING_POLL_INTERVAL = float(os.getenv('MEMORY_EMBEDDING_POLL_INTERVAL', '1'))
+# Batches kept for the timing metrics
+TIMING_WINDOW = 256
+RETRY_DELAY = 1.0
+
+
+class EmbeddingPool:
+    """Background embedding of the rows stored with embedding_pending = 1.
+
+    A dispatcher thread reads the pending ids of each shard and table in id
+    order and hands them out in micro-batches of up to batch_size to a pool
+    of workers. A worker reads its batch's texts, encodes them in one call
+    and writes the blobs in one transaction, stamping the batch with the
+    next embedded_seq so the vector indexes load the rows on their next sync.
+    Stores call notify() once committed; the dispatcher also scans every
+    poll_interval for rows nobody announced. Updates only touch rows still
+    pending, so a batch handed out twice (after a failure) is harmless.
+    """
+
+    def __init__(self, shards, encoder, text_columns, workers=MEMORY_EMBEDDING_WORKERS,
+                 batch_size=MEMORY_EMBEDDING_BATCH_SIZE, linger=MEMORY_EMBEDDING_LINGER,
+                 poll_interval=MEMORY_EMBEDDING_POLL_INTERVAL):
+        self.shards = shards
+        self.encoder = encoder
+        self.text_columns = text_columns
+        self.workers = workers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.idle = threading.Condition(self.lock)
+        # Bounds the batches handed out but not finished, so a backlog stays in SQLite
+        self.slots = threading.BoundedSemaphore(2 * workers)
+        self.executor = None
+        self.thread = None
+        self.cursors = {}
+        self.retry = set()
+        self.in_flight = 0
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self.last_error = None
+        self.encode_seconds = 0.0
+        self.timings = deque(maxlen=TIMING_WINDOW)
+
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='memory-embedding')
+                    self.thread = threading.Thread(target=self._run, name='memory-embedding-dispatch', daemon=True)
+                    self.thread.start()
+        return self
+
+    def notify(self):
+        """Rows were committed with embedding_pending = 1"""
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            with self.lock:
+                for key in self.retry:
+                    self.cursors[key] = 0
+                self.retry.clear()
+            try:
+                while self.dispatch():
+                    pass
+            except Exception as e:
+                with self.lock:
+                    self.failures += 1
+                    self.last_error = str(e)
+                time.sleep(RETRY_DELAY)
+
+    def pending_ids(self, shard, table, limit):
+        with shard.db.read() as conn:
+            return [row[0] for row in conn.execute(
+                f'SELECT id FROM {table} WHERE embedding_pending = 1 AND id > ? ORDER BY id LIMIT ?',
+                (self.cursors.get((shard.index, table), 0), limit))]
+
+    def dispatch(self):
+        """Hand out the pending rows past each cursor; returns whether any full batch was found"""
+        full = False
+        for shard in self.shards:
+            for table in self.text_columns:
+                ids = self.pending_ids(shard, table, self.batch_size)
+                if 0 < len(ids) < self.batch_size and self.linger > 0:
+                    time.sleep(self.linger)
+                    ids = self.pending_ids(shard, table, self.batch_size)
+                if not ids:
+                    continue
+                full = full or len(ids) == self.batch_size
+                self.cursors[shard.index, table] = ids[-1]
+                self.slots.acquire()
+                with self.lock:
+                    self.in_flight += 1
+                self.executor.submit(self.embed, shard, table, ids)
+        return full
+
+    def embed(self, shard, table, ids):
+        """Encode and store the embeddings of the rows of ids still pending"""
+        started = time.perf_counter()
+        try:
+            columns, to_text = self.text_columns[table]
+            placeholders = ', '.join('?' * len(ids))
+            with shard.db.read() as conn:
+                rows = conn.execute(f'SELECT id, {columns} FROM {table} WHERE id IN ({placeholders}) AND embedding_pending = 1',
+                                    ids).fetchall()
+            encode_seconds = 0.0
+            if rows:
+                encode_started = time.perf_counter()
+                vectors = self.encoder.encode([to_text(*row[1:]) for row in rows])
+                encode_seconds = time.perf_counter() - encode_started
+                with shard.db.write() as conn:
+                    conn.execute('UPDATE embedding_sequence SET seq = seq + 1 WHERE name = ?', (table,))
+                    sequence = conn.execute('SELECT seq FROM embedding_sequence WHERE name = ?', (table,)).fetchone()[0]
+                    conn.executemany(
+                        f'UPDATE {table} SET embedding = ?, embedding_pending = 0, embedded_seq = ? WHERE id = ? AND embedding_pending = 1',
+                        [(to_blob(vector), sequence, row[0]) for row, vector in zip(rows, vectors)])
+            with self.lock:
+                self.batches += 1
+                self.rows += len(rows)
+                self.encode_seconds += encode_seconds
+                self.timings.append((len(rows), time.perf_counter() - started, encode_seconds))
+        except Exception as e:
+            with self.lock:
+                self.failures += 1
+                self.last_error = str(e)
+                self.retry.add((shard.index, table))
+        finally:
+            self.slots.release()
+            with self.lock:
+                self.in_flight -= 1
+                self.idle.notify_all()
+
+    def pending(self):
+        """Rows waiting for their embedding, per table"""
+        counts = {table: 0 for table in self.text_columns}
+        for shard in self.shards:
+            with shard.db.read() as conn:
+                for table in counts:
+                    counts[table] += conn.execute(
+                        f'SELECT COUNT(*) FROM {table} WHERE embedding_pending = 1').fetchone()[0]
+        return counts
+
+    def wait(self, timeout=None):
+        """Block until no row is pending (for offline tools); returns whether the pool got there in time"""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                while self.in_flight:
+                    self.idle.wait(None if deadline is None else max(0, deadline - time.monotonic()))
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return False
+            if not any(self.pending().values()):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self.notify()
+            time.sleep(min(0.05, self.poll_interval))
+
+    def stats(self):
+        pending = self.pending()
+        with self.lock:
+            timings = np.array(self.timings) if self.timings else np.zeros((0, 3))
+            return {
+                'workers': self.workers,
+                'batch_size': self.batch_size,
+                'linger_seconds': self.linger,
+                'pending': pending,
+                'in_flight_batches': self.in_flight,
+                'batches': self.batches,
+                'rows_embedded': self.rows,
+                'failures': self.failures,
+                'last_error': self.last_error,
+                'encode_rows_per_second': self.rows / self.encode_seconds if self.encode_seconds else 0,
+                # Over the last TIMING_WINDOW batches; batch seconds include reading the texts and writing the blobs
+                'recent_batches': {
+                    'count': len(timings),
+                    'average_rows': float(timings[:, 0].mean()) if len(timings) else 0,
+                    'batch_seconds_p50': float(np.percentile(timings[:, 1], 50)) if len(timings) else 0,
+                    'batch_seconds_p95': float(np.percentile(timings[:, 1], 95)) if len(timings) else 0,
+                    'encode_seconds_p50': float(np.percentile(timings[:, 2], 50)) if len(timings) else 0
+                }
+            }
@@ -0,0 +1,63 @@
+import os
+import json
+import math
+import numpy as np
+
+# Weight of each ranking signal; every signal is scaled to [0, 1] before weighting.
+# MEMORY_RANK_WEIGHTS (JSON) overrides some of them, e.g. {"recency": 0.3}
+DEFAULT_WEIGHTS = {'lexical': 0.35, 'vector': 0.35, 'recency': 0.15, 'success': 0.15}
+MEMORY_RANK_WEIGHTS = {**DEFAULT_WEIGHTS, **json.loads(os.getenv('MEMORY_RANK_WEIGHTS', '{}'))}
+# Age in days at which the recency signal has halved
+MEMORY_RANK_HALF_LIFE_DAYS = float(os.getenv('MEMORY_RANK_HALF_LIFE_DAYS', '30'))
+# Candidates taken from each generator (BM25 and vector search) before reranking
+MEMORY_RANK_CANDIDATES = int(os.getenv('MEMORY_RANK_CANDIDATES', '100'))
+# BM25 term-frequency saturation
+BM25_K1 = 1.2
+
+
+def idf(documents, df):
+    """BM25 inverse document frequency of a term found in df of documents"""
+    return math.log(1 + (documents - df + 0.5) / (df + 0.5))
+
+
+def term_weight(tf, idf):
+    """BM25 contribution of a term occurring tf times (scalar or array), without length normalisation"""
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1) * idf
+
+
+def resolve_weights(overrides=None):
+    """Configured weights with per-request overrides; raises ValueError on unknown signals or non-numbers.
+
+    A negative weight turns a signal into a penalty, e.g. {"success": -0.2}
+    to surface past failures.
+    """
+    weights = dict(MEMORY_RANK_WEIGHTS)
+    for name, weight in (overrides or {}).items():
+        if name not in DEFAULT_WEIGHTS:
+            raise ValueError(f'Unknown ranking signal: {name}')
+        if not isinstance(weight, (int, float)) or isinstance(weight, bool):
+            raise ValueError(f'Weight of {name} must be a number')
+        weights[name] = float(weight)
+    return weights
+
+
+def signals(bm25, cosine, age_days, success, half_life_days=MEMORY_RANK_HALF_LIFE_DAYS):
+    """Signal name -> array in [0, 1] for each candidate.
+
+    BM25 is divided by the best candidate's score (it has no fixed scale),
+    cosine similarity is clipped at 0 and recency decays exponentially with
+    the age of the last time the memory was stored or seen again.
+    """
+    bm25 = np.asarray(bm25, dtype=np.float64)
+    best = bm25.max() if len(bm25) else 0
+    return {
+        'lexical': bm25 / best if best > 0 else np.zeros_like(bm25),
+        'vector': np.clip(np.asarray(cosine, dtype=np.float64), 0, 1),
+        'recency': 0.5 ** (np.maximum(np.asarray(age_days, dtype=np.float64), 0) / half_life_days),
+        'success': np.asarray(success, dtype=np.float64)
+    }
+
+
+def hybrid_scores(candidate_signals, weights):
+    """Weighted sum of the signals of each candidate"""
+    return sum(weights[name] * values for name, values in candidate_signals.items())
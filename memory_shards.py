@@ -0,0 +1,130 @@
+import os
+import zlib
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from memory_db import ConnectionManager
+from text_analysis import fold
+
+# Database files the memory store is split into, routed by a hash of the experience objective or knowledge
+# topic. MEMORY_DB_PATH holds shard 0 and shard i lives next to it (memory-1.db, ...). Changing the count
+# of an existing store requires an offline reshard: python reshard_memory.py --shards N
+MEMORY_SHARDS = int(os.getenv('MEMORY_SHARDS', '1'))
+# Threads fanning retrievals, bulk writes and maintenance out to the shards
+MEMORY_SHARD_WORKERS = int(os.getenv('MEMORY_SHARD_WORKERS', str(MEMORY_SHARDS)))
+# Row ids of shard i are allocated above i << SHARD_ID_BITS, so that ids are unique across shards
+SHARD_ID_BITS = 40
+
+
+class ShardLayoutError(Exception):
+    """Raised when a database file belongs to another shard layout than the configured one"""
+
+
+def shard_path(path, index):
+    """File of shard index for a store or log at path (shard 0 is path itself)"""
+    if index == 0:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}-{index}{extension}'
+
+
+def shard_key(text):
+    """Stable hash of a routing key, ignoring case, accents and spacing"""
+    return zlib.crc32(' '.join(fold(text or '').split()).encode('utf-8'))
+
+
+def merge_ranked(ranked_lists, key, limit):
+    """First limit items of lists that are each sorted by key"""
+    return list(itertools.islice(heapq.merge(*ranked_lists, key=key), limit))
+
+
+class Shard:
+    """One database file of the store with its connections and in-memory vector indexes.
+
+    The memory service attaches the shard's write-behind queue and compactor.
+    """
+
+    def __init__(self, index, path, vector_indexes):
+        self.index = index
+        self.path = path
+        self.db = ConnectionManager(path)
+        self.vector_indexes = vector_indexes
+        self.write_queue = None
+        self.write_queue_error = None
+        self.compactor = None
+
+    def claim(self, conn, count, tables):
+        """Record this shard's place in the layout, or check it against the recorded one.
+
+        A store created before sharding is shard 0 of 1. A new shard's
+        AUTOINCREMENT sequences start at the bottom of its id range.
+        """
+        conn.execute('CREATE TABLE IF NOT EXISTS memory_shard (shard INTEGER NOT NULL, shards INTEGER NOT NULL)')
+        layout = conn.execute('SELECT shard, shards FROM memory_shard').fetchone()
+        if layout is None:
+            stored = any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in tables)
+            layout = (0, 1) if stored else (self.index, count)
+            conn.execute('INSERT INTO memory_shard (shard, shards) VALUES (?, ?)', layout)
+            if self.index and not stored:
+                for table in tables:
+                    conn.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+                    conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                                 (table, self.index << SHARD_ID_BITS))
+        if tuple(layout) != (self.index, count):
+            raise ShardLayoutError(f'{self.path} is shard {layout[0]} of {layout[1]} but MEMORY_SHARDS is {count}: '
+                                   f'run reshard_memory.py --shards {count} while the service is stopped')
+
+
+class ShardSet:
+    """The shards of the memory store and a thread pool to run work on several of them at once"""
+
+    def __init__(self, path, count=MEMORY_SHARDS, workers=MEMORY_SHARD_WORKERS, vector_indexes=dict):
+        if count < 1:
+            raise ValueError('A memory store needs at least one shard')
+        self.shards = [Shard(index, shard_path(path, index), vector_indexes()) for index in range(count)]
+        self.workers = max(1, workers)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self.shards)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def __getitem__(self, index):
+        return self.shards[index]
+
+    def open(self, migrations, tables):
+        """Migrate every shard and check that it belongs to this layout; raises ShardLayoutError"""
+        for shard in self.shards:
+            shard.db.migrate(migrations)
+            with shard.db.write() as conn:
+                shard.claim(conn, len(self.shards), tables)
+        return self
+
+    def generation(self):
+        """Write generation of the whole store: moves on every write committed to any shard"""
+        return sum(shard.db.generation for shard in self.shards)
+
+    def route(self, key):
+        """Shard owning the rows with this objective or topic"""
+        if len(self.shards) == 1:
+            return self.shards[0]
+        return self.shards[shard_key(key) % len(self.shards)]
+
+    def map(self, fn, shards=None):
+        """fn(shard) for each shard (every shard by default), run in parallel; results in the same order"""
+        shards = self.shards if shards is None else list(shards)
+        if len(shards) <= 1 or self.workers == 1:
+            return [fn(shard) for shard in shards]
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='memory-shard')
+        return list(self.executor.map(fn, shards))
+
+    def close(self):
+        for shard in self.shards:
+            shard.db.close()
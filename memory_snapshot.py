@@ -0,0 +1,540 @@
+"""Columnar snapshots of the memory store: export, import and memory-mapped read-only retrieval.
+
+A snapshot is one file: fixed-width columns (ids, flags, counts, ages,
+content hashes, the embedding matrix and a CSR term index) are stored raw
+and 64-byte aligned, so a reader maps them without copying; text columns
+are zlib-compressed JSON blocks of SNAPSHOT_BLOCK_ROWS values, decoded on
+demand. A JSON footer describes where everything is.
+
+    python memory_snapshot.py export memory.snap
+    python memory_snapshot.py import memory.snap    # into an empty store
+    python memory_snapshot.py info memory.snap
+
+Setting MEMORY_SNAPSHOT_PATH starts the memory service as a read-only
+replica serving retrievals and statistics from the mapped file.
+"""
+import os
+import sys
+import json
+import mmap
+import zlib
+import heapq
+import struct
+import sqlite3
+import argparse
+import itertools
+import threading
+import contextlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+import numpy as np
+from text_analysis import tokens
+from vector_index import ranked
+import memory_ranking
+
+MAGIC = b'MEMSNAP1'
+# File footer: length of the JSON header just before it, then the magic again
+FOOTER = struct.Struct('<Q8s')
+ALIGNMENT = 64
+TEXT = 'text'
+HASH_BYTES = 16
+
+# Values per compressed block of a text column, and decoded blocks an open snapshot keeps
+SNAPSHOT_BLOCK_ROWS = int(os.getenv('MEMORY_SNAPSHOT_BLOCK_ROWS', '1024'))
+SNAPSHOT_BLOCK_CACHE = int(os.getenv('MEMORY_SNAPSHOT_BLOCK_CACHE', '256'))
+# Rows converted to a numpy chunk at a time while exporting
+EXPORT_CHUNK = 65536
+
+# Exported columns of each table: (name, dtype or TEXT, SQL expression)
+SNAPSHOT_COLUMNS = {
+    'experiences': [
+        ('id', '<i8', 'id'),
+        ('objective', TEXT, 'objective'),
+        ('task_description', TEXT, 'task_description'),
+        ('plan', TEXT, 'plan'),
+        ('actions', TEXT, 'actions'),
+        ('results', TEXT, 'results'),
+        ('success', '|i1', 'COALESCE(success, 0) != 0'),
+        ('source', TEXT, 'source'),
+        ('timestamp', TEXT, 'timestamp'),
+        ('occurrences', '<i4', 'occurrences'),
+        ('last_seen', TEXT, 'last_seen'),
+        # Julian day the memory was last stored or seen, for the recency signal
+        ('seen_day', '<f8', 'COALESCE(julianday(COALESCE(last_seen, timestamp)), 0)')
+    ],
+    'knowledge': [
+        ('id', '<i8', 'id'),
+        ('topic', TEXT, 'topic'),
+        ('content', TEXT, 'content'),
+        ('source', TEXT, 'source'),
+        ('timestamp', TEXT, 'timestamp'),
+        ('occurrences', '<i4', 'occurrences'),
+        ('last_seen', TEXT, 'last_seen'),
+        ('seen_day', '<f8', 'COALESCE(julianday(COALESCE(last_seen, timestamp)), 0)')
+    ]
+}
+ARCHIVE_COLUMNS = [
+    ('source', TEXT, 'source'),
+    ('day', TEXT, 'day'),
+    ('entries', '<i4', 'entries'),
+    ('successful', '<i4', 'successful'),
+    ('occurrences', '<i4', 'occurrences'),
+    ('first_timestamp', TEXT, 'first_timestamp'),
+    ('last_timestamp', TEXT, 'last_timestamp')
+]
+
+
+class SnapshotWriter:
+    """Appends column sections to a snapshot file and records where each one starts"""
+
+    def __init__(self, f, block_rows=SNAPSHOT_BLOCK_ROWS):
+        self.f = f
+        self.block_rows = block_rows
+        f.write(MAGIC)
+
+    def array(self, chunks, dtype, row_shape=()):
+        """Fixed-width column written from numpy chunks, contiguous and aligned for memory mapping"""
+        self.f.write(b'\0' * (-self.f.tell() % ALIGNMENT))
+        offset, rows = self.f.tell(), 0
+        for chunk in chunks:
+            chunk = np.ascontiguousarray(chunk, dtype=dtype).reshape((-1,) + tuple(row_shape))
+            self.f.write(chunk.tobytes())
+            rows += len(chunk)
+        return {'dtype': dtype, 'shape': [rows] + list(row_shape), 'offset': offset}
+
+    def text(self, values):
+        """Text column written as compressed JSON blocks of block_rows values (None for NULL)"""
+        blocks = []
+        for block in batched(values, self.block_rows):
+            payload = zlib.compress(json.dumps(block, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            blocks.append([self.f.tell(), len(payload)])
+            self.f.write(payload)
+        return {'dtype': TEXT, 'block_rows': self.block_rows, 'blocks': blocks}
+
+    def blobs(self, values):
+        """Binary column: the values back to back, then their end offsets"""
+        ends = []
+        data = self.array((np.frombuffer(value, dtype='|u1') for value in record_ends(values, ends)), '|u1')
+        return {'dtype': 'blob', 'data': data, 'ends': self.array([np.array(ends, dtype='<i8')], '<i8')}
+
+    def close(self, header):
+        payload = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        self.f.write(payload)
+        self.f.write(FOOTER.pack(len(payload), MAGIC))
+
+
+def record_ends(values, ends):
+    """Yield values, appending the running end offset of each one to ends"""
+    end = 0
+    for value in values:
+        end += len(value)
+        ends.append(end)
+        yield value
+
+
+def batched(values, size):
+    values = iter(values)
+    while True:
+        batch = list(itertools.islice(values, size))
+        if not batch:
+            return
+        yield batch
+
+
+def column_values(conns, table, expression):
+    """Values of an expression for every row of table, shard after shard, each in id order.
+
+    Shard i allocates ids above i << SHARD_ID_BITS, so this is global id order.
+    """
+    for conn in conns:
+        for row in conn.execute(f'SELECT {expression} FROM {table} ORDER BY id'):
+            yield row[0]
+
+
+def keyword_lists(conns, table):
+    """Indexed terms of every row in id order, most frequent first, space-separated"""
+    for conn in conns:
+        for (terms,) in conn.execute(f"""
+                SELECT {table}_doc_terms.terms FROM {table}
+                LEFT JOIN {table}_doc_terms ON {table}_doc_terms.doc_id = {table}.id
+                ORDER BY {table}.id
+        """):
+            yield ' '.join(json.loads(terms)) if terms else ''
+
+
+def export_table(writer, conns, table, dim):
+    """Write the columns, embeddings and term index of table; returns its header entry"""
+    header = {
+        'rows': sum(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for conn in conns),
+        # Document count BM25 uses, archived experiences included as in memory_totals
+        'documents': sum(conn.execute('SELECT COALESCE(SUM(total), 0) FROM memory_totals WHERE kind = ?',
+                                      (table,)).fetchone()[0] for conn in conns),
+        'columns': {}
+    }
+    columns = header['columns']
+    for name, dtype, expression in SNAPSHOT_COLUMNS[table]:
+        values = column_values(conns, table, expression)
+        if dtype == TEXT:
+            columns[name] = writer.text(values)
+        else:
+            columns[name] = writer.array((np.array(chunk) for chunk in batched(values, EXPORT_CHUNK)), dtype)
+    columns['content_hash'] = writer.array(
+        (np.frombuffer(b''.join(value or bytes(HASH_BYTES) for value in chunk), dtype='|u1')
+         for chunk in batched(column_values(conns, table, 'content_hash'), EXPORT_CHUNK)), '|u1', (HASH_BYTES,))
+    # Vectors of another provider or dimension are left out, as the vector index skips them
+    blob_bytes = dim * 4
+    columns['has_embedding'] = writer.array(
+        (np.array(chunk) for chunk in batched(column_values(
+            conns, table, f'embedding IS NOT NULL AND length(embedding) = {blob_bytes}'), EXPORT_CHUNK)), '|i1')
+    columns['embedding'] = writer.array(
+        (np.frombuffer(b''.join(value if value and len(value) == blob_bytes else bytes(blob_bytes) for value in chunk),
+                       dtype='<f4') for chunk in batched(column_values(conns, table, 'embedding'), 4096)),
+        '<f4', (dim,))
+    columns['keywords'] = writer.text(keyword_lists(conns, table))
+
+    # Term index: sorted terms, each with its range of (row position, tf) postings
+    ids = np.fromiter(column_values(conns, table, 'id'), dtype='<i8')
+    terms, starts = [], []
+
+    def posting_chunks():
+        merged = heapq.merge(*(conn.execute(f'SELECT term, doc_id, tf FROM {table}_terms ORDER BY term, doc_id')
+                               for conn in conns))
+        position = 0
+        for chunk in batched(merged, EXPORT_CHUNK):
+            for offset, (term, _, _) in enumerate(chunk):
+                if not terms or terms[-1] != term:
+                    terms.append(term)
+                    starts.append(position + offset)
+            position += len(chunk)
+            yield np.column_stack([np.searchsorted(ids, [row[1] for row in chunk]), [row[2] for row in chunk]])
+        starts.append(position)
+
+    columns['postings'] = writer.array(posting_chunks(), '<i4', (2,))
+    columns['terms'] = writer.text(terms)
+    columns['term_starts'] = writer.array([np.array(starts or [0])], '<i8')
+    return header
+
+
+def export_snapshot(memory, path, block_rows=SNAPSHOT_BLOCK_ROWS):
+    """Write a snapshot of every shard of the store to path (through a temporary file); returns its header.
+
+    All shards are read in one read transaction each, so the snapshot is
+    consistent per shard while the service keeps serving writes. Rows still
+    waiting for their index terms are indexed first.
+    """
+    if memory.term_indexer is not None:
+        memory.term_indexer.flush()
+    header = {
+        'format': 1,
+        'created': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        'embedding': {'provider': memory.encoder.name, 'dim': memory.encoder.dim},
+        'tables': {},
+        'totals': [],
+        'series': []
+    }
+    tmp_path = f'{path}.tmp'
+    with contextlib.ExitStack() as stack:
+        conns = [stack.enter_context(shard.db.read()) for shard in memory.shards]
+        with open(tmp_path, 'wb') as f:
+            writer = SnapshotWriter(f, block_rows)
+            for table in SNAPSHOT_COLUMNS:
+                header['tables'][table] = export_table(writer, conns, table, memory.encoder.dim)
+            archive = {'rows': sum(conn.execute('SELECT COUNT(*) FROM experiences_archive').fetchone()[0]
+                                   for conn in conns), 'columns': {}}
+            for name, dtype, expression in ARCHIVE_COLUMNS:
+                values = (row[0] for conn in conns
+                          for row in conn.execute(f'SELECT {expression} FROM experiences_archive ORDER BY id'))
+                archive['columns'][name] = writer.text(values) if dtype == TEXT else writer.array([np.array(list(values))], dtype)
+            archive['columns']['payload'] = writer.blobs(
+                row[0] for conn in conns for row in conn.execute('SELECT payload FROM experiences_archive ORDER BY id'))
+            header['archive'] = archive
+            for name, table, keys in (('totals', 'memory_totals', 2), ('series', 'memory_series', 3)):
+                summed = {}
+                for conn in conns:
+                    for row in conn.execute(f'SELECT * FROM {table}'):
+                        counts = summed.setdefault(row[:keys], [0, 0])
+                        counts[0] += row[keys]
+                        counts[1] += row[keys + 1]
+                header[name] = [list(key) + counts for key, counts in sorted(summed.items()) if counts != [0, 0]]
+            writer.close(header)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+class Snapshot:
+    """Read-only store backed by a memory-mapped snapshot file.
+
+    Fixed-width columns are numpy views of the mapping: opening costs the
+    footer and the term dictionaries, and pages are read as queries touch
+    them. Text blocks are decompressed on demand and the last
+    SNAPSHOT_BLOCK_CACHE of them kept. Retrieval follows the database path's
+    rankings: keyword BM25 over the term index (which also serves lexical
+    queries, there is no FTS index in a snapshot), exact cosine search over
+    the embedding matrix and the hybrid reranking of both.
+    """
+
+    def __init__(self, path, block_cache=SNAPSHOT_BLOCK_CACHE):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < len(MAGIC) + FOOTER.size or self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a memory snapshot')
+        length, magic = FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is truncated')
+        self.header = json.loads(self.map[len(self.map) - FOOTER.size - length:len(self.map) - FOOTER.size])
+        self.embedding = self.header['embedding']
+        self.block_cache = block_cache
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+        self.block_reads = 0
+        self.term_ids = {table: {term: index for index, term in enumerate(self.text(table, 'terms'))}
+                         for table in self.header['tables']}
+        # Totals and series in SQLite, so that the statistics routes run their usual queries
+        self.statistics = sqlite3.connect(':memory:', check_same_thread=False)
+        self.statistics.execute('CREATE TABLE memory_totals (kind TEXT, source TEXT, total INTEGER, successful INTEGER)')
+        self.statistics.execute(
+            'CREATE TABLE memory_series (kind TEXT, bucket TEXT, source TEXT, total INTEGER, successful INTEGER)')
+        self.statistics.executemany('INSERT INTO memory_totals VALUES (?, ?, ?, ?)', self.header['totals'])
+        self.statistics.executemany('INSERT INTO memory_series VALUES (?, ?, ?, ?, ?)', self.header['series'])
+
+    def descriptor(self, table, name):
+        if table == 'experiences_archive':
+            return self.header['archive']['columns'][name]
+        return self.header['tables'][table]['columns'][name]
+
+    def mapped(self, descriptor):
+        count = int(np.prod(descriptor['shape']))
+        return np.frombuffer(self.map, dtype=descriptor['dtype'], count=count,
+                             offset=descriptor['offset']).reshape(descriptor['shape'])
+
+    def array(self, table, name):
+        """Fixed-width column as a read-only view of the mapping"""
+        return self.mapped(self.descriptor(table, name))
+
+    def block(self, table, name, index):
+        key = (table, name, index)
+        with self.lock:
+            values = self.blocks.get(key)
+            if values is not None:
+                self.blocks.move_to_end(key)
+                return values
+        offset, length = self.descriptor(table, name)['blocks'][index]
+        values = json.loads(zlib.decompress(self.map[offset:offset + length]))
+        with self.lock:
+            self.block_reads += 1
+            self.blocks[key] = values
+            while len(self.blocks) > self.block_cache:
+                self.blocks.popitem(last=False)
+        return values
+
+    def text(self, table, name, positions=None):
+        """Values of a text column at positions (every value by default)"""
+        descriptor = self.descriptor(table, name)
+        if positions is None:
+            return [value for index in range(len(descriptor['blocks'])) for value in self.block(table, name, index)]
+        block_rows = descriptor['block_rows']
+        return [self.block(table, name, position // block_rows)[position % block_rows] for position in positions]
+
+    def values(self, table, name, positions):
+        """Python values of any column at positions"""
+        descriptor = self.descriptor(table, name)
+        if descriptor['dtype'] == TEXT:
+            return self.text(table, name, positions)
+        if descriptor['dtype'] == 'blob':
+            data, ends = self.mapped(descriptor['data']), self.mapped(descriptor['ends'])
+            return [data[ends[p - 1] if p else 0:ends[p]].tobytes() for p in positions]
+        values = self.array(table, name)[np.asarray(positions, dtype=np.int64)]
+        return [bytes(value) for value in values] if values.ndim > 1 and values.dtype == np.uint8 else values.tolist()
+
+    def bm25(self, table, query):
+        """Any-word BM25 score and number of query terms matched of every row, and the number of query terms"""
+        terms = list(dict.fromkeys(tokens(query)))
+        rows = self.header['tables'][table]['rows']
+        documents = self.header['tables'][table]['documents']
+        postings, starts = self.array(table, 'postings'), self.array(table, 'term_starts')
+        scores, matched = np.zeros(rows), np.zeros(rows, dtype=np.int32)
+        for term in terms:
+            index = self.term_ids[table].get(term)
+            if index is None:
+                continue
+            term_postings = postings[starts[index]:starts[index + 1]]
+            scores[term_postings[:, 0]] += memory_ranking.term_weight(
+                term_postings[:, 1].astype(np.float64), memory_ranking.idf(documents, len(term_postings)))
+            matched[term_postings[:, 0]] += 1
+        return scores, matched, len(terms)
+
+    def keyword_matches(self, table, query, limit, after=None):
+        """Rows with every query term (phase 0), then with some of them (phase 1), by BM25: (position, score, phase)"""
+        scores, matched, term_count = self.bm25(table, query)
+        ids = self.array(table, 'id')
+        positions = np.flatnonzero(matched)
+        phases = (matched[positions] < term_count).astype(np.int64)
+        if after is not None:
+            phase, score, row_id = after
+            keep = (phases > phase) | ((phases == phase) & ((scores[positions] < score) |
+                                                           ((scores[positions] == score) & (ids[positions] > row_id))))
+            positions, phases = positions[keep], phases[keep]
+        order = np.lexsort((ids[positions], -scores[positions], phases))[:limit]
+        return [(int(positions[i]), float(scores[positions[i]]), int(phases[i])) for i in order]
+
+    def cosine(self, table, query_vector):
+        """Cosine similarity of every row with an embedding, as (positions, scores)"""
+        positions = np.flatnonzero(self.array(table, 'has_embedding'))
+        return positions, self.array(table, 'embedding')[positions] @ np.asarray(query_vector, dtype=np.float32)
+
+    def semantic_matches(self, table, query_vector, limit, after=None):
+        """Rows closest to the query embedding: (position, cosine similarity, 0)"""
+        positions, scores = self.cosine(table, query_vector)
+        ids = self.array(table, 'id')[positions]
+        if after is not None:
+            keep = (scores < after[1]) | ((scores == after[1]) & (ids > after[2]))
+            positions, scores, ids = positions[keep], scores[keep], ids[keep]
+        best = ranked(scores, ids, limit)
+        return [(int(positions[i]), float(scores[i]), 0) for i in best]
+
+    def hybrid_matches(self, table, query, query_vector, limit, after=None, weights=None, as_of=None):
+        """Rows reranked by memory_ranking from the BM25 and vector-search candidates: (position, score, 0)"""
+        candidates = memory_ranking.MEMORY_RANK_CANDIDATES
+        positions = {position for position, _, _ in self.keyword_matches(table, query, candidates)}
+        positions.update(position for position, _, _ in self.semantic_matches(table, query_vector, candidates))
+        if not positions:
+            return []
+        positions = np.array(sorted(positions))
+        scores, _, _ = self.bm25(table, query)
+        ids = self.array(table, 'id')[positions]
+        cosine = np.where(self.array(table, 'has_embedding')[positions] != 0,
+                          self.array(table, 'embedding')[positions] @ np.asarray(query_vector, dtype=np.float32), 0)
+        success = self.array(table, 'success')[positions] if 'success' in self.header['tables'][table]['columns'] \
+            else np.zeros(len(positions))
+        # Rows without a timestamp (seen_day 0) count as new, as they do in the database
+        seen_day = self.array(table, 'seen_day')[positions]
+        as_of = as_of if as_of is not None else datetime.now(timezone.utc).timestamp() / 86400 + 2440587.5
+        hybrid = memory_ranking.hybrid_scores(memory_ranking.signals(
+            scores[positions], cosine, np.where(seen_day > 0, as_of - seen_day, 0), success
+        ), weights or memory_ranking.MEMORY_RANK_WEIGHTS)
+        if after is not None:
+            keep = (hybrid < after[1]) | ((hybrid == after[1]) & (ids > after[2]))
+            positions, hybrid, ids = positions[keep], hybrid[keep], ids[keep]
+        order = np.lexsort((ids, -hybrid))[:limit]
+        return [(int(positions[i]), float(hybrid[i]), 0) for i in order]
+
+    def listed(self, table, limit, after=None):
+        """Rows in id order: (position, None, 0)"""
+        start = int(np.searchsorted(self.array(table, 'id'), after[2], side='right')) if after else 0
+        return [(position, None, 0) for position in range(start, min(start + limit, self.header['tables'][table]['rows']))]
+
+    def query(self, sql, params=()):
+        """Run a statistics query against the snapshot's totals and series"""
+        with self.lock:
+            return self.statistics.execute(sql, params).fetchall()
+
+    def stats(self):
+        return {
+            'path': os.path.abspath(self.path),
+            'created': self.header['created'],
+            'bytes': len(self.map),
+            'rows': {table: entry['rows'] for table, entry in self.header['tables'].items()},
+            'archive_chunks': self.header['archive']['rows'],
+            'embedding': self.embedding,
+            'cached_blocks': len(self.blocks),
+            'block_reads': self.block_reads
+        }
+
+    def close(self):
+        self.statistics.close()
+        try:
+            self.map.close()
+        except BufferError:
+            # Arrays still viewing the mapping keep it open until they are freed
+            pass
+
+
+def import_snapshot(memory, path, batch_size=SNAPSHOT_BLOCK_ROWS * 4):
+    """Load a snapshot into the configured store, which must be empty; returns the rows and chunks imported.
+
+    Rows are routed to their shard and get new ids there, as on a reshard;
+    index terms are recomputed from the text and archived entries keep
+    counting in the statistics.
+    """
+    snapshot = Snapshot(path)
+    try:
+        if snapshot.embedding != {'provider': memory.encoder.name, 'dim': memory.encoder.dim}:
+            raise ValueError(f"Snapshot embeddings come from {snapshot.embedding['provider']} "
+                             f"({snapshot.embedding['dim']} dimensions), the store uses {memory.encoder.name}")
+        for shard in memory.shards:
+            with shard.db.read() as conn:
+                if conn.execute('SELECT 1 FROM memory_totals WHERE total != 0 LIMIT 1').fetchone():
+                    raise ValueError(f'{shard.path} is not empty: snapshots are imported into an empty store')
+
+        counts = {}
+        for table in snapshot.header['tables']:
+            columns = memory.STORED_FIELDS[table] + memory.COPIED_COLUMNS
+            rows = snapshot.header['tables'][table]['rows']
+            for start in range(0, rows, batch_size):
+                positions = range(start, min(start + batch_size, rows))
+                values = {name: snapshot.values(table, name, positions)
+                          for name in columns if name not in ('embedding', 'embedding_pending')}
+                has_embedding = snapshot.array(table, 'has_embedding')[start:start + len(positions)]
+                vectors = snapshot.array(table, 'embedding')[start:start + len(positions)]
+                values['embedding'] = [vector.tobytes() if present else None
+                                       for vector, present in zip(vectors, has_embedding)]
+                # Rows without a usable embedding are left to the service's embedding pool
+                values['embedding_pending'] = [int(not present) for present in has_embedding]
+                by_shard = {}
+                for row in zip(*(values[name] for name in columns)):
+                    by_shard.setdefault(memory.shards.route(row[0]), []).append(row)
+                for shard, shard_rows in by_shard.items():
+                    with shard.db.write() as conn:
+                        memory.copy_rows(conn, table, columns, shard_rows)
+            counts[table] = rows
+
+        from memory_compaction import ARCHIVE_FIELDS, decode_entries, restore_archive_chunk
+        chunks = snapshot.header['archive']['rows']
+        for position in range(chunks):
+            source, day, payload = (snapshot.values('experiences_archive', name, [position])[0]
+                                    for name in ('source', 'day', 'payload'))
+            by_shard = {}
+            for entry in decode_entries(payload):
+                by_shard.setdefault(memory.shards.route(entry['objective']), []).append(
+                    {field: entry[field] for field in ARCHIVE_FIELDS})
+            for shard, entries in by_shard.items():
+                with shard.db.write() as conn:
+                    restore_archive_chunk(conn, source, day, entries)
+        counts['archive chunks'] = chunks
+        return counts
+    finally:
+        snapshot.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['export', 'import', 'info'])
+    parser.add_argument('path', help='snapshot file')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        snapshot = Snapshot(args.path)
+        print(json.dumps(snapshot.stats(), indent=2))
+        snapshot.close()
+        return
+    os.environ.setdefault('MEMORY_COMPACTION_INTERVAL', '0')
+    import memory
+    if args.command == 'export':
+        header = export_snapshot(memory, args.path)
+        counts = {table: entry['rows'] for table, entry in header['tables'].items()}
+        counts['archive chunks'] = header['archive']['rows']
+        print(', '.join(f'{count} {label}' for label, count in counts.items()) +
+              f' written to {args.path} ({os.path.getsize(args.path)} bytes)')
+    else:
+        try:
+            counts = import_snapshot(memory, args.path)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(', '.join(f'{count} {label}' for label, count in counts.items()) + f' imported from {args.path}')
+
+
+if __name__ == '__main__':
+    main()
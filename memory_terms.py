@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+
+# Bulk inserts leave their index terms to a background indexer; false indexes them in the insert transaction
+MEMORY_DEFERRED_TERMS = os.getenv('MEMORY_DEFERRED_TERMS', 'true').lower() == 'true'
+# Rows analysed and indexed per write transaction
+MEMORY_TERM_INDEX_BATCH = int(os.getenv('MEMORY_TERM_INDEX_BATCH', '2000'))
+# Seconds between scans for pending rows nobody announced (previous runs, other processes)
+MEMORY_TERM_INDEX_POLL_INTERVAL = float(os.getenv('MEMORY_TERM_INDEX_POLL_INTERVAL', '5'))
+RETRY_DELAY = 1.0
+
+
+class TermIndexer:
+    """Background term indexing of the rows bulk inserts stored with terms_pending = 1.
+
+    For each shard and table, a thread reads the texts of the next batch of
+    pending rows and analyses them outside any transaction. It then writes
+    their postings and term lists in one write transaction, only for the
+    rows still pending there, so a row deleted meanwhile (or indexed by
+    flush()) is skipped. Until then keyword retrieval does not see the rows;
+    lexical retrieval does, through the FTS index the insert maintained.
+    analyse(text) gives a row's term frequencies and index(conn, table, ids,
+    terms) stores them.
+    """
+
+    def __init__(self, shards, text_columns, analyse, index, batch_size=MEMORY_TERM_INDEX_BATCH,
+                 poll_interval=MEMORY_TERM_INDEX_POLL_INTERVAL):
+        self.shards = shards
+        self.text_columns = text_columns
+        self.analyse = analyse
+        self.index = index
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self.last_error = None
+        self.index_seconds = 0.0
+
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='memory-term-index', daemon=True)
+                    self.thread.start()
+        return self
+
+    def notify(self):
+        """Rows were committed with terms_pending = 1"""
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                with self.lock:
+                    self.failures += 1
+                    self.last_error = str(e)
+                time.sleep(RETRY_DELAY)
+
+    def index_batch(self, shard, table):
+        """Index the next batch of pending rows of table in shard; returns how many rows were pending in it"""
+        started = time.perf_counter()
+        columns, to_text = self.text_columns[table]
+        with shard.db.read() as conn:
+            rows = conn.execute(f'SELECT id, {columns} FROM {table} WHERE terms_pending = 1 ORDER BY id LIMIT ?',
+                                (self.batch_size,)).fetchall()
+        if not rows:
+            return 0
+        terms = {row[0]: self.analyse(to_text(*row[1:])) for row in rows}
+        with shard.db.write() as conn:
+            ids = [row[0] for row in conn.execute(
+                f'SELECT id FROM {table} WHERE id IN ({", ".join("?" * len(terms))}) AND terms_pending = 1', list(terms))]
+            self.index(conn, table, ids, [terms[row_id] for row_id in ids])
+            conn.executemany(f'UPDATE {table} SET terms_pending = 0 WHERE id = ?', [(row_id,) for row_id in ids])
+        with self.lock:
+            self.batches += 1
+            self.rows += len(ids)
+            self.index_seconds += time.perf_counter() - started
+        return len(rows)
+
+    def flush(self):
+        """Index every pending row now (also used before exporting a snapshot); returns the rows indexed"""
+        indexed = 0
+        for shard in self.shards:
+            for table in self.text_columns:
+                while True:
+                    count = self.index_batch(shard, table)
+                    indexed += count
+                    if count < self.batch_size:
+                        break
+        return indexed
+
+    def pending(self):
+        """Rows waiting for their index terms, per table"""
+        counts = {table: 0 for table in self.text_columns}
+        for shard in self.shards:
+            with shard.db.read() as conn:
+                for table in counts:
+                    counts[table] += conn.execute(f'SELECT COUNT(*) FROM {table} WHERE terms_pending = 1').fetchone()[0]
+        return counts
+
+    def stats(self):
+        pending = self.pending()
+        with self.lock:
+            return {
+                'batch_size': self.batch_size,
+                'pending': pending,
+                'batches': self.batches,
+                'rows_indexed': self.rows,
+                'failures': self.failures,
+                'last_error': self.last_error,
+                'rows_per_second': self.rows / self.index_seconds if self.index_seconds else 0
+            }
@@ -0,0 +1,73 @@
+"""Single-process deployment: every service blueprint mounted in one Flask app.
+
+The blueprints are mounted under the same public prefixes the API gateway
+exposes (/api/planning, /api/tools, /api/memory), so the frontend works
+unchanged. Cross-service calls made through service_client are dispatched
+in-process to the registered handlers instead of going through HTTP and JSON.
+
+Run with `python monolith.py`. To split the services back out, start the
+gateway (main.py) and the individual services as before; service_client then
+falls back to HTTP using the *_URL environment variables.
+"""
+import os
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+
+import service_client
+from static_assets import StaticAssetIndex
+
+MONOLITH_PORT = int(os.getenv('MONOLITH_PORT', '5000'))
+
+# Blueprints mounted per service, keyed by the gateway's public prefix
+SERVICE_PREFIXES = {
+    'planning-brain': '/api/planning',
+    'tools-manager': '/api/tools',
+    'memory-service': '/api/memory'
+}
+
+
+def create_app():
+    """Build the monolith app and switch cross-service calls to in-process dispatch"""
+    from planning import planning_bp
+    from simple_planning import simple_planning_bp
+    from advanced_planning import advanced_planning_bp
+    from self_correction import self_correction_bp
+    from tools import tools_bp
+    from memory import memory_bp
+
+    service_client.enable_in_process()
+
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'frontend_build'))
+    CORS(app)
+
+    blueprints = {
+        'planning-brain': [planning_bp, simple_planning_bp, advanced_planning_bp, self_correction_bp],
+        'tools-manager': [tools_bp],
+        'memory-service': [memory_bp]
+    }
+    for service_name, service_blueprints in blueprints.items():
+        for blueprint in service_blueprints:
+            app.register_blueprint(blueprint, url_prefix=SERVICE_PREFIXES[service_name])
+
+    static_assets = StaticAssetIndex(app.static_folder).build()
+
+    @app.route('/api/health')
+    def health_check():
+        """Health check endpoint"""
+        return jsonify({
+            'gateway': 'healthy',
+            'mode': 'monolith',
+            'services': {name: {'status': 'healthy', 'in_process': True} for name in SERVICE_PREFIXES}
+        })
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        result = static_assets.respond(path, request.headers)
+        return Response(result.body, status=result.status, headers=result.headers, direct_passthrough=True)
+
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run(host='0.0.0.0', port=MONOLITH_PORT)
@@ -0,0 +1,151 @@
+"""Offline reshard of the memory store into a new number of shards.
+
+Run while the memory service is stopped, with the current layout configured
+(MEMORY_DB_PATH, MEMORY_SHARDS), then restart the service with the new count:
+
+    MEMORY_SHARDS=1 python reshard_memory.py --shards 4
+
+Writes left in the write-behind queue logs are applied first. Every row and
+archived entry is then copied to the shard owning its objective or topic, in
+new files built next to the store; once their statistics match the old ones,
+the old files are moved to a backup directory and the new ones take their
+place. Rows get new ids from their new shard's id range.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+os.environ.setdefault('MEMORY_COMPACTION_INTERVAL', '0')
+
+import memory
+from memory_compaction import ARCHIVE_FIELDS, decode_entries, restore_archive_chunk
+from memory_shards import ShardSet, shard_path
+from write_queue import WriteQueue, QueueUnavailable
+
+SQLITE_SUFFIXES = ('', '-wal', '-shm')
+
+
+def drain_write_queues():
+    """Apply the writes still pending in each shard's queue log; fails if the service owns a log"""
+    for shard in memory.shards:
+        path = shard_path(memory.MEMORY_QUEUE_PATH, shard.index)
+        if not os.path.exists(path):
+            continue
+        try:
+            queue = WriteQueue('memory', path, shard.db, memory.prepare_queued, memory.apply_queued).open()
+        except QueueUnavailable as e:
+            sys.exit(f'{e}: stop the memory service first')
+        while queue.stats()['pending']:
+            if queue.failures:
+                sys.exit(f'Could not apply the queued writes of {path}: {queue.last_error}')
+            time.sleep(0.1)
+
+
+def copy_table(target, table, batch_size):
+    columns = memory.STORED_FIELDS[table] + memory.COPIED_COLUMNS
+    copied = 0
+    for shard in memory.shards:
+        last_id = 0
+        while True:
+            with shard.db.read() as conn:
+                rows = conn.execute(f'SELECT id, {", ".join(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?',
+                                    (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            by_shard = {}
+            for row in rows:
+                by_shard.setdefault(target.route(row[1]), []).append(row[1:])
+            for target_shard, shard_rows in by_shard.items():
+                with target_shard.db.write() as conn:
+                    memory.copy_rows(conn, table, columns, shard_rows)
+            copied += len(rows)
+    return copied
+
+
+def copy_archive(target):
+    """Split every archive chunk between the shards owning its entries; archived entries still count in the statistics"""
+    copied = 0
+    for shard in memory.shards:
+        with shard.db.read() as conn:
+            chunk_ids = [row[0] for row in conn.execute('SELECT id FROM experiences_archive ORDER BY id')]
+        for chunk_id in chunk_ids:
+            with shard.db.read() as conn:
+                source, day, payload = conn.execute(
+                    'SELECT source, day, payload FROM experiences_archive WHERE id = ?', (chunk_id,)).fetchone()
+            by_shard = {}
+            for entry in decode_entries(payload):
+                by_shard.setdefault(target.route(entry['objective']), []).append(entry)
+            for target_shard, entries in by_shard.items():
+                with target_shard.db.write() as conn:
+                    restore_archive_chunk(conn, source, day, [{field: entry[field] for field in ARCHIVE_FIELDS}
+                                                              for entry in entries])
+            copied += 1
+    return copied
+
+
+def statistics(shard_set):
+    """Summed memory_totals and memory_series of a layout, to check that nothing was lost"""
+    totals = {}
+    for shard in shard_set:
+        with shard.db.read() as conn:
+            for table in ('memory_totals', 'memory_series'):
+                for row in conn.execute(f'SELECT * FROM {table}'):
+                    key = (table,) + row[:-2]
+                    counts = totals.setdefault(key, [0, 0])
+                    counts[0] += row[-2]
+                    counts[1] += row[-1]
+    return {key: counts for key, counts in totals.items() if counts != [0, 0]}
+
+
+def move_files(paths, directory):
+    for path in paths:
+        for suffix in SQLITE_SUFFIXES:
+            if os.path.exists(path + suffix):
+                shutil.move(path + suffix, os.path.join(directory, os.path.basename(path + suffix)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, required=True, help='number of shards after the reshard')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows read and written per transaction')
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error('--shards must be at least 1')
+
+    started = time.perf_counter()
+    drain_write_queues()
+    directory = os.path.dirname(os.path.abspath(memory.MEMORY_DB_PATH))
+    name = os.path.basename(memory.MEMORY_DB_PATH)
+    staging = tempfile.mkdtemp(prefix='memory-reshard-', dir=directory)
+    target = ShardSet(os.path.join(staging, name), count=args.shards, workers=1).open(memory.MIGRATIONS,
+                                                                                     memory.STORED_FIELDS)
+    counts = {table: copy_table(target, table, args.batch_size) for table in memory.STORED_FIELDS}
+    counts['archive chunks'] = copy_archive(target)
+    if statistics(target) != statistics(memory.shards):
+        target.close()
+        sys.exit(f'Statistics of the resharded store differ from the current ones; it is left in {staging}')
+
+    target.close()
+    memory.shards.close()
+    backup = os.path.join(directory, f'memory-reshard-backup-{time.strftime("%Y%m%d-%H%M%S")}')
+    os.makedirs(backup)
+    move_files([shard.path for shard in memory.shards], backup)
+    for shard in memory.shards:
+        queue_path = shard_path(memory.MEMORY_QUEUE_PATH, shard.index)
+        if os.path.exists(queue_path):
+            shutil.move(queue_path, os.path.join(backup, os.path.basename(queue_path)))
+    for shard in target:
+        move_files([shard.path], directory)
+    os.rmdir(staging)
+
+    print(', '.join(f'{count} {label}' for label, count in counts.items()) +
+          f' copied into {args.shards} shard(s) in {time.perf_counter() - started:.1f}s')
+    print(f'Previous files moved to {backup}; restart the memory service with MEMORY_SHARDS={args.shards}')
+
+
+if __name__ == '__main__':
+    main()
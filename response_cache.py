@@ -0,0 +1,152 @@
+import os
+import math
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from singleflight import identity_values
+
+# Gateway response cache configuration. TTLs are keyed by path prefix; the
+# longest matching prefix wins and unmatched routes are never cached.
+GATEWAY_CACHE_MAX_BYTES = int(os.getenv('GATEWAY_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+GATEWAY_CACHE_TTLS = json.loads(os.getenv('GATEWAY_CACHE_TTLS', json.dumps({
+    '/api/tools/list': 300,
+    '/api/memory/stats': 5,
+    '/api/health': 2
+})))
+# Writes passing through a prefix invalidate every cached entry under the listed prefixes
+GATEWAY_CACHE_INVALIDATIONS = json.loads(os.getenv('GATEWAY_CACHE_INVALIDATIONS', json.dumps({
+    '/api/memory/store/': ['/api/memory/']
+})))
+
+
+def cache_key(full_path, headers):
+    """Cache key of a GET: path with query string, plus a digest of the caller's credentials when it sends any.
+
+    The path stays the key's prefix, so invalidation by prefix covers every caller's entries.
+    """
+    identity = identity_values(headers)
+    if not any(identity):
+        return full_path
+    digest = hashlib.sha256(b''.join(b'\0' + value.encode('latin-1') for value in identity))
+    return f"{full_path} {digest.hexdigest()}"
+
+
+def make_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Evaluate an If-None-Match header against an entity tag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in candidates or f'W/{etag}' in candidates
+
+
+class CacheEntry:
+    def __init__(self, key, body, status, headers, ttl):
+        self.key = key
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.etag = make_etag(body)
+        self.expires_at = time.monotonic() + ttl
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers) + len(key)
+
+    def remaining_ttl(self):
+        return max(math.ceil(self.expires_at - time.monotonic()), 0)
+
+
+class ResponseCache:
+    """Memory-bounded LRU of idempotent GET responses with per-route TTLs and ETags"""
+
+    def __init__(self, max_bytes=GATEWAY_CACHE_MAX_BYTES, ttls=None, invalidations=None):
+        self.max_bytes = max_bytes
+        self.ttls = sorted((ttls if ttls is not None else GATEWAY_CACHE_TTLS).items(),
+                           key=lambda item: len(item[0]), reverse=True)
+        self.invalidations = invalidations if invalidations is not None else GATEWAY_CACHE_INVALIDATIONS
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+        self.not_modified = 0
+
+    def ttl_for(self, path):
+        """TTL in seconds for a request path, or None when the route is not cacheable"""
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return None
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, key, ttl, body, status, headers):
+        """Build an entry for a fresh response and keep it if it is a cacheable 200"""
+        entry = CacheEntry(key, body, status, headers, ttl)
+        if status != 200 or entry.size > self.max_bytes:
+            return entry
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self.entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def invalidate_prefix(self, prefix):
+        with self.lock:
+            stale = [key for key in self.entries if key.startswith(prefix)]
+            for key in stale:
+                self.bytes -= self.entries.pop(key).size
+            self.invalidated += len(stale)
+            return len(stale)
+
+    def invalidate_for_write(self, method, path):
+        """Drop cached reads made stale by a write passing through the gateway"""
+        if method in ('GET', 'HEAD', 'OPTIONS'):
+            return 0
+        dropped = 0
+        for write_prefix, read_prefixes in self.invalidations.items():
+            if path.startswith(write_prefix):
+                for read_prefix in read_prefixes:
+                    dropped += self.invalidate_prefix(read_prefix)
+        return dropped
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+                'invalidated': self.invalidated,
+                'ttls': dict(self.ttls)
+            }
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-import requests
+import service_client
 import json
 import os
 from datetime import datetime
@@ -98,12 +98,13 @@ def evaluate_result():
             "plan": plan,
             "actions": actions_taken,
             "results": f"Score: {evaluation_data.get('quality_score', 0)}/100. {evaluation_data.get('reasoning', '')}",
-            "success": evaluation_data.get('success', False)
+            "success": evaluation_data.get('success', False),
+            "source": "self-evaluation"
         }
         
         try:
-            requests.post(
-                'http://localhost:5003/api/store/experience',
+            service_client.post(
+                'memory-service', '/api/store/experience',
                 json=memory_data,
                 timeout=10
             )
@@ -213,12 +214,13 @@ def generate_correction():
             "plan": json.dumps(correction_data.get('corrected_plan', {})),
             "actions": ["Analyse des erreurs", "Génération de corrections"],
             "results": f"Plan corrigé généré. Changements: {', '.join(correction_data.get('changes_made', []))}",
-            "success": True
+            "success": True,
+            "source": "self-correction"
         }
         
         try:
-            requests.post(
-                'http://localhost:5003/api/store/experience',
+            service_client.post(
+                'memory-service', '/api/store/experience',
                 json=memory_data,
                 timeout=10
             )
@@ -244,9 +246,10 @@ def learn_from_experience():
         
         # Retrieve similar experiences from memory
         try:
-            memory_response = requests.post(
-                'http://localhost:5003/api/retrieve/experiences',
-                json={'query': task_type, 'limit': limit},
+            memory_response = service_client.post(
+                'memory-service', '/api/retrieve/experiences',
+                json={'query': task_type, 'limit': limit, 'mode': 'hybrid',
+                      'fields': ['objective', 'plan', 'actions', 'results', 'success']},
                 timeout=10
             )
             experiences = memory_response.json().get('experiences', [])
@@ -327,8 +330,8 @@ def learn_from_experience():
         }
         
         try:
-            requests.post(
-                'http://localhost:5003/api/store/knowledge',
+            service_client.post(
+                'memory-service', '/api/store/knowledge',
                 json=knowledge_data,
                 timeout=10
             )
@@ -368,9 +371,12 @@ def adaptive_retry():
         
         # Learn from similar failures
         try:
-            memory_response = requests.post(
-                'http://localhost:5003/api/retrieve/experiences',
-                json={'query': f"{original_objective} échec", 'limit': 5},
+            memory_response = service_client.post(
+                'memory-service', '/api/retrieve/experiences',
+                json={'query': f"{original_objective} échec", 'limit': 5, 'mode': 'hybrid',
+                      # Similar past failures are what the retry strategy learns from
+                      'weights': {'success': -0.15},
+                      'fields': ['objective', 'plan', 'results', 'success']},
                 timeout=10
             )
             similar_failures = memory_response.json().get('experiences', [])
@@ -0,0 +1,68 @@
+import os
+import json
+import requests
+
+# Base URLs of the microservices when they run as separate processes
+SERVICE_URLS = {
+    'planning-brain': os.getenv('PLANNING_BRAIN_URL', 'http://localhost:5001'),
+    'tools-manager': os.getenv('TOOLS_MANAGER_URL', 'http://localhost:5002'),
+    'memory-service': os.getenv('MEMORY_SERVICE_URL', 'http://localhost:5003')
+}
+
+# Plain functions registered as in-process handlers, keyed by (service, path)
+_local_handlers = {}
+_in_process = False
+
+# Keep-alive connections for cross-service calls in split deployments
+_session = requests.Session()
+
+
+def local_route(service_name, path):
+    """Register a function taking the JSON payload as a dict and returning (payload, status).
+
+    In monolith mode service calls to this endpoint run the function directly,
+    without a socket or JSON round trip.
+    """
+    def decorator(fn):
+        _local_handlers[(service_name, path)] = fn
+        return fn
+    return decorator
+
+
+def enable_in_process(enabled=True):
+    """Dispatch calls to registered handlers in-process instead of over HTTP"""
+    global _in_process
+    _in_process = enabled
+
+
+def in_process_enabled():
+    return _in_process
+
+
+class LocalResponse:
+    """Minimal stand-in for requests.Response returned by in-process calls"""
+
+    def __init__(self, payload, status_code):
+        self._payload = payload
+        self.status_code = status_code
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return self._payload
+
+    @property
+    def text(self):
+        return json.dumps(self._payload)
+
+
+def post(service_name, path, json=None, timeout=None):
+    """POST to another service, in-process when it is mounted in the same app"""
+    if _in_process:
+        handler = _local_handlers.get((service_name, path))
+        if handler is not None:
+            payload, status = handler(json if json is not None else {})
+            return LocalResponse(payload, status)
+    return _session.post(f"{SERVICE_URLS[service_name]}{path}", json=json, timeout=timeout)
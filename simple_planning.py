@@ -1,16 +1,12 @@
 from flask import Blueprint, request, jsonify
 import os
 import json
-import requests
+import service_client
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 
 simple_planning_bp = Blueprint('simple_planning', __name__)
 
-# Configuration
-TOOLS_MANAGER_URL = "http://localhost:5002"
-MEMORY_SERVICE_URL = "http://localhost:5003"
-
 @simple_planning_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -89,9 +85,10 @@ def create_simple_plan():
                 'objective': objective,
                 'plan': json.dumps(plan_json),
                 'results': 'Plan créé avec succès',
-                'success': True
+                'success': True,
+                'source': 'simple-planning'
             }
-            requests.post(f"{MEMORY_SERVICE_URL}/api/store/experience", 
+            service_client.post('memory-service', '/api/store/experience', 
                          json=memory_data, timeout=30)
         except Exception as memory_error:
             print(f"Erreur lors du stockage en mémoire: {memory_error}")
@@ -132,7 +129,7 @@ def execute_single_step():
             try:
                 if tool.lower() in ['recherche_web', 'web_search', 'search']:
                     # Recherche web basée sur la description
-                    response = requests.post(f"{TOOLS_MANAGER_URL}/api/search", 
+                    response = service_client.post('tools-manager', '/api/search', 
                                            json={'query': description}, timeout=30)
                     if response.status_code == 200:
                         tool_result['status'] = 'completed'
@@ -143,7 +140,7 @@ def execute_single_step():
                 
                 elif tool.lower() in ['generation_texte', 'text_generation']:
                     # Génération de texte
-                    response = requests.post(f"{TOOLS_MANAGER_URL}/api/generate/text", 
+                    response = service_client.post('tools-manager', '/api/generate/text', 
                                            json={'prompt': f"Aide pour: {description}"}, timeout=60)
                     if response.status_code == 200:
                         tool_result['status'] = 'completed'
@@ -183,7 +180,7 @@ def get_relevant_memory():
             return jsonify({'error': 'Query is required'}), 400
         
         # Récupérer les expériences
-        response = requests.post(f"{MEMORY_SERVICE_URL}/api/retrieve/experiences", 
+        response = service_client.post('memory-service', '/api/retrieve/experiences', 
                                json={'query': query, 'limit': 5}, timeout=30)
         
         if response.status_code == 200:
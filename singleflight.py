@@ -0,0 +1,131 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+
+# Request coalescing is opt-in: routes listed here (by path prefix) are always
+# coalesced, and any request can opt in with the X-Gateway-Coalesce: 1 header
+GATEWAY_COALESCE_ROUTES = json.loads(os.getenv('GATEWAY_COALESCE_ROUTES', '[]'))
+COALESCE_HEADER = 'X-Gateway-Coalesce'
+
+# Request headers that change who is asking, so they are part of the coalescing key
+IDENTITY_HEADERS = ('authorization', 'cookie')
+
+
+def coalescing_requested(path, headers, routes=None):
+    """True when a request opted into coalescing via configuration or header"""
+    if headers.get(COALESCE_HEADER, '').lower() in ('1', 'true', 'yes'):
+        return True
+    return any(path.startswith(prefix) for prefix in (routes if routes is not None else GATEWAY_COALESCE_ROUTES))
+
+
+def identity_values(headers):
+    """Values of the identity headers, matched case-insensitively (headers may be a plain dict)"""
+    lowered = {key.lower(): value for key, value in headers.items()}
+    return [lowered.get(name) or '' for name in IDENTITY_HEADERS]
+
+
+def coalescing_key(method, full_path, body, headers):
+    """Identical calls share method, path with query string, body hash and caller identity"""
+    digest = hashlib.sha256(body or b'')
+    for value in identity_values(headers):
+        digest.update(b'\0' + value.encode('latin-1'))
+    return f"{method} {full_path} {digest.hexdigest()}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Let concurrent callers with the same key share a single execution of a function"""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.followers += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self.lock:
+            total = self.executed + self.shared
+            return {
+                'upstream_calls': self.executed,
+                'calls_saved': self.shared,
+                'in_flight': len(self.calls),
+                'saved_ratio': self.shared / total if total else 0
+            }
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the ASGI gateway"""
+
+    def __init__(self):
+        self.calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        future = self.calls.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = self.calls[key] = asyncio.get_running_loop().create_future()
+        self.executed += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self.calls[key]
+
+    def stats(self):
+        total = self.executed + self.shared
+        return {
+            'upstream_calls': self.executed,
+            'calls_saved': self.shared,
+            'in_flight': len(self.calls),
+            'saved_ratio': self.shared / total if total else 0
+        }
@@ -0,0 +1,59 @@
+"""Local stand-in for a planning/tools/memory replica, used to exercise gateway routing.
+
+Start a few replicas and point the gateway at them, for example:
+
+    python stand_in_upstream.py --port 6001 --latency 0.05 &
+    python stand_in_upstream.py --port 6002 --latency 0.20 &
+    python stand_in_upstream.py --port 6003 --fail-rate 1.0 &
+    PLANNING_BRAIN_REPLICAS=http://localhost:6001,http://localhost:6002,http://localhost:6003 python main.py
+
+Every request is answered with a small JSON document naming the replica, so the
+distribution of traffic is visible from the client side and in /api/gateway/pools.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(name, latency, fail_rate):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            time.sleep(latency)
+            if self.path != '/api/health' and random.random() < fail_rate:
+                status, payload = 503, {'error': f'{name} simulated failure'}
+            else:
+                status, payload = 200, {'status': 'healthy', 'service': name, 'path': self.path,
+                                        'bytes_received': len(body)}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stand-in upstream replica for gateway load tests')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--name', default=None, help='Replica name reported in responses')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of non-health requests answered with 503')
+    args = parser.parse_args()
+
+    name = args.name or f'stand-in-{args.port}'
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(name, args.latency, args.fail_rate))
+    print(f'{name} listening on http://127.0.0.1:{args.port}')
+    server.serve_forever()
@@ -0,0 +1,247 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always produced
+    brotli = None
+
+# Static asset engine configuration
+FRONTEND_BUILD_DIR = os.path.join(os.path.dirname(__file__), 'frontend_build')
+GATEWAY_STATIC_MAX_FILE_BYTES = int(os.getenv('GATEWAY_STATIC_MAX_FILE_BYTES', str(4 * 1024 * 1024)))
+GATEWAY_STATIC_MEMORY_BYTES = int(os.getenv('GATEWAY_STATIC_MEMORY_BYTES', str(64 * 1024 * 1024)))
+GATEWAY_STATIC_COMPRESS_MIN_BYTES = 1024
+# Vite emits content-hashed file names under assets/, so they never change in place
+IMMUTABLE_PREFIXES = ('assets/',)
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class StaticAsset:
+    """One file of the frontend build with its precomputed representations"""
+
+    def __init__(self, relative_path, full_path, max_file_bytes):
+        stat = os.stat(full_path)
+        self.relative_path = relative_path
+        self.full_path = full_path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        if relative_path.startswith(IMMUTABLE_PREFIXES):
+            self.cache_control = 'public, max-age=31536000, immutable'
+        else:
+            self.cache_control = 'no-cache'
+
+        digest = hashlib.sha256()
+        with open(full_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        self.hash = digest.hexdigest()[:20]
+        self.etag = f'"{self.hash}"'
+
+        self.data = None
+        self.encodings = {}
+        if self.size <= max_file_bytes:
+            with open(full_path, 'rb') as f:
+                self.data = f.read()
+            if self.size >= GATEWAY_STATIC_COMPRESS_MIN_BYTES and self.content_type.startswith(COMPRESSIBLE_TYPES):
+                self._precompress()
+
+    def _precompress(self):
+        candidates = {'gzip': gzip.compress(self.data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(self.data, quality=11)
+        for encoding, body in candidates.items():
+            # Only keep variants that save at least 10%
+            if len(body) < self.size * 0.9:
+                self.encodings[encoding] = body
+
+    @property
+    def memory_bytes(self):
+        return (len(self.data) if self.data is not None else 0) + sum(len(b) for b in self.encodings.values())
+
+    def all_etags(self):
+        return [self.etag] + [f'"{self.hash}-{encoding}"' for encoding in self.encodings]
+
+    def evict(self):
+        """Drop in-memory copies; the file is then streamed from disk"""
+        self.data = None
+        self.encodings = {}
+
+    def iter_file(self, start, length):
+        with open(self.full_path, 'rb') as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class StaticResponse:
+    def __init__(self, status, headers, body=b''):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+def preferred_encoding(accept_encoding, available):
+    """Pick br over gzip when both the client and the asset support them"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.strip().startswith('q='):
+                try:
+                    quality = float(param.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def parse_range(range_header, size):
+    """Resolve a single byte range to (start, end) inclusive; None if absent/unsupported, False if unsatisfiable"""
+    match = RANGE_PATTERN.match((range_header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class StaticAssetIndex:
+    """In-memory index of the frontend build serving compressed, conditional and range requests"""
+
+    def __init__(self, root, fallback='index.html', max_file_bytes=GATEWAY_STATIC_MAX_FILE_BYTES,
+                 memory_budget=GATEWAY_STATIC_MEMORY_BYTES):
+        self.root = os.path.realpath(root)
+        self.fallback = fallback
+        self.max_file_bytes = max_file_bytes
+        self.memory_budget = memory_budget
+        self.assets = {}
+        self.memory_bytes = 0
+
+    def build(self):
+        """Index every file under root, precompressing and loading the smallest files first"""
+        assets = {}
+        if os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    full_path = os.path.join(directory, name)
+                    relative_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                    assets[relative_path] = StaticAsset(relative_path, full_path, self.max_file_bytes)
+
+        memory_bytes = 0
+        for asset in sorted(assets.values(), key=lambda a: a.size):
+            if memory_bytes + asset.memory_bytes > self.memory_budget:
+                asset.evict()
+            memory_bytes += asset.memory_bytes
+        self.assets = assets
+        self.memory_bytes = memory_bytes
+        return self
+
+    def lookup(self, path):
+        asset = self.assets.get(path.lstrip('/'))
+        if asset is None:
+            asset = self.assets.get(self.fallback)
+        return asset
+
+    def respond(self, path, headers):
+        """Build the response for a GET/HEAD of path given the request headers"""
+        asset = self.lookup(path)
+        if asset is None:
+            return StaticResponse(404, [('Content-Type', 'text/plain')], b'Not Found')
+
+        common = [
+            ('Cache-Control', asset.cache_control),
+            ('Last-Modified', asset.last_modified),
+            ('Accept-Ranges', 'bytes'),
+            ('Vary', 'Accept-Encoding')
+        ]
+
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            if '*' in tags or any(etag in tags or f'W/{etag}' in tags for etag in asset.all_etags()):
+                return StaticResponse(304, common + [('ETag', asset.etag)])
+        elif headers.get('If-Modified-Since'):
+            try:
+                if int(parsedate_to_datetime(headers['If-Modified-Since']).timestamp()) >= asset.mtime:
+                    return StaticResponse(304, common + [('ETag', asset.etag)])
+            except (TypeError, ValueError):
+                pass
+
+        range_header = headers.get('Range')
+        if range_header and headers.get('If-Range') not in (None, asset.etag, asset.last_modified):
+            range_header = None
+        byte_range = parse_range(range_header, asset.size) if range_header else None
+        if byte_range is False:
+            return StaticResponse(416, common + [('Content-Range', f'bytes */{asset.size}')])
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            body = asset.data[start:end + 1] if asset.data is not None else asset.iter_file(start, length)
+            return StaticResponse(206, common + [
+                ('Content-Type', asset.content_type),
+                ('Content-Length', str(length)),
+                ('Content-Range', f'bytes {start}-{end}/{asset.size}'),
+                ('ETag', asset.etag)
+            ], body)
+
+        encoding = preferred_encoding(headers.get('Accept-Encoding'), asset.encodings)
+        if encoding:
+            body = asset.encodings[encoding]
+            return StaticResponse(200, common + [
+                ('Content-Type', asset.content_type),
+                ('Content-Encoding', encoding),
+                ('Content-Length', str(len(body))),
+                ('ETag', f'"{asset.hash}-{encoding}"')
+            ], body)
+
+        body = asset.data if asset.data is not None else asset.iter_file(0, asset.size)
+        return StaticResponse(200, common + [
+            ('Content-Type', asset.content_type),
+            ('Content-Length', str(asset.size)),
+            ('ETag', asset.etag)
+        ], body)
+
+    def stats(self):
+        return {
+            'files': len(self.assets),
+            'memory_bytes': self.memory_bytes,
+            'memory_budget': self.memory_budget,
+            'in_memory': sum(1 for a in self.assets.values() if a.data is not None),
+            'precompressed': {
+                encoding: sum(1 for a in self.assets.values() if encoding in a.encodings)
+                for encoding in ('gzip', 'br')
+            }
+        }
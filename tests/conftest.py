@@ -0,0 +1,25 @@
+import os
+import sys
+import shutil
+import tempfile
+
+# The services are flat modules at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# memory reads its configuration and opens its store on import: point it at a throwaway two-shard store,
+# storing and embedding synchronously, without background compaction or queue fsyncs
+DATA_DIR = tempfile.mkdtemp(prefix='memory-tests-')
+os.environ.update({
+    'MEMORY_DB_PATH': os.path.join(DATA_DIR, 'memory.db'),
+    'MEMORY_SHARDS': '2',
+    'MEMORY_WRITE_BEHIND': 'false',
+    'MEMORY_EMBEDDING_PROVIDER': 'hashing',
+    'MEMORY_EMBEDDING_WORKERS': '0',
+    'MEMORY_COMPACTION_INTERVAL': '0',
+    'MEMORY_QUEUE_FSYNC': 'false'
+})
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
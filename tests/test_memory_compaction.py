@@ -0,0 +1,78 @@
+import memory
+import memory_compaction
+from memory_compaction import decode_entries
+
+
+def store_aged(source, count, days):
+    """Store count experiences of source and backdate them by days; returns their ids"""
+    results = memory.bulk_store('experiences', memory.EXPERIENCE_FIELDS, enumerate(
+        {'objective': f'Relever la station {source} {i} vieille de {days} jours', 'success': i % 3 == 0, 'source': source}
+        for i in range(count)), memory.experience_row)
+    ids = [result['id'] for result in results]
+    for shard in memory.shards:
+        with shard.db.write() as conn:
+            conn.execute(f"UPDATE experiences SET timestamp = datetime('now', ?) "
+                         f"WHERE id IN ({', '.join('?' * len(ids))})", [f'-{days} days'] + ids)
+    return ids
+
+
+def source_totals(source):
+    totals = [0, 0]
+    for shard in memory.shards:
+        with shard.db.read() as conn:
+            row = conn.execute("SELECT total, successful FROM memory_totals WHERE kind = 'experiences' AND source = ?",
+                               (source,)).fetchone()
+        if row:
+            totals = [totals[0] + row[0], totals[1] + row[1]]
+    return totals
+
+
+def stored_ids(source):
+    ids = []
+    for shard in memory.shards:
+        with shard.db.read() as conn:
+            ids.extend(row[0] for row in conn.execute('SELECT id FROM experiences WHERE source = ?', (source,)))
+    return sorted(ids)
+
+
+def archived_ids(source):
+    ids = []
+    for shard in memory.shards:
+        with shard.db.read() as conn:
+            for (payload,) in conn.execute('SELECT payload FROM experiences_archive WHERE source = ?', (source,)):
+                ids.extend(entry['id'] for entry in decode_entries(payload))
+    return sorted(ids)
+
+
+def test_rollup_archives_old_experiences_and_keeps_their_statistics(monkeypatch):
+    monkeypatch.setitem(memory_compaction.RETENTION_POLICIES, 'rollup-test', {'rollup_after_days': 30, 'ttl_days': None})
+    old = store_aged('rollup-test', 12, 60)
+    recent = store_aged('rollup-test', 3, 1)
+    unlisted = store_aged('unlisted-test', 4, 400)
+    totals = source_totals('rollup-test')
+
+    reports = [shard.compactor.run() for shard in memory.shards]
+
+    assert sum(report['rolled_up'] for report in reports) == len(old)
+    assert stored_ids('rollup-test') == sorted(recent)
+    assert archived_ids('rollup-test') == sorted(old)
+    assert source_totals('rollup-test') == totals
+    # Sources without a policy are kept as they are
+    assert stored_ids('unlisted-test') == sorted(unlisted)
+    assert archived_ids('unlisted-test') == []
+
+    payload, status = memory.find_records('experiences', {'query': 'station rollup', 'limit': 100, 'fields': ['id']})
+    assert status == 200
+    assert {result['id'] for result in payload['experiences']} & set(old + recent) == set(recent)
+
+
+def test_ttl_expiry_subtracts_from_the_statistics(monkeypatch):
+    monkeypatch.setitem(memory_compaction.RETENTION_POLICIES, 'ttl-test', {'rollup_after_days': None, 'ttl_days': 30})
+    store_aged('ttl-test', 5, 60)
+    kept = store_aged('ttl-test', 2, 1)
+
+    for shard in memory.shards:
+        shard.compactor.run()
+
+    assert stored_ids('ttl-test') == sorted(kept)
+    assert source_totals('ttl-test')[0] == len(kept)
@@ -0,0 +1,65 @@
+import pytest
+import memory
+
+OBJECTIVES = [f'Calibrer le capteur zephyrin numéro {i}' for i in range(23)]
+
+
+@pytest.fixture(scope='module')
+def stored():
+    results = memory.bulk_store('experiences', memory.EXPERIENCE_FIELDS,
+                                enumerate({'objective': objective, 'results': 'zephyrin calibré', 'success': True}
+                                          for objective in OBJECTIVES), memory.experience_row)
+    if memory.term_indexer is not None:
+        memory.term_indexer.flush()
+    return {result['id']: objective for result, objective in zip(results, OBJECTIVES)}
+
+
+def all_pages(data):
+    pages, cursor = [], None
+    while True:
+        payload, status = memory.find_records('experiences', {**data, 'cursor': cursor} if cursor else data)
+        assert status == 200, payload
+        pages.append(payload['experiences'])
+        cursor = payload['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_rows_are_spread_over_the_shards(stored):
+    owners = {memory.shards.route(objective).index for objective in stored.values()}
+    assert owners == {0, 1}
+    for row_id, objective in stored.items():
+        with memory.shards.route(objective).db.read() as conn:
+            assert conn.execute('SELECT objective FROM experiences WHERE id = ?', (row_id,)).fetchone() == (objective,)
+
+
+@pytest.mark.parametrize('mode', ['lexical', 'keyword', 'semantic', 'hybrid'])
+def test_cursor_pages_cover_every_match_once(stored, mode):
+    pages = all_pages({'query': 'zephyrin', 'mode': mode, 'limit': 5, 'fields': 'id,objective,score'})
+    ids = [result['id'] for page in pages for result in page]
+    assert all(len(page) <= 5 for page in pages)
+    assert len(ids) == len(set(ids))
+    if mode in ('semantic', 'hybrid'):
+        # Every stored row is a semantic match; ours are among them
+        assert set(stored) <= set(ids)
+    else:
+        assert set(ids) == set(stored)
+        assert len(pages) == 5
+        # Pages continue the ranking: scores never increase across a page boundary
+        scores = [result['score'] for page in pages for result in page]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_listing_pages_walk_the_store_in_id_order(stored):
+    pages = all_pages({'limit': 7, 'fields': ['id']})
+    ids = [result['id'] for page in pages for result in page]
+    assert ids == sorted(ids)
+    assert set(stored) <= set(ids)
+
+
+def test_cursor_of_another_query_is_rejected(stored):
+    payload, _ = memory.find_records('experiences', {'query': 'zephyrin', 'limit': 5})
+    payload, status = memory.find_records('experiences', {'query': 'capteur', 'limit': 5,
+                                                          'cursor': payload['next_cursor']})
+    assert status == 400
+    assert payload['error'] == 'Cursor belongs to another query or mode'
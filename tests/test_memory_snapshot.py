@@ -0,0 +1,87 @@
+import types
+import pytest
+import memory
+from memory import STORED_FIELDS
+from memory_shards import ShardSet
+from memory_snapshot import Snapshot, export_snapshot, import_snapshot
+
+EXPERIENCES = [{'objective': f'Indexer les archives du projet glacier {i}', 'plan': 'trier puis indexer',
+                'results': 'archives indexées', 'success': i % 2 == 0, 'source': 'snapshot-test'} for i in range(12)]
+KNOWLEDGE = [{'topic': f'Glacier {i}', 'content': f'Le glacier numéro {i} recule chaque année',
+              'source': 'snapshot-test'} for i in range(5)]
+
+
+def store_rows(shards, table, columns):
+    rows = []
+    for shard in shards:
+        with shard.db.read() as conn:
+            rows.extend(conn.execute(f'SELECT {columns} FROM {table}'))
+    return sorted(rows)
+
+
+def store_totals(shards):
+    totals = {}
+    for shard in shards:
+        with shard.db.read() as conn:
+            for kind, source, total, successful in conn.execute('SELECT * FROM memory_totals WHERE total != 0'):
+                counts = totals.setdefault((kind, source), [0, 0])
+                counts[0] += total
+                counts[1] += successful
+    return totals
+
+
+def store_contents(shards):
+    """Stored fields, content hashes, counts, embeddings and index terms of every row, and the statistics"""
+    contents = {'totals': store_totals(shards)}
+    for table, fields in STORED_FIELDS.items():
+        contents[table] = store_rows(shards, table, ', '.join(fields + ('content_hash', 'occurrences', 'embedding')))
+        contents[f'{table}_doc_terms'] = store_rows(shards, f'{table}_doc_terms', 'terms')
+    return contents
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    """Path of a snapshot of the test store, and the store's contents when it was taken"""
+    memory.bulk_store('experiences', memory.EXPERIENCE_FIELDS, enumerate(EXPERIENCES), memory.experience_row)
+    memory.bulk_store('knowledge', memory.KNOWLEDGE_FIELDS, enumerate(KNOWLEDGE), memory.knowledge_row)
+    path = str(tmp_path_factory.mktemp('snapshot') / 'memory.snap')
+    export_snapshot(memory, path)
+    return path, store_contents(memory.shards)
+
+
+def test_export_indexes_pending_terms_and_matches_the_store(exported):
+    path, contents = exported
+    snapshot = Snapshot(path)
+    try:
+        for table in STORED_FIELDS:
+            assert snapshot.header['tables'][table]['rows'] == len(contents[table])
+        payload, _ = memory.find_records('experiences', {'query': 'glacier', 'mode': 'keyword', 'limit': 100,
+                                                         'fields': ['id']})
+        positions = [position for position, _, _ in snapshot.keyword_matches('experiences', 'glacier', 100)]
+        assert sorted(snapshot.values('experiences', 'id', positions)) == sorted(
+            result['id'] for result in payload['experiences'])
+        assert len(positions) == len(EXPERIENCES)
+    finally:
+        snapshot.close()
+
+
+def test_import_restores_the_exported_store(exported, tmp_path):
+    path, contents = exported
+    target = types.SimpleNamespace(
+        encoder=memory.encoder,
+        shards=ShardSet(str(tmp_path / 'restored.db'), count=3, vector_indexes=dict).open(memory.MIGRATIONS,
+                                                                                            memory.STORED_FIELDS),
+        STORED_FIELDS=memory.STORED_FIELDS,
+        COPIED_COLUMNS=memory.COPIED_COLUMNS,
+        copy_rows=memory.copy_rows
+    )
+    try:
+        counts = import_snapshot(target, path)
+        assert {table: counts[table] for table in STORED_FIELDS} == {table: len(contents[table]) for table in STORED_FIELDS}
+        # Rows get new ids in their new shards; everything else, index terms included, comes back
+        assert store_contents(target.shards) == contents
+
+        with pytest.raises(ValueError, match='not empty'):
+            import_snapshot(target, path)
+    finally:
+        target.shards.close()
@@ -0,0 +1,113 @@
+import time
+import sqlite3
+import pytest
+import write_queue
+from memory_db import ConnectionManager
+from write_queue import WriteQueue, QueueUnavailable, read_log
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(write_queue, 'RETRY_DELAY', 0.01)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ConnectionManager(str(tmp_path / 'queue.db'))
+    with db.write() as conn:
+        conn.execute('CREATE TABLE write_queue_checkpoint (name TEXT PRIMARY KEY, applied_seq INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE notes (seq INTEGER NOT NULL, text TEXT NOT NULL)')
+    yield db
+    db.close()
+
+
+def apply_notes(conn, prepared):
+    conn.executemany('INSERT INTO notes (seq, text) VALUES (?, ?)', prepared)
+
+
+def notes_queue(db, path, prepare, **options):
+    return WriteQueue('notes', path, db, prepare, apply_notes, fsync=False, **options).open()
+
+
+def prepare_notes(records):
+    return [(record['seq'], record['data']['text']) for record in records], 0
+
+
+def stored_notes(db):
+    with db.read() as conn:
+        return conn.execute('SELECT seq, text FROM notes ORDER BY seq').fetchall()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def crash(queue):
+    """Abandon a queue as a killed process would: its log is closed (releasing the lock) and nothing else runs"""
+    queue.log.close()
+
+
+def test_crash_replays_unapplied_writes_once(db, tmp_path):
+    path = str(tmp_path / 'notes.log')
+    stuck = {4, 5}
+
+    def prepare(records):
+        if any(record['seq'] in stuck for record in records):
+            raise sqlite3.OperationalError('disk I/O error')
+        return prepare_notes(records)
+
+    queue = notes_queue(db, path, prepare)
+    for i in range(1, 6):
+        queue.enqueue('note', {'text': f'note {i}'})
+    wait_for(lambda: queue.stats()['applied'] == 3)
+    crash(queue)
+    # A torn append at the moment of the crash
+    with open(path, 'ab') as f:
+        f.write(write_queue.frame({'seq': 6, 'kind': 'note', 'data': {'text': 'torn'}})[:-3])
+
+    replayed = notes_queue(db, path, prepare_notes)
+    wait_for(lambda: replayed.stats()['pending'] == 0)
+    assert stored_notes(db) == [(i, f'note {i}') for i in range(1, 6)]
+    assert replayed.stats()['applied'] == 2
+    # The torn record is dropped and numbering continues after the last intact one
+    assert replayed.enqueue('note', {'text': 'after'}) == 6
+
+
+def test_poison_record_is_dead_lettered(db, tmp_path):
+    path = str(tmp_path / 'notes.log')
+
+    def prepare(records):
+        if any(record['data'].get('poison') for record in records):
+            raise ValueError('cannot apply')
+        return prepare_notes(records)
+
+    queue = notes_queue(db, path, prepare, max_attempts=2)
+    queue.enqueue('note', {'text': 'before'})
+    poison = queue.enqueue('note', {'text': 'poison', 'poison': True})
+    last = queue.enqueue('note', {'text': 'after'})
+    wait_for(lambda: queue.stats()['pending'] == 0)
+
+    assert [text for _, text in stored_notes(db)] == ['before', 'after']
+    assert queue.stats()['dead_lettered'] == 1
+    dead, _ = read_log(queue.dead_letter_path)
+    assert [(record['seq'], record['error']) for record in dead] == [(poison, 'cannot apply')]
+    with db.read() as conn:
+        assert conn.execute("SELECT applied_seq FROM write_queue_checkpoint WHERE name = 'notes'").fetchone()[0] == last
+
+
+def test_log_owned_by_another_queue_is_unavailable(db, tmp_path):
+    path = str(tmp_path / 'notes.log')
+    notes_queue(db, path, prepare_notes)
+    if write_queue.fcntl is None:
+        pytest.skip('single-owner check needs fcntl')
+    with pytest.raises(QueueUnavailable):
+        notes_queue(db, path, prepare_notes)
+
+
+def test_unopenable_log_is_unavailable(db, tmp_path):
+    (tmp_path / 'file').write_text('')
+    with pytest.raises(QueueUnavailable):
+        notes_queue(db, str(tmp_path / 'file' / 'notes.log'), prepare_notes)
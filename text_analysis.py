@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+WORD_PATTERN = re.compile(r'\w+')
+# Terms shorter than this are not indexed
+MIN_TERM_LENGTH = 3
+
+# Stop words, written without accents since they are compared after folding
+FRENCH_STOP_WORDS = set('''
+    alors au aucun aussi autre aux avec avoir bon car ce cela ces cet cette ceci ceux chaque ci comme comment dans des
+    donc dont du elle elles en encore entre est et etaient etait etant ete etre eu fait faire fois ici il ils je juste la
+    le les leur leurs lui ma mais me meme mes moi mon ne ni nos notre nous on ont ou par parce pas peu peut plus pour
+    pourquoi quand que quel quelle quelles quels qui sa sans se ses seulement si sien son sont sous soyez sur ta tandis
+    te tes toi ton tous tout toute toutes tres tu un une vos votre vous vu ca sera seront avait
+'''.split())
+ENGLISH_STOP_WORDS = set('''
+    about above after again against all also and any are because been before being below between both but can could
+    did does doing down during each few for from further had has have having her here hers herself him himself his how
+    into its itself just more most not now off once only other our ours out over own same she should some such than
+    that the their theirs them then there these they this those through too under until very was were what when where
+    which while who whom why will with would you your yours
+'''.split())
+STOP_WORDS = FRENCH_STOP_WORDS | ENGLISH_STOP_WORDS
+
+# Light stemming: the plural mark, then the longest matching suffix, is stripped as long as MIN_STEM_LENGTH
+# characters remain. It only has to conflate inflections ("plans", "planning", "planification"), not find roots.
+MIN_STEM_LENGTH = 3
+SUFFIXES = sorted('''
+    ation ement ment ateur atrice ance ence ite ive euse eur able ible ique isme iste
+    ing edly ed ly ness er ez ait aient ion ant ante
+'''.split(), key=len, reverse=True)
+VOWELS = set('aeiouy')
+# Distinct words whose index term is remembered; vocabularies are small next to the text they index
+TERM_CACHE_SIZE = 65536
+
+
+def fold(text):
+    """Lowercase and strip accents so French spellings with and without diacritics match"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(word):
+    """Strip the plural mark and one inflectional or derivational suffix from a folded word"""
+    if word[-1] in 'sx' and not word.endswith('ss') and len(word) > MIN_STEM_LENGTH + 1:
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            word = word[:-len(suffix)]
+            # "planning" -> "plan"
+            if word[-1] == word[-2] and word[-1] not in VOWELS:
+                word = word[:-1]
+            break
+    # Silent or feminine final e: "analyse" / "analyser", "donnée" / "données"
+    if word.endswith('e') and len(word) > MIN_STEM_LENGTH:
+        word = word[:-1]
+    # "study" / "studies", "déployer" / "déploiement"
+    if word.endswith('y'):
+        word = word[:-1] + 'i'
+    return word
+
+
+@lru_cache(maxsize=TERM_CACHE_SIZE)
+def index_term(word):
+    """Stemmed index term of a folded word, or None for short words and stop words"""
+    if len(word) < MIN_TERM_LENGTH or word in STOP_WORDS:
+        return None
+    return stem(word)
+
+
+@lru_cache(maxsize=TERM_CACHE_SIZE)
+def chunk_terms(chunk):
+    """Index terms of a whitespace-free piece of text; folding is per character, so pieces fold independently"""
+    terms = map(index_term, WORD_PATTERN.findall(fold(chunk)))
+    return tuple(term for term in terms if term is not None)
+
+
+def tokens(text):
+    """Index terms of a text in order: folded, stop words removed, stemmed"""
+    return [term for chunk in (text or '').split() for term in chunk_terms(chunk)]
+
+
+def term_frequencies(text):
+    """Term -> number of occurrences in text"""
+    return Counter(tokens(text))
@@ -4,6 +4,7 @@ import requests
 import os
 import tempfile
 from huggingface_hub import InferenceClient
+from service_client import local_route
 
 tools_bp = Blueprint('tools', __name__)
 
@@ -55,15 +56,14 @@ def list_tools():
     }
     return jsonify({'tools': tools})
 
-@tools_bp.route('/search', methods=['POST'])
-def web_search():
-    """Perform web search"""
+@local_route('tools-manager', '/api/search')
+def perform_web_search(data):
+    """Perform web search, returning (payload, status)"""
     try:
-        data = request.get_json()
         query = data.get('query', '')
         
         if not query:
-            return jsonify({'error': 'Query is required'}), 400
+            return {'error': 'Query is required'}, 400
         
         # Simulate web search (in real implementation, use Google Search API or similar)
         search_results = {
@@ -78,24 +78,29 @@ def web_search():
             'status': 'success'
         }
         
-        return jsonify(search_results)
+        return search_results, 200
         
     except Exception as e:
-        return jsonify({'error': f'Search failed: {str(e)}'}), 500
+        return {'error': f'Search failed: {str(e)}'}, 500
 
-@tools_bp.route('/execute', methods=['POST'])
-def execute_code():
-    """Execute code in a sandbox environment"""
+@tools_bp.route('/search', methods=['POST'])
+def web_search():
+    """Perform web search"""
+    payload, status = perform_web_search(request.get_json())
+    return jsonify(payload), status
+
+@local_route('tools-manager', '/api/execute')
+def run_code(data):
+    """Execute code in a sandbox environment, returning (payload, status)"""
     try:
-        data = request.get_json()
         code = data.get('code', '')
         language = data.get('language', 'python')
         
         if not code:
-            return jsonify({'error': 'Code is required'}), 400
+            return {'error': 'Code is required'}, 400
         
         if language != 'python':
-            return jsonify({'error': 'Only Python is supported currently'}), 400
+            return {'error': 'Only Python is supported currently'}, 400
         
         # Create a temporary file for the code
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
@@ -122,23 +127,28 @@ def execute_code():
             # Clean up temporary file
             os.unlink(temp_file)
         
-        return jsonify(execution_result)
+        return execution_result, 200
         
     except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Code execution timed out'}), 408
+        return {'error': 'Code execution timed out'}, 408
     except Exception as e:
-        return jsonify({'error': f'Execution failed: {str(e)}'}), 500
+        return {'error': f'Execution failed: {str(e)}'}, 500
 
-@tools_bp.route('/generate/text', methods=['POST'])
-def generate_text():
-    """Generate text using Hugging Face models"""
+@tools_bp.route('/execute', methods=['POST'])
+def execute_code():
+    """Execute code in a sandbox environment"""
+    payload, status = run_code(request.get_json())
+    return jsonify(payload), status
+
+@local_route('tools-manager', '/api/generate/text')
+def produce_text(data):
+    """Generate text using Hugging Face models, returning (payload, status)"""
     try:
-        data = request.get_json()
         prompt = data.get('prompt', '')
         model = data.get("model", "distilgpt2")
         
         if not prompt:
-            return jsonify({'error': 'Prompt is required'}), 400
+            return {'error': 'Prompt is required'}, 400
         
         # Always use simulated response for text generation due to API instability
         result = {
@@ -149,10 +159,16 @@ def generate_text():
             'note': 'Using simulated response for text generation due to Hugging Face API instability'
         }
         
-        return jsonify(result)
+        return result, 200
         
     except Exception as e:
-        return jsonify({'error': f'Text generation failed: {str(e)}'}), 500
+        return {'error': f'Text generation failed: {str(e)}'}, 500
+
+@tools_bp.route('/generate/text', methods=['POST'])
+def generate_text():
+    """Generate text using Hugging Face models"""
+    payload, status = produce_text(request.get_json())
+    return jsonify(payload), status
 
 @tools_bp.route('/generate/image', methods=['POST'])
 def generate_image():
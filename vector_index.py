@@ -0,0 +1,316 @@
+import os
+import threading
+import numpy as np
+
+# Approximate search kicks in once a store has this many vectors; below it exact search is fast enough
+MEMORY_ANN_MIN_ROWS = int(os.getenv('MEMORY_ANN_MIN_ROWS', '50000'))
+# Inverted lists scanned per query; higher means better recall and slower queries
+MEMORY_IVF_NPROBE = int(os.getenv('MEMORY_IVF_NPROBE', '32'))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+# How the index keeps vectors in RAM: 'none' (float32), 'int8' (a quarter of the size) or 'binary'
+# (one bit per dimension, a thirty-second); quantised searches are rescored from the stored float32 vectors
+MEMORY_VECTOR_QUANTIZATION = os.getenv('MEMORY_VECTOR_QUANTIZATION', 'none')
+# Results of a quantised first pass rescored exactly per result asked for; 0 picks the quantization's default.
+# Recall@10 measured with bench_vector_search.py (60k vectors, hashing encoder): int8 is 1.0 from 8 on;
+# binary is 0.30 at 8, 0.60 at 64, 0.81 at 256 and 0.91 at 512, but past 64 the service's rescoring
+# (vectors read from SQLite) costs more than an exact float32 search
+MEMORY_RESCORE_FACTOR = int(os.getenv('MEMORY_RESCORE_FACTOR', '0'))
+DEFAULT_RESCORE_FACTORS = {'none': None, 'int8': 8, 'binary': 64}
+QUANTIZATIONS = ('none', 'int8', 'binary')
+SCORE_CHUNK = 8192
+# int8 codes converted to float32 at a time: the block stays in the CPU cache, so the product reads a quarter of the bytes
+INT8_BLOCK = 512
+
+# Set bits of each byte value, for Hamming distances on numpy versions without bitwise_count
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def top_k(scores, k):
+    """Positions of the k highest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def ranked(scores, ids, k):
+    """Positions of the k highest scores, best first, ties broken by increasing id so rankings are stable"""
+    if k < len(scores):
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((ids[candidates], -scores[candidates]))[:k]]
+
+
+def quantize_int8(vectors):
+    """Symmetric int8 codes of each vector and its scale: vector ~ codes * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """Sign bit of each coordinate, packed eight to a byte and padded to whole 64-bit words"""
+    bits = np.packbits(vectors > 0, axis=1)
+    return np.pad(bits, ((0, 0), (0, -bits.shape[1] % 8)))
+
+
+def hamming(codes, query_bits):
+    """Bits differing between each row of binary codes and the query's"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(codes.view(np.uint64) ^ query_bits.view(np.uint64)).sum(axis=1, dtype=np.int32)
+    return POPCOUNT[codes ^ query_bits].sum(axis=1, dtype=np.int32)
+
+
+def rescore(ids, scores, query, k, after, load_vectors, factor):
+    """Top-k (ids, exact cosine scores) of a quantised first pass.
+
+    The factor * k best approximate scores are rescored with the float32
+    vectors load_vectors(ids) returns; the shortlist doubles while too few of
+    them rank after the cursor, so later pages reach deeper into the first pass.
+    """
+    shortlist = max(k, 1) * factor
+    while True:
+        best = top_k(scores, shortlist)
+        candidate_ids = ids[best]
+        exact = np.asarray(load_vectors(candidate_ids), dtype=np.float32) @ query
+        if after is not None:
+            keep = (exact < after[0]) | ((exact == after[0]) & (candidate_ids > after[1]))
+            candidate_ids, exact = candidate_ids[keep], exact[keep]
+        if len(exact) >= k or shortlist >= len(scores):
+            break
+        shortlist *= 2
+    order = ranked(exact, candidate_ids, k)
+    return candidate_ids[order], exact[order]
+
+
+class VectorIndex:
+    """In-memory cosine index over L2-normalised vectors keyed by row id.
+
+    Search is an exact matrix-vector product until the store reaches
+    ann_min_rows vectors. From then on an IVF index (spherical k-means
+    centroids, one inverted list per centroid) restricts each query to the
+    nprobe closest lists. Vectors added after the lists were built are kept in
+    an unlisted tail that is always scanned exactly, and the lists are rebuilt
+    once the tail grows past a tenth of the store.
+
+    With int8 or binary quantization only codes are kept: int8 scores are
+    dot products of the codes, converted a cache-sized block at a time, with
+    the float query times each vector's scale; binary ones are
+    1 - 2 * Hamming distance / dim between sign bits.
+    Searches given load_vectors rescore their shortlist exactly (see
+    rescore); without it they return the approximate scores.
+    """
+
+    def __init__(self, dim, ann_min_rows=MEMORY_ANN_MIN_ROWS, nprobe=MEMORY_IVF_NPROBE,
+                 quantization=MEMORY_VECTOR_QUANTIZATION, rescore_factor=MEMORY_RESCORE_FACTOR):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f'Unknown vector quantization: {quantization}')
+        self.dim = dim
+        self.ann_min_rows = ann_min_rows
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor or DEFAULT_RESCORE_FACTORS[quantization]
+        self.lock = threading.RLock()
+        self.size = 0
+        self.max_id = 0
+        # Background-embedding watermark of the store's last sync (see memory.sync_vector_index)
+        self.embedded_seq = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._codes = self._empty_codes(0)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._assignments = np.empty(0, dtype=np.int32)
+        self.centroids = None
+        self.trained_rows = 0
+        self.listed = 0
+        self.list_order = None
+        self.list_offsets = None
+
+    @property
+    def ids(self):
+        return self._ids[:self.size]
+
+    @property
+    def codes(self):
+        """Stored form of the vectors: float32, int8 codes or packed sign bits"""
+        return self._codes[:self.size]
+
+    def _empty_codes(self, capacity):
+        if self.quantization == 'int8':
+            return np.empty((capacity, self.dim), dtype=np.int8)
+        if self.quantization == 'binary':
+            return np.empty((capacity, (self.dim + 63) // 64 * 8), dtype=np.uint8)
+        return np.empty((capacity, self.dim), dtype=np.float32)
+
+    def _encode(self, vectors):
+        """(codes, scales) of float vectors in the index's quantization"""
+        if self.quantization == 'int8':
+            return quantize_int8(vectors)
+        if self.quantization == 'binary':
+            return quantize_binary(vectors), np.ones(len(vectors), dtype=np.float32)
+        return vectors, np.ones(len(vectors), dtype=np.float32)
+
+    def _decode(self, positions):
+        """Float approximations of the vectors at positions, for training and assigning the IVF lists"""
+        codes = self._codes[positions]
+        if self.quantization == 'int8':
+            return codes.astype(np.float32) * self._scales[positions][:, None]
+        if self.quantization == 'binary':
+            return (np.unpackbits(codes, axis=1, count=self.dim).astype(np.float32) * 2 - 1) / np.sqrt(self.dim)
+        return codes
+
+    def _scores(self, query, positions=None):
+        """Cosine scores, approximate when quantised, of the vectors at positions (all by default)"""
+        if self.quantization == 'none':
+            return (self.codes if positions is None else self._codes[positions]) @ query
+        count = self.size if positions is None else len(positions)
+        scores = np.empty(count, dtype=np.float32)
+        if self.quantization == 'binary':
+            query_bits = quantize_binary(query[None, :])[0]
+            for start in range(0, count, SCORE_CHUNK):
+                chunk = slice(start, min(start + SCORE_CHUNK, count)) if positions is None else positions[start:start + SCORE_CHUNK]
+                codes = self._codes[chunk]
+                scores[start:start + len(codes)] = 1 - 2 * hamming(codes, query_bits) / self.dim
+            return scores
+        block = np.empty((INT8_BLOCK, self.dim), dtype=np.float32)
+        for start in range(0, count, INT8_BLOCK):
+            chunk = slice(start, min(start + INT8_BLOCK, count)) if positions is None else positions[start:start + INT8_BLOCK]
+            codes = self._codes[chunk]
+            converted = block[:len(codes)]
+            np.copyto(converted, codes, casting='unsafe')
+            np.matmul(converted, query, out=scores[start:start + len(codes)])
+        scores *= self._scales[:count] if positions is None else self._scales[positions]
+        return scores
+
+    def _reserve(self, count):
+        needed = self.size + count
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids), 1024)
+        ids = np.empty(capacity, dtype=np.int64)
+        codes = self._empty_codes(capacity)
+        scales = np.empty(capacity, dtype=np.float32)
+        assignments = np.empty(capacity, dtype=np.int32)
+        ids[:self.size] = self.ids
+        codes[:self.size] = self.codes
+        scales[:self.size] = self._scales[:self.size]
+        assignments[:self.size] = self._assignments[:self.size]
+        self._ids, self._codes, self._scales, self._assignments = ids, codes, scales, assignments
+
+    def add(self, ids, vectors):
+        """Append vectors of row ids not in the index yet (in any order)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        if not len(ids):
+            return
+        with self.lock:
+            self._reserve(len(ids))
+            start, end = self.size, self.size + len(ids)
+            self._ids[start:end] = ids
+            self._codes[start:end], self._scales[start:end] = self._encode(vectors)
+            if self.centroids is not None:
+                self._assignments[start:end] = self._assign(vectors)
+            self.size = end
+            self.max_id = max(self.max_id, int(ids.max()))
+            if self.size >= self.ann_min_rows and self.size >= 4 * self.trained_rows:
+                self.train()
+
+    def remove(self, ids):
+        """Drop vectors by row id"""
+        with self.lock:
+            keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+            kept = int(keep.sum())
+            if kept == self.size:
+                return
+            self._ids = self.ids[keep].copy()
+            self._codes = self.codes[keep].copy()
+            self._scales = self._scales[:self.size][keep].copy()
+            self._assignments = self._assignments[:self.size][keep].copy()
+            self.size = kept
+            if self.centroids is not None:
+                self._build_lists()
+
+    def train(self, seed=0):
+        """(Re)build the IVF centroids with spherical k-means on a sample of the store"""
+        with self.lock:
+            nlist = max(16, int(2 * np.sqrt(self.size)))
+            rng = np.random.default_rng(seed)
+            sample_size = min(self.size, nlist * KMEANS_SAMPLE_PER_LIST)
+            sample = self._decode(rng.choice(self.size, sample_size, replace=False))
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(KMEANS_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                # Reseed empty clusters from random sample points
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                centroids = sums / norms
+            self.centroids = centroids.astype(np.float32)
+            self.trained_rows = self.size
+            for start in range(0, self.size, SCORE_CHUNK):
+                positions = np.arange(start, min(start + SCORE_CHUNK, self.size))
+                self._assignments[positions] = self._assign(self._decode(positions))
+            self._build_lists()
+
+    def _assign(self, vectors, chunk=SCORE_CHUNK):
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ self.centroids.T, axis=1)
+        return labels
+
+    def _build_lists(self):
+        assignments = self._assignments[:self.size]
+        self.list_order = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.searchsorted(assignments[self.list_order], np.arange(len(self.centroids) + 1))
+        self.listed = self.size
+
+    def search(self, query, k, exact=False, after=None, load_vectors=None):
+        """Top-k (ids, cosine scores) for a normalised query vector, best first, ties by increasing id.
+
+        after=(score, id) resumes a ranking: only the results ranked below that
+        one are considered, which is what keyset pagination needs. exact skips
+        the IVF lists; with quantization, load_vectors(ids) returning their
+        float32 vectors turns on rescoring.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        with self.lock:
+            if self.size == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            if exact or self.centroids is None:
+                ids, scores = self.ids.copy(), self._scores(query)
+            else:
+                if self.size - self.listed > self.size // 10:
+                    self._build_lists()
+                probes = top_k(self.centroids @ query, self.nprobe)
+                positions = np.concatenate(
+                    [self.list_order[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes]
+                    + [np.arange(self.listed, self.size)]
+                )
+                ids, scores = self.ids[positions], self._scores(query, positions)
+        if self.quantization != 'none' and load_vectors is not None:
+            # Rescored outside the lock: load_vectors may read the database
+            return rescore(ids, scores, query, k, after, load_vectors, self.rescore_factor)
+        if after is not None:
+            keep = (scores < after[0]) | ((scores == after[0]) & (ids > after[1]))
+            ids, scores = ids[keep], scores[keep]
+        best = ranked(scores, ids, k)
+        return ids[best], scores[best]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'vectors': self.size,
+                'dim': self.dim,
+                'bytes': self.codes.nbytes + (self.size * 4 if self.quantization == 'int8' else 0),
+                'quantization': self.quantization,
+                'rescore_factor': self.rescore_factor,
+                'mode': 'ivf' if self.centroids is not None else 'exact',
+                'lists': len(self.centroids) if self.centroids is not None else 0,
+                'nprobe': self.nprobe,
+                'unlisted_tail': self.size - self.listed if self.centroids is not None else 0
+            }
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import zlib
+import struct
+import sqlite3
+import threading
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # fcntl is POSIX-only; elsewhere the single-owner check is skipped
+    fcntl = None
+
+# Write-behind queue configuration
+MEMORY_QUEUE_MAX_PENDING = int(os.getenv('MEMORY_QUEUE_MAX_PENDING', '10000'))
+MEMORY_QUEUE_MAX_BATCH = int(os.getenv('MEMORY_QUEUE_MAX_BATCH', '1000'))
+MEMORY_QUEUE_FSYNC = os.getenv('MEMORY_QUEUE_FSYNC', 'true').lower() == 'true'
+MEMORY_QUEUE_MAX_LOG_BYTES = int(os.getenv('MEMORY_QUEUE_MAX_LOG_BYTES', str(64 * 1024 * 1024)))
+# Failed attempts at applying a record on its own before it is moved to the dead-letter file
+MEMORY_QUEUE_MAX_ATTEMPTS = int(os.getenv('MEMORY_QUEUE_MAX_ATTEMPTS', '5'))
+RETRY_DELAY = 1.0
+
+# Each log record: payload length and CRC32, then the JSON payload {"seq", "kind", "data"}
+FRAME_HEADER = struct.Struct('<II')
+CHECKPOINT_SQL = 'INSERT OR REPLACE INTO write_queue_checkpoint (name, applied_seq) VALUES (?, ?)'
+
+
+class QueueFull(Exception):
+    """Raised when the queue holds max_pending unapplied writes"""
+
+    def __init__(self, retry_after):
+        super().__init__('Write queue is full')
+        self.retry_after = retry_after
+
+
+class QueueUnavailable(Exception):
+    """Raised when the queue log cannot be opened or another process owns it"""
+
+
+def read_log(path):
+    """Records of a log file and the length of its valid prefix; a torn or corrupt tail is ignored"""
+    records, valid_bytes = [], 0
+    if not os.path.exists(path):
+        return records, valid_bytes
+    with open(path, 'rb') as f:
+        data = f.read()
+    while valid_bytes + FRAME_HEADER.size <= len(data):
+        length, checksum = FRAME_HEADER.unpack_from(data, valid_bytes)
+        start = valid_bytes + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        records.append(json.loads(payload))
+        valid_bytes = start + length
+    return records, valid_bytes
+
+
+def frame(record):
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class WriteQueue:
+    """Durable write-behind queue: an append-only log drained into SQLite by one background writer.
+
+    enqueue() appends the write to the log, fsyncs it (concurrent callers share
+    one fsync) and returns at once. The writer thread takes everything pending,
+    up to max_batch records, calls prepare(records) outside any transaction,
+    which returns (prepared, rejected_count), then apply(conn, prepared)
+    inside one write transaction that also advances
+    the applied sequence number in write_queue_checkpoint. A crash can therefore
+    neither lose an acknowledged write nor apply one twice: on startup the
+    records after the checkpoint are replayed from the log.
+
+    When a batch fails the writer bisects it, applying the records before the
+    failing one, until that record is retried alone. A record that still fails
+    max_attempts times is appended to the dead-letter file (path + '.dead',
+    same framing, with the error) and checkpointed past, so it cannot hold
+    back the rest of the log. Operational errors (database locked, disk full)
+    are not the record's fault and are retried without limit.
+    """
+
+    def __init__(self, name, path, db, prepare, apply, max_pending=MEMORY_QUEUE_MAX_PENDING,
+                 max_batch=MEMORY_QUEUE_MAX_BATCH, fsync=MEMORY_QUEUE_FSYNC, max_log_bytes=MEMORY_QUEUE_MAX_LOG_BYTES,
+                 max_attempts=MEMORY_QUEUE_MAX_ATTEMPTS):
+        self.name = name
+        self.path = path
+        self.dead_letter_path = f'{path}.dead'
+        self.db = db
+        self.prepare = prepare
+        self.apply = apply
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.max_log_bytes = max_log_bytes
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.has_pending = threading.Condition(self.lock)
+        self.pending = deque()
+        self.log = None
+        self.written_bytes = 0
+        self.synced_bytes = 0
+        self.next_seq = 1
+        self.thread = None
+        self.enqueued = 0
+        self.applied = 0
+        self.rejected = 0
+        self.rejected_full = 0
+        self.batches = 0
+        self.dead_lettered = 0
+        self.failures = 0
+        self.last_error = None
+        self.apply_seconds = 0.0
+
+    def open(self):
+        """Take ownership of the log, replay unapplied records and start the writer thread"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            log = open(self.path, 'ab+')
+        except OSError as e:
+            raise QueueUnavailable(f'{self.path} cannot be opened: {e}')
+        if fcntl is not None:
+            try:
+                fcntl.flock(log.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                log.close()
+                raise QueueUnavailable(f'{self.path} is owned by another process')
+
+        with self.db.read() as conn:
+            row = conn.execute('SELECT applied_seq FROM write_queue_checkpoint WHERE name = ?', (self.name,)).fetchone()
+        checkpoint = row[0] if row else 0
+        records, valid_bytes = read_log(self.path)
+        # Drop a torn tail left by a crash mid-append
+        log.truncate(valid_bytes)
+        self.log = log
+        self.written_bytes = self.synced_bytes = valid_bytes
+        self.pending.extend(record for record in records if record['seq'] > checkpoint)
+        self.next_seq = max([checkpoint] + [record['seq'] for record in records]) + 1
+
+        self.thread = threading.Thread(target=self._run, name=f'write-queue-{self.name}', daemon=True)
+        self.thread.start()
+        return self
+
+    def enqueue(self, kind, data):
+        """Durably append a write and return its sequence number; raises QueueFull when saturated"""
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.rejected_full += 1
+                raise QueueFull(self.retry_after())
+            record = {'seq': self.next_seq, 'kind': kind, 'data': data}
+            self.next_seq += 1
+            encoded = frame(record)
+            self.log.write(encoded)
+            self.written_bytes += len(encoded)
+            end = self.written_bytes
+            self.pending.append(record)
+            self.enqueued += 1
+            self.has_pending.notify()
+        self._sync(end)
+        return record['seq']
+
+    def _sync(self, end):
+        """Make the log durable up to end; whoever fsyncs covers every append made before it"""
+        with self.sync_lock:
+            if self.synced_bytes >= end:
+                return
+            with self.lock:
+                self.log.flush()
+                target = self.written_bytes
+            if self.fsync:
+                os.fsync(self.log.fileno())
+            self.synced_bytes = target
+
+    def retry_after(self):
+        """Seconds until the writer has likely drained the backlog, from its observed throughput"""
+        rate = self.applied / self.apply_seconds if self.apply_seconds else 0
+        return max(1, int(len(self.pending) / rate) + 1) if rate else 1
+
+    def _run(self):
+        limit, attempts, error = self.max_batch, 0, None
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.has_pending.wait()
+                batch = [self.pending[i] for i in range(min(len(self.pending), limit))]
+            started = time.perf_counter()
+            dead = attempts >= self.max_attempts
+            try:
+                if dead:
+                    self._dead_letter(batch[0], error)
+                    rejected = 0
+                else:
+                    prepared, rejected = self.prepare(batch)
+                    with self.db.write() as conn:
+                        self.apply(conn, prepared)
+                        conn.execute(CHECKPOINT_SQL, (self.name, batch[-1]['seq']))
+            except Exception as e:
+                error = str(e)
+                with self.lock:
+                    self.failures += 1
+                    self.last_error = error
+                if len(batch) > 1:
+                    limit = len(batch) // 2
+                    continue
+                if not isinstance(e, sqlite3.OperationalError):
+                    attempts += 1
+                time.sleep(RETRY_DELAY)
+                continue
+            limit, attempts = self.max_batch, 0
+            # Lock order is sync_lock then lock, as in _sync
+            with self.sync_lock, self.lock:
+                for _ in batch:
+                    self.pending.popleft()
+                if dead:
+                    self.dead_lettered += 1
+                else:
+                    self.applied += len(batch)
+                    self.rejected += rejected
+                    self.batches += 1
+                    self.apply_seconds += time.perf_counter() - started
+                self._compact()
+
+    def _dead_letter(self, record, error):
+        """Durably set aside a record the writer cannot apply, then checkpoint past it"""
+        with open(self.dead_letter_path, 'ab') as f:
+            f.write(frame({**record, 'error': error}))
+            f.flush()
+            os.fsync(f.fileno())
+        with self.db.write() as conn:
+            conn.execute(CHECKPOINT_SQL, (self.name, record['seq']))
+
+    def _compact(self):
+        """Keep the log small: empty it once drained, rewrite just the pending records when it grows too big.
+
+        Called with both sync_lock and lock held.
+        """
+        if self.pending:
+            if self.written_bytes < self.max_log_bytes:
+                return
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'wb') as tmp:
+                for record in self.pending:
+                    tmp.write(frame(record))
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, self.path)
+            old_log, self.log = self.log, open(self.path, 'ab+')
+            if fcntl is not None:
+                fcntl.flock(self.log.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            old_log.close()
+        else:
+            self.log.flush()
+            self.log.truncate(0)
+        self.written_bytes = self.synced_bytes = self.log.seek(0, os.SEEK_END)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': len(self.pending),
+                'max_pending': self.max_pending,
+                'enqueued': self.enqueued,
+                'applied': self.applied,
+                'rejected_invalid': self.rejected,
+                'rejected_full': self.rejected_full,
+                'batches': self.batches,
+                'average_batch': self.applied / self.batches if self.batches else 0,
+                'apply_seconds_total': self.apply_seconds,
+                'dead_lettered': self.dead_lettered,
+                'dead_letter_path': self.dead_letter_path,
+                'failures': self.failures,
+                'last_error': self.last_error,
+                'log_bytes': self.written_bytes,
+                'fsync': self.fsync
+            }